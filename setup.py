@@ -280,6 +280,7 @@ setup_args = {
                             'bin/radical-pilot-fetch-json',
                             'bin/radical-pilot-inspect',
                             'bin/radical-pilot-run-session',
+                            'bin/radical-pilot-startup',
                             'bin/radical-pilot-stats',
                             'bin/radical-pilot-stats.plot',
                             'bin/radical-pilot-version',
@@ -299,7 +300,8 @@ setup_args = {
                             'ntplib',
                             'msgpack-python',
                             'pyzmq'], 
-    'extras_require'     : {'autopilot' : ['github3.py']},
+    'extras_require'     : {'autopilot' : ['github3.py'],
+                            'analytics' : ['numpy']},
     'tests_require'      : ['mock==2.0.0', 'pytest'],
     'test_suite'         : '%s.tests' % name,
     'zip_safe'           : False,
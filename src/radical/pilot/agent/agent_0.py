@@ -4,11 +4,14 @@ __license__   = 'MIT'
 
 
 import os
-import sys
 import copy
+import json
 import stat
 import time
 import pprint
+import select
+import collections
+import threading          as mt
 import subprocess         as sp
 
 import radical.utils      as ru
@@ -26,6 +29,13 @@ from .  import lm         as rpa_lm
 git_ident = '$Id$'
 
 
+# agent queues, by the unit state the units have while waiting in them
+_METRICS_QUEUES = {rps.AGENT_STAGING_INPUT_PENDING  : rpc.AGENT_STAGING_INPUT_QUEUE,
+                   rps.AGENT_SCHEDULING_PENDING     : rpc.AGENT_SCHEDULING_QUEUE,
+                   rps.AGENT_EXECUTING_PENDING      : rpc.AGENT_EXECUTING_QUEUE,
+                   rps.AGENT_STAGING_OUTPUT_PENDING : rpc.AGENT_STAGING_OUTPUT_QUEUE}
+
+
 # ==============================================================================
 #
 class Agent_0(rpu.Worker):
@@ -60,6 +70,8 @@ class Agent_0(rpu.Worker):
         self._final_cause = None
         self._lrms        = None
 
+        self._metrics_interval = None
+
         # this better be on a shared FS!
         cfg['workdir']    = os.getcwd()
 
@@ -114,8 +126,10 @@ class Agent_0(rpu.Worker):
         # Create LRMS which will give us the set of agent_nodes to use for
         # sub-agent startup.  Add the remaining LRMS information to the
         # config, for the benefit of the scheduler).
+        self._prof.prof('lrms_start', uid=self._pid)
         self._lrms = rpa_rm.RM.create(name=self._cfg['lrms'], cfg=self._cfg,
                                       session=self._session)
+        self._prof.prof('lrms_stop', uid=self._pid)
 
         # add the resource manager information to our own config
         self._cfg['lrms_info'] = self._lrms.lrms_info
@@ -129,11 +143,15 @@ class Agent_0(rpu.Worker):
         self._write_sa_configs()
 
         # and start the sub agents
+        self._prof.prof('sub_agents_start', uid=self._pid)
         self._start_sub_agents()
+        self._prof.prof('sub_agents_stop', uid=self._pid)
 
-        # register the command callback which pulls the DB for commands
+        # register the command callback which checks the pilot runtime, and
+        # start the thread which block-reads commands from the command channel
         self.register_timed_cb(self._agent_command_cb,
                                timer=self._cfg['db_poll_sleeptime'])
+        self._start_command_reader()
 
         # registers the staging_input_queue as this is what we want to push
         # units to
@@ -151,6 +169,9 @@ class Agent_0(rpu.Worker):
                  '$set'             : ['resource_details']}
         self.advance(pilot, publish=True, push=False)
 
+        # collect and report agent metrics, if so configured
+        self._start_metrics()
+
         # register idle callback to pull for units -- which is the only action
         # we have to perform, really
         self.register_timed_cb(self._check_units_cb,
@@ -175,6 +196,10 @@ class Agent_0(rpu.Worker):
         self.unregister_output(rps.AGENT_STAGING_INPUT_PENDING)
         self.unregister_timed_cb(self._agent_command_cb)
 
+        if self._metrics_interval:
+            self.unregister_timed_cb(self._metrics_cb)
+            self._metrics_file.close()
+
         if self._lrms:
             self._log.debug('stop    lrms %s', self._lrms)
             self._lrms.stop()
@@ -278,9 +303,12 @@ class Agent_0(rpu.Worker):
         For the list of sub_agents, get a launch command and launch that
         agent instance on the respective node.  We pass it to the seconds
         bootstrap level, there is no need to pass the first one again.
-        '''
 
-        # FIXME: we need a watcher cb to watch sub-agent state
+        All sub-agents are launched concurrently, and are then watched by
+        a single monitor thread.  We return once enough sub-agents reported to
+        be alive (see `_sa_alive_cb()`), so that no units are pulled before the
+        agent components are up.
+        '''
 
         self._log.debug('start_sub_agents')
 
@@ -288,6 +316,20 @@ class Agent_0(rpu.Worker):
             self._log.debug('start_sub_agents noop')
             return
 
+        # sub-agents report readiness via an 'alive' control message.  We
+        # subscribe before launching them so that we don't miss any.
+        n_agents = len(self._cfg['agents'])
+        quorum   = self._cfg.get('sub_agent_quorum')
+        timeout  = self._cfg.get('sub_agent_timeout', 300)
+
+        if not quorum or quorum > n_agents:
+            quorum = n_agents
+
+        self._sa_alive  = set()
+        self._sa_quorum = quorum
+        self._sa_ready  = mt.Event()
+        self.register_subscriber(rpc.CONTROL_PUBSUB, self._sa_alive_cb)
+
         # the configs are written, and the sub-agents can be started.  To know
         # how to do that we create the agent launch method, have it creating
         # the respective command lines per agent instance, and run via
@@ -296,6 +338,7 @@ class Agent_0(rpu.Worker):
         # actually, we only create the agent_lm once we really need it for
         # non-local sub_agents.
         agent_lm   = None
+        cmds       = dict()
         for sa in self._cfg['agents']:
 
             target = self._cfg['agents'][sa]['target']
@@ -359,46 +402,108 @@ class Agent_0(rpu.Worker):
                 if hop : cmdline = hop
                 else   : cmdline = ls_name
 
-            # spawn the sub-agent
-            self._log.info ('create sub-agent %s: %s' % (sa, cmdline))
-
-            # ------------------------------------------------------------------
-            class _SA(ru.Process):
-                def __init__(self, sa, cmd, log):
-                    self._sa   = sa
-                    self._cmd  = cmd.split()
-                    self._log  = log
-                    self._proc = None
-                    super(_SA, self).__init__(name=sa, log=self._log)
-                    self.start()
-
-                def ru_initialize_child(self):
-                    sys.stdout = open('%s.out' % self._ru_name, 'w')
-                    sys.stderr = open('%s.err' % self._ru_name, 'w')
-                    out = open('%s.out' % self._sa, 'w')
-                    err = open('%s.err' % self._sa, 'w')
-                    self._proc = sp.Popen(args=self._cmd, stdout=out, stderr=err)
-
-                def work_cb(self):
-                    time.sleep(0.1)
-                    if self._proc.poll() is None:
-                        return True   # all is well
+            cmds[sa] = cmdline
+
+        # spawn all sub-agents -- `Popen` does not block, so we don't need to
+        # wait for one sub-agent to come up before spawning the next one (and
+        # forking from concurrent threads is not safe)
+        names = sorted(cmds.keys())
+        procs = list()
+        for sa in names:
+            self._log.info('create sub-agent %s: %s', sa, cmds[sa])
+            with open('%s.err' % sa, 'w') as err:
+                procs.append(sp.Popen(args=cmds[sa].split(), stdout=sp.PIPE,
+                                      stderr=err, close_fds=True))
+
+        # ------------------------------------------------------------------
+        class _SAMonitor(ru.Thread):
+
+            # We watch all sub-agents by waiting on their stdout pipes: we
+            # copy any output to `<sa>.out`, and EOF signals that the
+            # sub-agent is gone -- which terminates the monitor, and thus
+            # the agent.
+            def __init__(self, name, log, procs):
+                self._procs = procs
+                self._fds   = dict()
+                self._outs  = dict()
+                for sa, proc in procs.iteritems():
+                    self._fds[proc.stdout.fileno()] = sa
+                    self._outs[sa] = open('%s.out' % sa, 'w')
+                super(_SAMonitor, self).__init__(name=name, log=log)
+                self.start()
+
+            def work_cb(self):
+                rlist, _, _ = select.select(self._fds.keys(), [], [], 1.0)
+                for fd in rlist:
+                    sa   = self._fds[fd]
+                    data = os.read(fd, 1024 * 64)
+                    if data:
+                        self._outs[sa].write(data)
+                        self._outs[sa].flush()
                     else:
+                        ret = self._procs[sa].wait()
+                        self._log.warn('sub-agent %s is gone (%s)', sa, ret)
                         return False  # proc is gone - terminate
+                return True           # all is well
 
-                def ru_finalize_child(self):
-                    if self._proc:
+            def ru_finalize_common(self):
+                for sa, proc in self._procs.iteritems():
+                    if proc.poll() is None:
                         try:
-                            self._proc.terminate()
+                            proc.terminate()
                         except Exception as e:
                             # we are likely racing on termination...
-                            self._log.warn('%s term failed: %s', self._sa, e)
-            # ------------------------------------------------------------------
+                            self._log.warn('%s term failed: %s', sa, e)
+                for out in self._outs.values():
+                    out.close()
+        # ------------------------------------------------------------------
+
+        # the agents are up - let the watcher manage the monitor from here
+        monitor = _SAMonitor(name='%s.sa_monitor' % self.uid, log=self._log,
+                             procs=dict(zip(names, procs)))
+        self.register_watchable(monitor)
+        self._session._to_stop.append(monitor)
+
+        # readiness barrier
+        start = time.time()
+        while not self._sa_ready.wait(1.0):
+
+            if not monitor.is_alive():
+                raise RuntimeError('sub-agent failed during startup')
+
+            if time.time() - start > timeout:
+                raise RuntimeError('%d/%d sub-agents alive after %ds'
+                                  % (len(self._sa_alive), quorum, timeout))
+
+        self._log.debug('start_sub_agents done (%d alive)', len(self._sa_alive))
+
+
+    # --------------------------------------------------------------------------
+    #
+    def _sa_alive_cb(self, topic, msg):
+
+        cmd = msg.get('cmd')
+        arg = msg.get('arg')
+
+        if cmd != 'alive' or not isinstance(arg, dict):
+            return True
+
+        if arg.get('src') != 'agent' or arg.get('owner') != self.uid:
+            return True
+
+        sender = arg.get('sender')
+        if sender in self._sa_alive:
+            return True
 
-            # the agent is up - let the watcher manage it from here
-            self.register_watchable(_SA(sa, cmdline, log=self._log))
+        self._sa_alive.add(sender)
+        self._prof.prof('sub_agent_alive', uid=self._pid, msg=sender)
+        self._log.info('sub-agent %s alive (%d/%d)', sender,
+                       len(self._sa_alive), self._sa_quorum)
 
-        self._log.debug('start_sub_agents done')
+        if len(self._sa_alive) >= self._sa_quorum:
+            self._sa_ready.set()
+
+        return True
 
 
     # --------------------------------------------------------------------------
@@ -407,30 +512,56 @@ class Agent_0(rpu.Worker):
 
         self.is_valid()
 
-        if not self._check_commands(): return False
         if not self._check_state   (): return False
 
         return True
 
 
+    # --------------------------------------------------------------------------
+    #
+    def _start_command_reader(self):
+
+        # ----------------------------------------------------------------------
+        class _CommandReader(ru.Thread):
+
+            def __init__(self, name, log, cb):
+                self._cb = cb
+                super(_CommandReader, self).__init__(name=name, log=log)
+                self.start()
+
+            def work_cb(self):
+                return self._cb()
+        # ----------------------------------------------------------------------
+
+        reader = _CommandReader(name='%s.cmd_reader' % self.uid, log=self._log,
+                                cb=self._check_commands)
+        self.register_watchable(reader)
+        self._session._to_stop.append(reader)
+
+
     # --------------------------------------------------------------------------
     #
     def _check_commands(self):
 
-        # Check if there's a command waiting
-        # FIXME: this pull should be done by the update worker, and commands
-        #        should then be communicated over the command pubsub
+        # Block-read commands from the session's command channel.  The read
+        # does not hold the callback lock, so that other callbacks are not
+        # stalled while we wait.
         # FIXME: commands go to pmgr, umgr, session docs
-        # FIXME: this is disabled right now
-        retdoc = self._session._dbs._c.find_and_modify(
-                    query ={'uid'  : self._pid},
-                    update={'$set' : {'cmd': []}},  # Wipe content of array
-                    fields=['cmd'])
+        cmds = self._session._dbs.get_pilot_commands(self._pid,
+                                   timeout=self._cfg['db_poll_sleeptime'])
 
-        if not retdoc:
+        if not cmds:
             return True  # this is not an error
 
-        for spec in retdoc.get('cmd', []):
+        with self._cb_lock:
+            return self._handle_commands(cmds)
+
+
+    # --------------------------------------------------------------------------
+    #
+    def _handle_commands(self, cmds):
+
+        for spec in cmds:
 
             cmd = spec['cmd']
             arg = spec['arg']
@@ -484,6 +615,140 @@ class Agent_0(rpu.Worker):
         return True
 
 
+    # --------------------------------------------------------------------------
+    #
+    def _start_metrics(self):
+        '''
+        If `metrics_interval` is configured, we collect agent metrics in that
+        interval (seconds): busy/free cores and gpus and the wait pool size (as
+        reported by the scheduler), the number of units per state, the rate of
+        units entering each state, and the number of units waiting in each
+        agent queue.  Those metrics are derived from the state updates seen on
+        the state pubsub.  Each sample is
+
+          - published as 'metrics' command on the control pubsub,
+          - appended as json line to `agent_0.metrics`,
+          - appended to the session's metrics channel, where the pilot manager
+            picks it up (see `ComputePilot.metrics`).
+
+        The samples are not written to the pilot document, to avoid any DB load
+        for idle pilots.
+        '''
+
+        self._metrics_interval = self._cfg.get('metrics_interval')
+
+        if not self._metrics_interval:
+            return
+
+        self._metrics_sched  = dict()  # latest report per scheduler
+        self._metrics_states = dict()  # current state per (non-final) unit
+        self._metrics_counts = dict()  # state transitions since last sample
+        self._metrics_last   = time.time()
+        self._metrics_file   = open('%s.metrics' % self._uid, 'a')
+
+        self.register_subscriber(rpc.STATE_PUBSUB,   self._metrics_state_cb)
+        self.register_subscriber(rpc.CONTROL_PUBSUB, self._metrics_sched_cb)
+        self.register_timed_cb(self._metrics_cb, timer=self._metrics_interval)
+
+
+    # --------------------------------------------------------------------------
+    #
+    def _metrics_record(self, things):
+
+        for thing in things:
+
+            if thing.get('type') != 'unit':
+                continue
+
+            uid   = thing['uid']
+            state = thing.get('state')
+
+            if not state or self._metrics_states.get(uid) == state:
+                continue
+
+            self._metrics_counts[state] = self._metrics_counts.get(state, 0) + 1
+
+            if state in rps.FINAL:
+                self._metrics_states.pop(uid, None)
+            else:
+                self._metrics_states[uid] = state
+
+
+    # --------------------------------------------------------------------------
+    #
+    def _metrics_state_cb(self, topic, msg):
+
+        if msg.get('cmd') != 'update':
+            return True
+
+        things = msg.get('arg')
+        if not isinstance(things, list):
+            things = [things]
+
+        self._metrics_record(things)
+
+        return True
+
+
+    # --------------------------------------------------------------------------
+    #
+    def _metrics_sched_cb(self, topic, msg):
+
+        if msg.get('cmd') == 'scheduler_metrics':
+            arg = msg['arg']
+            self._metrics_sched[arg['sender']] = arg
+
+        return True
+
+
+    # --------------------------------------------------------------------------
+    #
+    def _metrics_cb(self):
+
+        now    = time.time()
+        period = max(now - self._metrics_last, 1e-6)
+        units  = collections.Counter(self._metrics_states.values())
+
+        # we sum the reports of all schedulers (usually there is only one)
+        cores = [0, 0]
+        gpus  = [0, 0]
+        wait  = 0
+        for report in self._metrics_sched.values():
+            for i in [0, 1]:
+                cores[i] += report.get('cores', [0, 0])[i]
+                gpus [i] += report.get('gpus',  [0, 0])[i]
+            wait += report['wait_pool']
+
+        sample = {'time'      : now,
+                  'cores'     : cores,
+                  'gpus'      : gpus,
+                  'wait_pool' : wait,
+                  'units'     : dict(units),
+                  'rates'     : dict(),
+                  'queues'    : dict()}
+
+        for state, count in self._metrics_counts.iteritems():
+            sample['rates'][state] = round(count / period, 3)
+
+        for state, queue in _METRICS_QUEUES.iteritems():
+            sample['queues'][queue] = units.get(state, 0)
+
+        self._metrics_counts = dict()
+        self._metrics_last   = now
+
+        self.publish(rpc.CONTROL_PUBSUB, {'cmd' : 'metrics',
+                                          'arg' : {'pilot'   : self._pid,
+                                                   'metrics' : sample}})
+
+        self._metrics_file.write('%s\n' % json.dumps(sample,
+                                                     separators=(',', ':')))
+        self._metrics_file.flush()
+
+        self._session._dbs.publish_pilot_metrics(self._pid, sample)
+
+        return True
+
+
     # --------------------------------------------------------------------------
     #
     def _check_units_cb(self):
@@ -542,6 +807,9 @@ class Agent_0(rpu.Worker):
 
             unit['control'] = 'agent'
 
+        if self._metrics_interval:
+            self._metrics_record(unit_list)
+
         # now we really own the CUs, and can start working on them (ie. push
         # them into the pipeline).  We don't publish nor profile as advance,
         # since that happened already on the module side when the state was set.
@@ -62,6 +62,7 @@ SDISTS=
 RUNTIME=
 VIRTENV=
 VIRTENV_MODE=
+VIRTENV_PACK=
 CCM=
 PILOT_ID=
 RP_VERSION=
@@ -549,6 +550,140 @@ run_cmd()
 
 
 
+# ------------------------------------------------------------------------------
+#
+# print the sha1 checksum of the given file
+#
+file_hash()
+{
+    fname="$1"
+
+    if which sha1sum >/dev/null 2>&1
+    then
+        sha1sum "$fname" | cut -f 1 -d ' '
+
+    elif which shasum >/dev/null 2>&1
+    then
+        shasum -a 1 "$fname" | cut -f 1 -d ' '
+
+    else
+        openssl sha1 "$fname" | sed -e 's/^.*= *//'
+    fi
+}
+
+
+# ------------------------------------------------------------------------------
+#
+# unpack a packed virtualenv (as created by `radical-pilot-create-static-ve -p`)
+# into the given virtenv location.  The tarball is named `ve.<sha1>.tgz`, and
+# its checksum is verified before unpacking.  The unpacked ve is marked by
+# `$virtenv/.rp_unpacked`, which only gets created once the ve is complete --
+# all pilots which find that marker will use the ve right away, and all pilots
+# which don't will wait on the ve lock while some other pilot unpacks it.
+#
+# The ve is unpacked into a temporary location and then moved into place, so
+# that an interrupted unpack never results in a partial ve.  All paths in the
+# ve which point to the original ve location are rewritten to point to the new
+# location.
+#
+virtenv_unpack()
+{
+    profile_event 've_unpack_start'
+
+    pid="$1"
+    virtenv="$2"
+    ve_pack="$3"
+
+    marker="$virtenv/.rp_unpacked"
+
+    if test -f "$marker"
+    then
+        echo "virtenv $virtenv exists (unpacked)"
+        profile_event 've_unpack_stop'
+        return
+    fi
+
+    # NOTE: Condor does not support staging into some arbitrary directory, so
+    #       we may find the tarball in pwd
+    if   test -f "$SESSION_SANDBOX/$ve_pack"; then src="$SESSION_SANDBOX/$ve_pack"
+    elif test -f "./$ve_pack"               ; then src="./$ve_pack"
+    else
+        echo "ERROR: missing virtenv pack $ve_pack"
+        exit 1
+    fi
+
+    mkdir -p "`dirname $virtenv`"
+
+    echo 'rp lock for ve unpack'
+    lock "$pid" "$virtenv" # use default timeout
+
+    # some other pilot may have unpacked the ve while we waited for the lock
+    if test -f "$marker"
+    then
+        echo "virtenv $virtenv exists (unpacked concurrently)"
+        unlock "$pid" "$virtenv"
+        profile_event 've_unpack_stop'
+        return
+    fi
+
+    expected=`basename "$ve_pack" .tgz`
+    expected="${expected#ve.}"
+    actual=`file_hash "$src"`
+    if ! test "$expected" = "$actual"
+    then
+        echo "ERROR: virtenv pack checksum mismatch ($actual != $expected)"
+        unlock "$pid" "$virtenv"
+        exit 1
+    fi
+    echo "virtenv pack checksum ok ($actual)"
+
+    tmp="$virtenv.$pid.tmp"
+    rm -rf "$tmp" "$virtenv"
+    mkdir -p "$tmp"
+
+    if ! tar zxmf "$src" -C "$tmp"
+    then
+        echo "ERROR: cannot unpack $src"
+        rm -rf "$tmp"
+        unlock "$pid" "$virtenv"
+        exit 1
+    fi
+
+    # relocate the ve: rewrite scripts, .pth files and symlinks which point to
+    # the location the ve was created at
+    old_prefix=`cat "$tmp/.rp_ve_prefix" 2>/dev/null`
+    if ! test -z "$old_prefix"
+    then
+        echo "relocate virtenv from $old_prefix"
+        grep -rlI -- "$old_prefix" "$tmp/bin" "$tmp"/lib*/python*/site-packages \
+            2>/dev/null \
+        | while read fname
+        do
+            sed -e "s|$old_prefix|$virtenv|g" "$fname" > "$fname.rp_tmp" \
+            && cat "$fname.rp_tmp" > "$fname"
+            rm -f "$fname.rp_tmp"
+        done
+
+        find "$tmp" -type l \
+        | while read fname
+        do
+            link=`readlink "$fname"`
+            case "$link" in
+                $old_prefix*)
+                    ln -sfn "$virtenv${link#$old_prefix}" "$fname"
+                    ;;
+            esac
+        done
+    fi
+
+    mv "$tmp" "$virtenv"
+    touch "$marker"
+    unlock "$pid" "$virtenv"
+
+    profile_event 've_unpack_stop'
+}
+
+
 # ------------------------------------------------------------------------------
 #
 # create and/or update a virtenv, depending on mode specifier:
@@ -1443,8 +1578,9 @@ echo "# -------------------------------------------------------------------"
 #    -w   execute commands before bootstrapping phase 2: the worker
 #    -x   exit cleanup - delete pilot sandbox, virtualenv etc. after completion
 #    -y   runtime limit
+#    -z   packed virtualenv to unpack into the virtualenv location
 # 
-while getopts "a:b:cd:e:f:g:h:i:m:p:r:s:t:v:w:x:y:" OPTION; do
+while getopts "a:b:cd:e:f:g:h:i:m:p:r:s:t:v:w:x:y:z:" OPTION; do
     case $OPTION in
         a)  SESSION_SANDBOX="$OPTARG"  ;;
         b)  PYTHON_DIST="$OPTARG"  ;;
@@ -1464,6 +1600,7 @@ while getopts "a:b:cd:e:f:g:h:i:m:p:r:s:t:v:w:x:y:" OPTION; do
         w)  pre_bootstrap_2 "$OPTARG"  ;;
         x)  CLEANUP="$OPTARG"  ;;
         y)  RUNTIME="$OPTARG"  ;;
+        z)  VIRTENV_PACK="$OPTARG"  ;;
         *)  echo "Unknown option: '$OPTION'='$OPTARG'"
             return 1;;
     esac
@@ -1638,6 +1775,13 @@ fi
 
 rehash "$PYTHON"
 
+# a packed virtenv is unpacked once, and is then used as is
+if ! test -z "$VIRTENV_PACK"
+then
+    virtenv_unpack "$PILOT_ID" "$VIRTENV" "$VIRTENV_PACK"
+    VIRTENV_MODE='use'
+fi
+
 # ready to setup the virtenv
 virtenv_setup    "$PILOT_ID"    "$VIRTENV" "$VIRTENV_MODE" \
                  "$PYTHON_DIST" "$VIRTENV_DIST"
@@ -57,8 +57,10 @@ class Popen(AgentExecutingComponent) :
         self._cus_to_cancel  = list()
         self._cus_to_watch   = list()
         self._watch_queue    = Queue.Queue ()
+        self._exec_start     = dict()  # uid: exec start time, for rusage
 
         self._pilot_id = self._cfg['pilot_id']
+        self._first    = True   # mark first unit execution in profile
 
         # run watcher thread
         self._watcher = ru.Thread(target=self._watch, name="Watcher")
@@ -228,10 +230,12 @@ class Popen(AgentExecutingComponent) :
         descr   = cu['description']
         sandbox = '%s/%s' % (self._pwd, cu['uid'])
 
-        # make sure the sandbox exists
-        self._prof.prof('exec_mkdir', uid=cu['uid'])
-        rpu.rec_makedir(sandbox)
-        self._prof.prof('exec_mkdir_done', uid=cu['uid'])
+        # make sure the sandbox exists.  It is usually created ahead of time by
+        # the agent staging input component, so we only need to check for it.
+        if not os.path.isdir(sandbox):
+            self._prof.prof('exec_mkdir', uid=cu['uid'])
+            rpu.rec_makedir(sandbox)
+            self._prof.prof('exec_mkdir_done', uid=cu['uid'])
         launch_script_name = '%s/%s.sh' % (sandbox, cu['uid'])
 
         self._log.debug("Created launch_script: %s", launch_script_name)
@@ -354,7 +358,11 @@ prof(){
 
         self._log.info("Launching unit %s via %s in %s", cu['uid'], cmdline, sandbox)
 
+        if self._first:
+            self._first = False
+            self._prof.prof('exec_first', uid=self._pilot_id)
         self._prof.prof('exec_start', uid=cu['uid'])
+        self._exec_start[cu['uid']] = time.time()
         cu['proc'] = subprocess.Popen(args       = cmdline,
                                       executable = None,
                                       stdin      = None,
@@ -416,9 +424,10 @@ prof(){
         action = 0
         for cu in self._cus_to_watch:
 
-            # poll subprocess object
-            exit_code = cu['proc'].poll()
-            uid       = cu['uid']
+            # poll subprocess object.  We collect the child via `wait4` to
+            # also obtain its resource usage.
+            exit_code, rusage = rpu.reap(cu['proc'])
+            uid               = cu['uid']
 
             if exit_code is None:
                 # Process is still running
@@ -441,7 +450,8 @@ prof(){
                     except OSError:
                         # unit is already gone, we ignore this
                         pass
-                    cu['proc'].wait()  # make sure proc is collected
+                    rpu.reap(cu['proc'], block=True)  # make sure proc is collected
+                    self._exec_start.pop(uid, None)
 
                     with self._cancel_lock:
                         self._cus_to_cancel.remove(uid)
@@ -459,15 +469,21 @@ prof(){
 
                 self._prof.prof('exec_stop', uid=uid)
 
-                # make sure proc is collected
-                cu['proc'].wait()
-
                 # we have a valid return code -- unit is final
                 action += 1
                 self._log.info("Unit %s has return code %s.", uid, exit_code)
 
                 cu['exit_code'] = exit_code
 
+                # record the resource usage of the unit (this covers the
+                # launch script and all processes it waited for, which
+                # excludes remote processes for MPI launch methods)
+                start = self._exec_start.pop(uid, None)
+                if rusage is not None:
+                    if start: rusage['wtime'] = time.time() - start
+                    else    : rusage['wtime'] = None
+                cu['rusage'] = rusage
+
                 # Free the Slots, Flee the Flots, Ree the Frots!
                 self._cus_to_watch.remove(cu)
                 del(cu['proc'])  # proc is not json serializable
@@ -4,6 +4,7 @@ __license__   = "MIT"
 
 
 import pprint
+import logging
 import radical.utils as ru
 
 from .base import LaunchMethod
@@ -130,8 +131,10 @@ class APRun(LaunchMethod):
             for gpu_slot in node[3]: nodes[node_id]['gpu'].append(gpu_slot)
 
 
-        self._log.debug('aprun slots: %s', pprint.pformat(slots))
-        self._log.debug('      nodes: %s', pprint.pformat(nodes))
+        debug = self._log.isEnabledFor(logging.DEBUG)
+        if debug:
+            self._log.debug('aprun slots: %s', pprint.pformat(slots))
+            self._log.debug('      nodes: %s', pprint.pformat(nodes))
 
         # create a node_spec for each node, which contains the aprun options for
         # that node to start the number of application processes on the given
@@ -142,8 +145,9 @@ class APRun(LaunchMethod):
             cpu_slots = nodes[node_id]['cpu']
             gpu_slots = nodes[node_id]['gpu']
 
-            self._log.debug('cpu_slots: %s', pprint.pformat(cpu_slots))
-            self._log.debug('gpu_slots: %s', pprint.pformat(gpu_slots))
+            if debug:
+                self._log.debug('cpu_slots: %s', pprint.pformat(cpu_slots))
+                self._log.debug('gpu_slots: %s', pprint.pformat(gpu_slots))
 
             assert(cpu_slots or gpu_slots)
 
@@ -4,6 +4,7 @@ __license__   = "MIT"
 
 
 import os
+import hashlib
 import fractions
 import tempfile
 import collections
@@ -50,6 +51,12 @@ class LaunchMethod(object):
     MPI_FLAVOR_HYDRA   = 'HYDRA'
     MPI_FLAVOR_UNKNOWN = 'unknown'
 
+    # host specs longer than this are passed via a hostfile (POSIX defines
+    # a min argument limit of 4096 bytes).  We cache a limited number of host
+    # specs per LM instance, as units are often placed on the same node sets.
+    HOST_SPEC_ARG_MAX    = 4096
+    HOST_SPEC_CACHE_SIZE = 1024
+
     # --------------------------------------------------------------------------
     #
     def __init__(self, cfg, session):
@@ -63,6 +70,9 @@ class LaunchMethod(object):
         # A per-launch_method list of environment to remove from the CU environment
         self.env_removables = []
 
+        # cache of host specs, see `_get_host_spec()`
+        self._host_specs = dict()
+
         self.launch_command = None
         
         self._configure()
@@ -281,6 +291,110 @@ class LaunchMethod(object):
         return hosts
 
 
+    # --------------------------------------------------------------------------
+    #
+    @classmethod
+    def _get_host_counts(cls, slots, name=None):
+        '''
+        Return a list of `[host, count]` tuples for the given slots, where
+        `count` is the number of cpu and gpu processes to place on that host
+        (threads are not accounted for).  Hosts are listed in order of their
+        first appearance in the slots -- multiple slots entries for the same
+        node are added up.  `name` can be a callable which derives the host
+        name from a slots node entry (default: `node[0]`).
+        '''
+
+        counts = collections.OrderedDict()
+        for node in slots['nodes']:
+            if name: host = name(node)
+            else   : host = node[0]
+            counts[host] = counts.get(host, 0) + len(node[2]) + len(node[3])
+
+        return [(host, count) for host, count in counts.iteritems() if count]
+
+
+    # --------------------------------------------------------------------------
+    #
+    def _get_host_spec(self, host_counts, flavor):
+        '''
+        Return the host specification for the given host counts (see
+        `_create_host_spec()`).  Specs are cached, so that we don't need to
+        recreate them (or rewrite hostfiles) when units get placed on the same
+        set of nodes again.
+        '''
+
+        key  = (flavor, tuple(host_counts))
+        spec = self._host_specs.get(key)
+
+        if not spec:
+            spec = self._create_host_spec(host_counts, flavor,
+                                          arg_max=self.HOST_SPEC_ARG_MAX)
+            if len(self._host_specs) >= self.HOST_SPEC_CACHE_SIZE:
+                self._host_specs.clear()
+            self._host_specs[key] = spec
+
+        return spec
+
+
+    # --------------------------------------------------------------------------
+    #
+    @classmethod
+    def _create_host_spec(cls, host_counts, flavor, arg_max=None, dirname=None):
+        '''
+        Create a compact host specification for an MPI launcher.  For known MPI
+        flavors, this uses the `host:count` syntax:
+
+            -host node_1:4,node_2:4,...
+
+        while unknown flavors get one host entry per process.  If the spec
+        exceeds `arg_max`, we write a hostfile instead and return
+        `-hostfile <name>`.  The hostfile is named after its content, so that
+        it is written only once for any node set.  It has the format
+
+            node_1 slots=4      (OMPI)
+            node_1:4            (HYDRA)
+            node_1              (unknown, one line per process)
+
+        Note that processes are grouped per host, in order of the host's first
+        appearance in `host_counts`.
+        '''
+
+        if not arg_max:
+            arg_max = cls.HOST_SPEC_ARG_MAX
+
+        if flavor in [cls.MPI_FLAVOR_OMPI, cls.MPI_FLAVOR_HYDRA]:
+            spec = '-host %s' % ','.join(['%s:%d' % (host, count)
+                                          for host, count in host_counts])
+        else:
+            spec = '-host %s' % ','.join([','.join([host] * count)
+                                          for host, count in host_counts])
+
+        if len(spec) <= arg_max:
+            return spec
+
+        if   flavor == cls.MPI_FLAVOR_OMPI : fmt = '%s slots=%d\n'
+        elif flavor == cls.MPI_FLAVOR_HYDRA: fmt = '%s:%d\n'
+        else                               : fmt = None
+
+        if fmt: data = ''.join([fmt % (host, count)
+                                for host, count in host_counts])
+        else  : data = ''.join([('%s\n' % host) * count
+                                for host, count in host_counts])
+
+        if not dirname:
+            dirname = os.getcwd()
+
+        fname = '%s/rp_hostfile.%s' % (dirname, hashlib.md5(data).hexdigest())
+        if not os.path.exists(fname):
+            # write atomically: concurrent writers create the same content
+            handle, tmp = tempfile.mkstemp(prefix='rp_hostfile', dir=dirname)
+            os.write(handle, data)
+            os.close(handle)
+            os.rename(tmp, fname)
+
+        return '-hostfile %s' % fname
+
+
     # --------------------------------------------------------------------------
     #
     def _create_arg_string(self, args):
@@ -65,63 +65,22 @@ class MPIExec(LaunchMethod):
             raise RuntimeError('insufficient information to launch via %s: %s'
                               % (self.name, slots))
 
-        # extract a map of hosts and #slots from slots.  We count cpu and gpu
+        # extract a list of hosts and #slots from slots.  We count cpu and gpu
         # slot sets, but do not account for threads.  Since multiple slots
         # entries can have the same node names, we *add* new information.
-        host_slots = dict()
-        for node in slots['nodes']:
-            node_name = node[0]
-            if node_name not in host_slots:
-                host_slots[node_name] = 0
-            host_slots[node_name] += len(node[2]) + len(node[3])  # cpu + gpu
-
-        # If we have a CU with many cores, and the compression didn't work
-        # out, we will create a hostfile and pass that as an argument
-        # instead of the individual hosts.  The hostfile has this format:
         #
-        #   node_name_1 slots=n_1
-        #   node_name_2 slots=n_2
-        #   ...
-        #
-        # where the slot number is the number of processes we intent to spawn,
-        # *including* GPU processes,
-        #
-        # For smaller node sets, we construct command line parameters as
-        # clusters of nodes with the same number of processes, like this:
-        #
-        #   -H node_name_1,node_name_2 -np 8 : -H node_name_3 -np 4 : ...
-        #
-        # POSIX defines a min argument limit of 4096 bytes, so we try to
-        # construct a command line, and switch to hostfile if that limit is
-        # exceeded.  We assume that Disk I/O for the hostfile is much larger
-        # than the time needed to construct the command line.
-        arg_max = 4096
-
-        # This is the command w/o the host string
-        command_stub = "%s %%s %s %s" % (self.launch_command, 
-                                         env_string, task_command)
-
-        # cluster hosts by number of slots
-        host_string = ''
-        for node,nslots in host_slots.iteritems():
-            host_string += '-H %s -np %s ' % (','.join([node] * nslots), nslots)
-        command = command_stub % host_string
-
-        if len(command) > arg_max:
-
-            # Create a hostfile from the list of hosts.  We create that in the
-            # unit sandbox
-            fname = '%s/mpi_hostfile' % cu['unit_sandbox']
-            with open(fname, 'w') as f:
-                for node,nslots in host_slots.iteritems():
-                    f.write('%20s \tslots=%s\n' % (node, nslots))
-            host_string = "-hostfile %s" % fname
-
-        command = command_stub % host_string
+        # The host spec uses the `host:count` syntax for known MPI flavors,
+        # and switches to a hostfile for large node sets (see
+        # `LaunchMethod._create_host_spec()`).  Specs are cached, so
+        # a hostfile is only written once for each node set.
+        host_counts = self._get_host_counts(slots)
+        host_string = self._get_host_spec(host_counts, self.mpi_flavor)
+        np          = sum([count for _, count in host_counts])
+
+        command = "%s -np %d %s %s %s" % (self.launch_command, np, host_string,
+                                          env_string, task_command)
         self._log.debug('mpiexec cmd: %s', command)
 
-        assert(len(command) <= arg_max)
-
         return command, None
 
 
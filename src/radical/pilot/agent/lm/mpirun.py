@@ -64,17 +64,13 @@ class MPIRun(LaunchMethod):
             raise RuntimeError('insufficient information to launch via %s: %s'
                               % (self.name, slots))
 
-        # Extract all the hosts from the slots
-        hostlist = list()
-        for node in slots['nodes']:
-            for cpu_proc in node[2]:
-                hostlist.append(node[0])
-            for gpu_proc in node[3]:
-                hostlist.append(node[0])
-        hosts_string = ",".join(hostlist)
-
-        command = "%s -np %d -host %s %s %s" \
-                % (self.launch_command, len(hostlist), hosts_string, 
+        # Extract all the hosts from the slots, as compact host spec
+        host_counts = self._get_host_counts(slots)
+        host_string = self._get_host_spec(host_counts, self.mpi_flavor)
+        np          = sum([count for _, count in host_counts])
+
+        command = "%s -np %d %s %s %s" \
+                % (self.launch_command, np, host_string,
                    env_string, task_command)
 
         return command, None
@@ -72,19 +72,15 @@ class MPIRunCCMRun(LaunchMethod):
             raise RuntimeError('insufficient information to launch via %s: %s'
                               % (self.name, slots))
 
-        # Extract all the hosts from the slots
+        # Extract all the hosts from the slots, as compact host spec
         # TODO: is there any use in using $HOME/.crayccm/ccm_nodelist.$JOBID?
-        hostlist = list()
-        for node in slots['nodes']:
-            for cpu_proc in node[2]:
-                hostlist.append(node[0])
-            for gpu_proc in node[3]:
-                hostlist.append(node[0])
-        hosts_string = ",".join(hostlist)
-
-        command = "%s %s -np %d -host %s %s %s" % \
-                  (self.ccmrun_command, self.launch_command, len(hostlist), 
-                   hosts_string, env_string, task_command)
+        host_counts = self._get_host_counts(slots)
+        host_string = self._get_host_spec(host_counts, self.mpi_flavor)
+        np          = sum([count for _, count in host_counts])
+
+        command = "%s %s -np %d %s %s %s" % \
+                  (self.ccmrun_command, self.launch_command, np,
+                   host_string, env_string, task_command)
 
         return command, None
 
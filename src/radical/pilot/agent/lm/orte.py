@@ -247,22 +247,8 @@ class ORTE(LaunchMethod):
                 env_string += '-x "%s" ' % var
 
         # Construct the hosts_string, env vars
-        hosts_string = ''
-        depths       = set()
+        depths = set()
         for node in slots['nodes']:
-
-            # On some Crays, like on ARCHER, the hostname is "archer_N".  In
-            # that case we strip off the part upto and including the underscore.
-            #
-            # TODO: If this ever becomes a problem, i.e. we encounter "real"
-            #       hostnames with underscores in it, or other hostname 
-            #       mangling, we need to turn this into a system specific 
-            #       regexp or so.
-            node_id = node[1].rsplit('_', 1)[-1] 
-
-            # add all cpu and gpu process slots to the node list.
-            for cpu_slot in node[2]: hosts_string += '%s,' % node_id
-            for gpu_slot in node[3]: hosts_string += '%s,' % node_id
             for cpu_slot in node[2]: depths.add(len(cpu_slot))
 
         assert(len(depths) == 1), depths
@@ -272,8 +258,18 @@ class ORTE(LaunchMethod):
         if depth > 1: map_flag = '--bind-to none --map-by ppr:%d:core' % depth
         else        : map_flag = '--bind-to none'
 
-        # remove trailing ','
-        hosts_string = hosts_string.rstrip(',')
+        # On some Crays, like on ARCHER, the hostname is "archer_N".  In
+        # that case we strip off the part upto and including the underscore.
+        #
+        # TODO: If this ever becomes a problem, i.e. we encounter "real"
+        #       hostnames with underscores in it, or other hostname 
+        #       mangling, we need to turn this into a system specific 
+        #       regexp or so.
+        #
+        # All cpu and gpu process slots are added to the (compact) host spec.
+        host_counts  = self._get_host_counts(slots,
+                                   name=lambda node: node[1].rsplit('_', 1)[-1])
+        hosts_string = self._get_host_spec(host_counts, self.MPI_FLAVOR_OMPI)
 
         # Additional (debug) arguments to orterun
         if os.environ.get('RADICAL_PILOT_ORTE_VERBOSE'):
@@ -290,7 +286,7 @@ class ORTE(LaunchMethod):
         if task_mpi: np_flag = '-np %s' % task_cores
         else       : np_flag = '-np 1'
 
-        command = '%s %s --hnp "%s" %s %s -host %s %s %s' % (
+        command = '%s %s --hnp "%s" %s %s %s %s %s' % (
                   self.launch_command, debug_string, dvm_uri, np_flag,
                   map_flag, hosts_string, env_string, task_command)
 
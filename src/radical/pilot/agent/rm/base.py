@@ -145,6 +145,7 @@ class LRMS(object):
         launch_methods.add(self._cfg['task_launch_method'])
         launch_methods.add(self._cfg['agent_launch_method'])
 
+        self._prof.prof('lm_hooks_start', uid=self._cfg['pilot_id'])
         for lm in launch_methods:
             if lm:
                 try:
@@ -157,6 +158,7 @@ class LRMS(object):
                     raise
 
                 self._log.info("lrms config hook succeeded (%s)" % lm)
+        self._prof.prof('lm_hooks_stop', uid=self._cfg['pilot_id'])
 
         # For now assume that all nodes have equal amount of cores and gpus
         cores_avail = (len(self.node_list) + len(self.agent_nodes)) * self.cores_per_node
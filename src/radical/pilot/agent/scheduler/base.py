@@ -276,8 +276,15 @@ class AgentSchedulingComponent(rpu.Component):
 
         # configure the scheduler instance
         self._configure()
-        self._log.debug("slot status after  init      : %s", 
-                        self.slot_status())
+
+        if self._log.isEnabledFor(logging.DEBUG):
+            self._log.debug("slot status after  init      : %s",
+                            self.slot_status())
+
+        # report resource usage to agent_0 (see `Agent_0._metrics_cb()`)
+        if self._cfg.get('metrics_interval'):
+            self.register_timed_cb(self._metrics_cb,
+                                   timer=self._cfg['metrics_interval'])
 
 
     # --------------------------------------------------------------------------
@@ -380,6 +387,47 @@ class AgentSchedulingComponent(rpu.Component):
         return ret
 
 
+    # --------------------------------------------------------------------------
+    #
+    def slot_counts(self):
+        '''
+        Returns a dict with the number of busy and free cores and gpus, or
+        `None` if the scheduler does not maintain a node list
+        '''
+
+        if not isinstance(self.nodes, list):
+            return None
+
+        ret = {'cores' : [0, 0],
+               'gpus'  : [0, 0]}
+
+        for node in self.nodes:
+            busy = len(node['cores']) - node['cores'].count(rpc.FREE)
+            ret['cores'][0] += busy
+            ret['cores'][1] += len(node['cores']) - busy
+
+            busy = len(node['gpus']) - node['gpus'].count(rpc.FREE)
+            ret['gpus'][0] += busy
+            ret['gpus'][1] += len(node['gpus']) - busy
+
+        return ret
+
+
+    # --------------------------------------------------------------------------
+    #
+    def _metrics_cb(self):
+
+        with self._slot_lock:
+            counts = self.slot_counts() or dict()
+
+        counts['sender']    = self.uid
+        counts['wait_pool'] = len(self._wait_pool)
+
+        self.publish(rpc.CONTROL_PUBSUB, {'cmd' : 'scheduler_metrics',
+                                          'arg' : counts})
+        return True
+
+
     # --------------------------------------------------------------------------
     #
     def _configure(self):
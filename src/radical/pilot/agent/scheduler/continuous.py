@@ -4,6 +4,7 @@ __license__   = "MIT"
 
 
 import os
+import logging
 
 import radical.utils as ru
 
@@ -392,6 +393,9 @@ class Continuous(AgentSchedulingComponent):
                          'lm_info'       : self._lrms_lm_info
                          }
 
+        # core lists can be long, don't log them unless needed
+        debug = self._log.isEnabledFor(logging.DEBUG)
+
         # start the search
         for node in self.nodes:
 
@@ -438,7 +442,8 @@ class Continuous(AgentSchedulingComponent):
 
             # we found something - add to the existing allocation, switch gears
             # (not first anymore), and try to find more if needed
-            self._log.debug('found %s cores, %s gpus', cores, gpus)
+            if debug:
+                self._log.debug('found %s cores, %s gpus', cores, gpus)
             core_map, gpu_map = self._get_node_maps(cores, gpus, threads_per_proc)
             slots['nodes'].append([node_name, node_uid, core_map, gpu_map])
 
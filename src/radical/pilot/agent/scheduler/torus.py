@@ -71,6 +71,22 @@ class Torus(AgentSchedulingComponent):
                 'slotstate': slot_matrix}
 
 
+    # --------------------------------------------------------------------------
+    #
+    def slot_counts(self):
+
+        busy = 0
+        for slot in self._lrms.torus_block:
+            if slot[self.TORUS_BLOCK_STATUS] != rpc.FREE:
+                busy += 1
+
+        free = len(self._lrms.torus_block) - busy
+
+        return {'cores' : [busy * self._lrms_cores_per_node,
+                           free * self._lrms_cores_per_node],
+                'gpus'  : [0, 0]}
+
+
     # --------------------------------------------------------------------------
     #
     # Allocate a number of cores
@@ -7,6 +7,7 @@ import os
 import errno
 import shutil
 import tarfile
+import threading     as mt
 
 import saga          as rs
 import radical.utils as ru
@@ -18,7 +19,7 @@ from ...  import constants as rpc
 
 from .base import AgentStagingInputComponent
 
-from ...staging_directives import complete_url
+from ...staging_directives import StagingResolver
 
 
 # ==============================================================================
@@ -43,7 +44,8 @@ class Default(AgentStagingInputComponent):
     #
     def initialize_child(self):
 
-        self._pwd = os.getcwd()
+        self._pwd      = os.getcwd()
+        self._resolver = StagingResolver(self._log)
 
         self.register_input(rps.AGENT_STAGING_INPUT_PENDING,
                             rpc.AGENT_STAGING_INPUT_QUEUE, self.work)
@@ -51,6 +53,32 @@ class Default(AgentStagingInputComponent):
         self.register_output(rps.AGENT_SCHEDULING_PENDING, 
                              rpc.AGENT_SCHEDULING_QUEUE)
 
+        # staging directives are enacted concurrently by a pool of workers
+        cfg         = self._cfg
+        self._small = cfg.get('staging_small_file', rpu.STAGING_SMALL_FILE)
+        self._pool  = rpu.StagingPool(name='%s.pool' % self.uid, log=self._log,
+                                      stage=self._handle_unit,
+                                      n_meta=cfg.get('staging_meta_workers'),
+                                      n_data=cfg.get('staging_data_workers'))
+        self.register_timed_cb(self._staging_done_cb, timer=0.1)
+
+        # tarballs are shared by units, and are extracted only once.  The lock
+        # only guards `_tar_done`, which maps tarballs to dicts with
+        #   'busy'   : event which is set once a running extraction finished
+        #   'ok'     : the tarball has been extracted
+        #   'handled': number of units sharing the tarball which are handled
+        # Entries are dropped once all units sharing the tarball are handled.
+        self._tar_lock = mt.Lock()
+        self._tar_done = dict()
+
+
+    # --------------------------------------------------------------------------
+    #
+    def finalize_child(self):
+
+        self.unregister_timed_cb(self._staging_done_cb)
+        self._pool.stop()
+
 
     # --------------------------------------------------------------------------
     #
@@ -64,8 +92,9 @@ class Default(AgentStagingInputComponent):
         ru.raise_on('work bulk')
 
         # we first filter out any units which don't need any input staging, and
-        # advance them again as a bulk.  We work over the others one by one, and
-        # advance them individually, to avoid stalling from slow staging ops.
+        # advance them again as a bulk.  The others are handed to the staging
+        # pool, and are advanced individually once their staging is done (see
+        # `_staging_done_cb()`), to avoid stalling from slow staging ops.
         
         no_staging_units = list()
         staging_units    = list()
@@ -77,6 +106,11 @@ class Default(AgentStagingInputComponent):
             actionables = list()
             for sd in unit['description'].get('input_staging', []):
 
+                # tarball directives are handled by the umgr, which adds
+                # a separate, marked directive to extract the tarball
+                if sd['action'] == rpc.TARBALL and not sd.get('extract'):
+                    continue
+
                 if sd['action'] in [rpc.LINK, rpc.COPY, rpc.MOVE, rpc.TARBALL]:
                     actionables.append(sd)
 
@@ -86,25 +120,65 @@ class Default(AgentStagingInputComponent):
                 no_staging_units.append(unit)
 
 
+        # the executor would otherwise create the unit sandboxes on its
+        # critical path -- we create them here, in bulk, ahead of time
+        self._create_sandboxes(no_staging_units)
+
         if no_staging_units:
             self.advance(no_staging_units, rps.AGENT_SCHEDULING_PENDING,
                          publish=True, push=True)
 
         for unit,actionables in staging_units:
-            self._handle_unit(unit, actionables)
+            self._pool.submit(unit, actionables,
+                              self._get_lane(unit, actionables))
 
 
     # --------------------------------------------------------------------------
     #
-    def _handle_unit(self, unit, actionables):
+    def _create_sandboxes(self, units):
+        '''
+        Create the sandboxes for the given units.  Failures are only logged:
+        the executor will attempt to create any missing sandbox again.
+        '''
 
-        ru.raise_on('work unit')
+        if not units:
+            return
 
-        uid = unit['uid']
+        self._prof.prof('staging_in_mkdir', msg=len(units))
 
-        # NOTE: see documentation of cu['sandbox'] semantics in the ComputeUnit
-        #       class definition.
-        sandbox = unit['unit_sandbox']
+        for unit in units:
+            sandbox = ru.Url(unit['unit_sandbox']).path
+            try:
+                rpu.rec_makedir(sandbox)
+            except Exception:
+                self._log.exception('cannot create sandbox %s', sandbox)
+
+        self._prof.prof('staging_in_mkdir_done', msg=len(units))
+
+
+    # --------------------------------------------------------------------------
+    #
+    def _staging_done_cb(self):
+
+        done   = list()
+        failed = list()
+        for unit, error in self._pool.get_done():
+            if error: failed.append(unit)
+            else    : done.append(unit)
+
+        # all staging is done -- pass on to the scheduler
+        if done:
+            self.advance(done, rps.AGENT_SCHEDULING_PENDING,
+                         publish=True, push=True)
+        if failed:
+            self.advance(failed, rps.FAILED, publish=True, push=False)
+
+        return True
+
+
+    # --------------------------------------------------------------------------
+    #
+    def _get_contexts(self, unit):
 
         # By definition, this compoentn lives on the pilot's target resource.
         # As such, we *know* that all staging ops which would refer to the
@@ -114,30 +188,75 @@ class Default(AgentStagingInputComponent):
         #
         #   * paths are directly translatable across schemas
         #   * resource level storage is in fact accessible via file://
-        #
-        # FIXME: this is costly and should be cached.
 
-        unit_sandbox     = ru.Url(unit['unit_sandbox'])
-        pilot_sandbox    = ru.Url(unit['pilot_sandbox'])
-        resource_sandbox = ru.Url(unit['resource_sandbox'])
+        unit_sandbox     = self._resolver.localize(unit['unit_sandbox'])
+        pilot_sandbox    = self._resolver.localize(unit['pilot_sandbox'])
+        resource_sandbox = self._resolver.localize(unit['resource_sandbox'])
+
+        src_context = {'pwd'      : unit_sandbox,       # !!!
+                       'unit'     : unit_sandbox, 
+                       'pilot'    : pilot_sandbox, 
+                       'resource' : resource_sandbox}
+        tgt_context = {'pwd'      : unit_sandbox,       # !!!
+                       'unit'     : unit_sandbox, 
+                       'pilot'    : pilot_sandbox, 
+                       'resource' : resource_sandbox}
+
+        return src_context, tgt_context
 
-        unit_sandbox.schema     = 'file'
-        pilot_sandbox.schema    = 'file'
-        resource_sandbox.schema = 'file'
 
-        unit_sandbox.host       = 'localhost'
-        pilot_sandbox.host      = 'localhost'
-        resource_sandbox.host   = 'localhost'
+    # --------------------------------------------------------------------------
+    #
+    def _get_lane(self, unit, actionables):
 
-        src_context = {'pwd'      : str(unit_sandbox),       # !!!
-                       'unit'     : str(unit_sandbox), 
-                       'pilot'    : str(pilot_sandbox), 
-                       'resource' : str(resource_sandbox)}
-        tgt_context = {'pwd'      : str(unit_sandbox),       # !!!
-                       'unit'     : str(unit_sandbox), 
-                       'pilot'    : str(pilot_sandbox), 
-                       'resource' : str(resource_sandbox)}
+        src_context, _ = self._get_contexts(unit)
 
+        def _resolve(src):
+            # client side sources are not staged here
+            if src.startswith('client://'):
+                return None
+            return self._resolver.path(src, src_context)
+
+        return rpu.StagingPool.get_lane(actionables, _resolve, self._small)
+
+
+    # --------------------------------------------------------------------------
+    #
+    def _handle_unit(self, unit, actionables):
+        '''
+        enact the staging directives of a unit -- this runs in the staging pool
+        '''
+
+        try:
+            self._stage_unit(unit, actionables)
+
+        finally:
+            # the unit is done with any tarball it shares, whether it got
+            # staged or not
+            _, tgt_context = self._get_contexts(unit)
+            for sd in actionables:
+                if sd['action'] == rpc.TARBALL and sd.get('extract'):
+                    tarball = self._resolver.path(sd['target'], tgt_context)
+                    self._tarball_handled(tarball, sd.get('members'))
+
+
+    # --------------------------------------------------------------------------
+    #
+    def _stage_unit(self, unit, actionables):
+
+        ru.raise_on('work unit')
+
+        uid = unit['uid']
+
+        # NOTE: see documentation of cu['sandbox'] semantics in the ComputeUnit
+        #       class definition.
+        sandbox = unit['unit_sandbox']
+
+        src_context, tgt_context = self._get_contexts(unit)
+
+        # the sandbox is needed for staging anyway, and is then available for
+        # the executor
+        self._create_sandboxes([unit])
 
         # we can now handle the actionable staging directives
         for sd in actionables:
@@ -152,8 +271,17 @@ class Default(AgentStagingInputComponent):
 
             assert(action in [rpc.COPY, rpc.LINK, rpc.MOVE, rpc.TRANSFER, rpc.TARBALL])
 
+            # The original tarball directives are handled by the umgr, no
+            # matter what their source is: the umgr packs their files into
+            # a tarball, and adds a separate directive to extract it, which is
+            # marked via 'extract'.
+            if action == rpc.TARBALL and not sd.get('extract'):
+                self._log.debug('skip tarball staging for src %s', src)
+                self._prof.prof('staging_in_skip', uid=uid, msg=did)
+                continue
+
             # we only handle staging which does *not* include 'client://' src or
-            # tgt URLs - those are handled by the umgr staging components
+            # tgt URLs - those are handled by the umgr staging components.
             if src.startswith('client://') and action != rpc.TARBALL:
                 self._log.debug('skip staging for src %s', src)
                 self._prof.prof('staging_in_skip', uid=uid, msg=did)
@@ -177,8 +305,8 @@ class Default(AgentStagingInputComponent):
                 tgt = os.path.join(tgt, os.path.basename(src))
 
 
-            src = complete_url(src, src_context, self._log)
-            tgt = complete_url(tgt, tgt_context, self._log)
+            src = self._resolver.url(src, src_context)
+            tgt = self._resolver.url(tgt, tgt_context)
 
             # Currently, we use the same schema for files and folders.
             assert(tgt.schema == 'file'), 'staging tgt must be file://'
@@ -240,23 +368,80 @@ class Default(AgentStagingInputComponent):
             elif action == rpc.TARBALL:
 
                 # If somethig was staged via the tarball method, the tarball is
-                # extracted and then removed from the unit folder.  The target
-                # path is expected to be an *absolute* path on the target system
-                # - any relative paths specified by the application are expected
-                # to get expanded on the client side.
-                tarball = '%s/%s.tar' % (os.path.dirname(tgt.path), uid)
+                # extracted.  The paths in the tarball are expected to be
+                # *absolute* paths on the target system - any relative paths
+                # specified by the application are expected to get expanded on
+                # the client side.  The umgr packs the inputs of all units of
+                # a bulk into one tarball, so it is extracted for whichever of
+                # those units comes first.
+                self._extract_tarball(tgt.path)
+
+              # FIXME: make tarball removal dependent on debug settings
+              # os.remove(tarball)
+
+            self._prof.prof('staging_in_stop', uid=uid, msg=did)
+
+
+    # --------------------------------------------------------------------------
+    #
+    def _extract_tarball(self, tarball):
+        '''
+        Extract the tarball, unless that was done for another unit already.
+        Concurrent callers wait for a running extraction.  If that fails, its
+        caller raises, and the next caller tries again.
+        '''
+
+        while True:
+
+            with self._tar_lock:
+                tar_state = self._tar_done.setdefault(tarball,
+                                    {'busy' : None, 'ok' : False, 'handled' : 0})
+                if tar_state['ok']:
+                    return
+
+                busy  = tar_state['busy']
+                owner = not busy
+                if owner:
+                    busy = tar_state['busy'] = mt.Event()
+
+            if not owner:
+                busy.wait()
+                continue
+
+            ok = False
+            try:
                 self._log.debug('extract tarball for %s', tarball)
                 tar = tarfile.open(tarball)
                 tar.extractall(path='/')
                 tar.close()
+                ok = True
 
-              # FIXME: make tarball removal dependent on debug settings
-              # os.remove(os.path.dirname(tgt.path) + '/' + uid + '.tar')
+            finally:
+                with self._tar_lock:
+                    tar_state['ok']   = ok
+                    tar_state['busy'] = None
+                busy.set()
 
-            self._prof.prof('staging_in_stop', uid=uid, msg=did)
+            return
 
-        # all staging is done -- pass on to the scheduler
-        self.advance(unit, rps.AGENT_SCHEDULING_PENDING, publish=True, push=True)
+
+    # --------------------------------------------------------------------------
+    #
+    def _tarball_handled(self, tarball, members):
+        '''
+        Count a unit sharing the tarball as handled, and forget the tarball once
+        all its `members` units are handled.
+        '''
+
+        if not members:
+            return
+
+        with self._tar_lock:
+            tar_state = self._tar_done.setdefault(tarball,
+                                {'busy' : None, 'ok' : False, 'handled' : 0})
+            tar_state['handled'] += 1
+            if tar_state['handled'] >= members:
+                del(self._tar_done[tarball])
 
 
 # ------------------------------------------------------------------------------
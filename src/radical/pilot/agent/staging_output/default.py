@@ -4,8 +4,10 @@ __license__   = "MIT"
 
 
 import os
+import time
 import errno
 import shutil
+import tarfile
 
 import saga          as rs
 import radical.utils as ru
@@ -17,7 +19,21 @@ from ...  import constants as rpc
 
 from .base import AgentStagingOutputComponent
 
-from ...staging_directives import complete_url
+from ...staging_directives import StagingResolver
+
+
+# Small output files which are transferred to the client are not fetched one by
+# one: the outputs of units which finish close together are packed into rolling
+# archives in the pilot sandbox, and the umgr fetches and unpacks each archive
+# once.  An archive is closed once it holds `STAGING_ARCHIVE_SIZE` bytes, or
+# `STAGING_ARCHIVE_DELAY` seconds after its first unit arrived.  Files larger
+# than `STAGING_ARCHIVE_MAX_FILE` (and directories) are fetched individually.
+# All settings can be overwritten in the agent config.
+STAGING_ARCHIVE           = True
+STAGING_ARCHIVE_DIR       = 'staging_output'
+STAGING_ARCHIVE_MAX_FILE  = 1024 * 1024
+STAGING_ARCHIVE_SIZE      = 64 * 1024 * 1024
+STAGING_ARCHIVE_DELAY     = 1.0
 
 
 # ------------------------------------------------------------------------------
@@ -46,7 +62,25 @@ class Default(AgentStagingOutputComponent):
     #
     def initialize_child(self):
 
-        self._pwd = os.getcwd()
+        self._pwd      = os.getcwd()
+        self._resolver = StagingResolver(self._log)
+
+        # Unit profiles are merged in bulk into a separate profile, instead of
+        # replaying each event through our own profiler.  The unit events have
+        # absolute timestamps, and we align that profile to ours via
+        # a `sync_rel` event pair (as is done for `bootstrap_0.prof`).
+        self._uprof = None
+        if self._prof.enabled:
+            now   = time.time()
+            msg   = '%s units' % self.uid
+            fname = '%s/%s.units.prof' % (self._session._logdir, self.uid)
+
+            self._prof.prof('sync_rel', msg=msg, uid=self.uid, timestamp=now)
+            self._uprof = open(fname, 'a')
+            self._uprof.write('#time,name,uid,state,event,msg\n')
+            self._uprof.write('%.4f,sync_rel,%s,MainThread,%s,,%s\n'
+                             % (now, self.uid, self.uid, msg))
+            self._uprof.flush()
 
         self.register_input(rps.AGENT_STAGING_OUTPUT_PENDING, 
                             rpc.AGENT_STAGING_OUTPUT_QUEUE, self.work)
@@ -54,6 +88,53 @@ class Default(AgentStagingOutputComponent):
         # we don't need an output queue -- units are picked up via mongodb
         self.register_output(rps.UMGR_STAGING_OUTPUT_PENDING, None) # drop units
 
+        # staging directives are enacted concurrently by a pool of workers
+        cfg         = self._cfg
+        self._small = cfg.get('staging_small_file', rpu.STAGING_SMALL_FILE)
+        self._pool  = rpu.StagingPool(name='%s.pool' % self.uid, log=self._log,
+                                      stage=self._handle_unit_staging,
+                                      n_meta=cfg.get('staging_meta_workers'),
+                                      n_data=cfg.get('staging_data_workers'))
+        self.register_timed_cb(self._staging_done_cb, timer=0.1)
+
+        # output archives for the umgr
+        self._ar_enabled  = cfg.get('staging_archive',          STAGING_ARCHIVE)
+        self._ar_max_file = cfg.get('staging_archive_max_file', STAGING_ARCHIVE_MAX_FILE)
+        self._ar_size     = cfg.get('staging_archive_size',     STAGING_ARCHIVE_SIZE)
+        self._ar_delay    = cfg.get('staging_archive_delay',    STAGING_ARCHIVE_DELAY)
+        self._ar_units    = list()  # [unit, members] held back for the archive
+        self._ar_bytes    = 0       # size of those members
+        self._ar_start    = None    # arrival of the first of those units
+        self._ar_count    = 0       # number of archives created so far
+
+        if self._ar_enabled:
+            self.register_timed_cb(self._archive_cb,
+                                   timer=min(self._ar_delay, 1.0))
+
+        # sandboxes of units with `cleanup` set are removed in the background
+        self._cleaner = rpu.SandboxCleaner(name='%s.cleaner' % self.uid,
+                                           log=self._log, prof=self._prof,
+                                           bulk_size=cfg.get('cleanup_bulk_size'),
+                                           delay=cfg.get('cleanup_delay'),
+                                           rate=cfg.get('cleanup_rate'))
+
+
+    # --------------------------------------------------------------------------
+    #
+    def finalize_child(self):
+
+        self.unregister_timed_cb(self._staging_done_cb)
+        self._pool.stop()
+
+        if self._ar_enabled:
+            self.unregister_timed_cb(self._archive_cb)
+
+        self._cleaner.stop()
+
+        if self._uprof:
+            self._uprof.close()
+            self._uprof = None
+
 
     # --------------------------------------------------------------------------
     #
@@ -72,6 +153,7 @@ class Default(AgentStagingOutputComponent):
         
         no_staging_units = list()
         staging_units    = list()
+        unit_profs       = list()
 
         for unit in units:
 
@@ -84,7 +166,7 @@ class Default(AgentStagingOutputComponent):
             unit['control'] = 'umgr_pending'
 
             # we always dig for stdout/stderr
-            self._handle_unit_stdio(unit)
+            self._handle_unit_stdio(unit, unit_profs)
 
             # NOTE: all units get here after execution, even those which did not
             #       finish successfully.  We do that so that we can make
@@ -114,16 +196,273 @@ class Default(AgentStagingOutputComponent):
                 unit['state'] = rps.UMGR_STAGING_OUTPUT_PENDING
                 no_staging_units.append(unit)
 
+        # merge all unit profiles of this bulk in one write
+        if unit_profs:
+            self._uprof.write(''.join(unit_profs))
+            self._uprof.flush()
+
+        # units with small outputs for the client wait for the next archive
+        no_staging_units = self._collect(no_staging_units)
+
         if no_staging_units:
+            self._cleanup(no_staging_units)
             self.advance(no_staging_units, publish=True, push=True)
 
         for unit,actionables in staging_units:
-            self._handle_unit_staging(unit, actionables)
+            self._pool.submit(unit, actionables,
+                              self._get_lane(unit, actionables))
+
+
+    # --------------------------------------------------------------------------
+    #
+    def _staging_done_cb(self):
+
+        done   = list()
+        failed = list()
+        for unit, error in self._pool.get_done():
+            if error: failed.append(unit)
+            else    : done.append(unit)
+
+        # all agent staging is done -- pass on to umgr output staging (unless
+        # the units wait for an output archive)
+        done = self._collect(done)
+
+        self._cleanup(done + failed)
+
+        if done:
+            self.advance(done, rps.UMGR_STAGING_OUTPUT_PENDING,
+                         publish=True, push=False)
+        if failed:
+            self.advance(failed, rps.FAILED, publish=True, push=False)
+
+        return True
+
+
+    # --------------------------------------------------------------------------
+    #
+    def _get_archive_members(self, unit):
+        '''
+        Return `[sd, path, size]` for all output directives of the unit which
+        transfer a small local file to the client.
+        '''
+
+        src_context, _ = self._get_contexts(unit)
+        members        = list()
+
+        for sd in unit['description'].get('output_staging', []):
+
+            if sd['action'] != rpc.TRANSFER:
+                continue
+
+            src = sd['source']
+            tgt = sd['target']
+
+            if src.startswith('client://'):
+                continue
+
+            # the umgr extracts archives locally, so other targets are left to
+            # the regular transfer
+            if tgt:
+                tgt_url = ru.Url(tgt)
+                if tgt_url.schema not in [None, '', 'client', 'file'] or \
+                   tgt_url.host   not in [None, '', 'localhost']:
+                    continue
+
+            path = self._resolver.path(src, src_context)
+            if not os.path.isfile(path):
+                continue
+
+            size = os.path.getsize(path)
+            if size > self._ar_max_file:
+                continue
+
+            members.append([sd, path, size])
+
+        return members
+
+
+    # --------------------------------------------------------------------------
+    #
+    def _collect(self, units):
+        '''
+        Hold back units which have output files to be packed into an archive
+        (see `_archive()`).  Returns the units which can be advanced right away.
+        '''
+
+        if not self._ar_enabled:
+            return units
+
+        ret = list()
+        for unit in units:
+
+            if unit['target_state'] != rps.DONE:
+                ret.append(unit)
+                continue
+
+            members = self._get_archive_members(unit)
+            if not members:
+                ret.append(unit)
+                continue
+
+            if not self._ar_units:
+                self._ar_start = time.time()
+
+            self._ar_units.append([unit, members])
+            self._ar_bytes += sum([size for _, _, size in members])
+
+        if self._ar_bytes >= self._ar_size:
+            self._archive()
+
+        return ret
+
+
+    # --------------------------------------------------------------------------
+    #
+    def _archive_cb(self):
+
+        if self._ar_units and time.time() - self._ar_start >= self._ar_delay:
+            self._archive()
+
+        return True
+
+
+    # --------------------------------------------------------------------------
+    #
+    def _archive(self):
+        '''
+        Pack the outputs of all held back units into an archive in the pilot
+        sandbox, and pass the units on to the umgr.  The directives are marked
+        with the archive URL and member name, so that the umgr can fetch and
+        extract the file.  If a unit's files cannot be packed, its directives
+        are left unmarked, and are transferred individually.
+        '''
+
+        ar_units       = self._ar_units
+        self._ar_units = list()
+        self._ar_bytes = 0
+        self._ar_start = None
+
+        if not ar_units:
+            return
+
+        self._ar_count += 1
+        ar_url = 'pilot:///%s/%s.%06d.tar' % (STAGING_ARCHIVE_DIR, self.uid,
+                                              self._ar_count)
+
+        _, tgt_context = self._get_contexts(ar_units[0][0])
+        ar_path = self._resolver.path(ar_url, tgt_context)
+        units   = [unit for unit, _ in ar_units]
+
+        try:
+            rpu.rec_makedir(os.path.dirname(ar_path))
+            tar = tarfile.open(ar_path, mode='w')
+
+        except Exception:
+            self._log.exception('cannot create output archive %s', ar_path)
+            tar = None
+
+        for unit, members in ar_units:
+
+            if not tar:
+                break
+
+            uid = unit['uid']
+            try:
+                for sd, path, _ in members:
+                    self._prof.prof('staging_out_tar_start', uid=uid, msg=sd['uid'])
+                    member = '%s/%s' % (uid, sd['uid'])
+                    tar.add(path, arcname=member)
+                    sd['archive'] = ar_url
+                    sd['member']  = member
+                    self._prof.prof('staging_out_tar_stop', uid=uid, msg=sd['uid'])
+
+            except Exception:
+                self._log.exception('cannot archive outputs of %s', uid)
+                for sd, _, _ in members:
+                    sd.pop('archive', None)
+                    sd.pop('member',  None)
+
+        if tar:
+            try:
+                tar.close()
+
+            except Exception:
+                self._log.exception('cannot close output archive %s', ar_path)
+                for _, members in ar_units:
+                    for sd, _, _ in members:
+                        sd.pop('archive', None)
+                        sd.pop('member',  None)
+
+        # the umgr keeps its copy of the archive until all members are extracted
+        archived = [sd for _, members in ar_units
+                       for sd, _, _ in members if sd.get('archive')]
+        for sd in archived:
+            sd['archive_members'] = len(archived)
+
+        self._cleanup(units)
+        self.advance(units, rps.UMGR_STAGING_OUTPUT_PENDING,
+                     publish=True, push=False)
 
 
     # --------------------------------------------------------------------------
     #
-    def _handle_unit_stdio(self, unit):
+    def _get_cleanup_sandbox(self, unit):
+        '''
+        Return the local sandbox path of a unit which requested `cleanup`, or
+        `None` if the sandbox is still needed: the umgr has yet to fetch files
+        from it which are not archived, or an output directive linked to files
+        inside of it.
+        '''
+
+        if not unit['description'].get('cleanup'):
+            return None
+
+        src_context, _ = self._get_contexts(unit)
+
+        sandbox = os.path.normpath(ru.Url(unit['unit_sandbox']).path)
+        pilot   = os.path.normpath(ru.Url(unit['pilot_sandbox']).path)
+
+        # never remove anything outside of the pilot sandbox
+        if not sandbox.startswith(pilot + '/'):
+            self._log.warn('skip cleanup of %s (not in %s)', sandbox, pilot)
+            return None
+
+        for sd in unit['description'].get('output_staging', []):
+
+            if sd['action'] == rpc.TRANSFER:
+                if sd.get('archive') or sd['source'].startswith('client://'):
+                    continue
+
+            elif sd['action'] != rpc.LINK:
+                continue
+
+            path = os.path.normpath(self._resolver.path(sd['source'],
+                                                        src_context))
+            if path == sandbox or path.startswith(sandbox + '/'):
+                self._log.debug('skip cleanup of %s (%s)', sandbox, sd['uid'])
+                return None
+
+        return sandbox
+
+
+    # --------------------------------------------------------------------------
+    #
+    def _cleanup(self, units):
+        '''
+        Hand the sandboxes of the given units to the cleaner.  This is called
+        right before the units are passed on to the umgr, so all agent side
+        staging is done by then.
+        '''
+
+        for unit in units:
+            sandbox = self._get_cleanup_sandbox(unit)
+            if sandbox:
+                self._cleaner.submit(unit['uid'], sandbox)
+
+
+    # --------------------------------------------------------------------------
+    #
+    def _handle_unit_stdio(self, unit, unit_profs):
 
         sandbox = ru.Url(unit['unit_sandbox']).path
         uid     = unit['uid']
@@ -132,42 +471,38 @@ class Default(AgentStagingOutputComponent):
 
         # TODO: disable this at scale?
         if os.path.isfile(unit['stdout_file']):
-            with open(unit['stdout_file'], 'r') as stdout_f:
-                try:
-                    txt = unicode(stdout_f.read(), "utf-8")
-                except UnicodeDecodeError:
-                    txt = "unit stdout is binary -- use file staging"
+            try:
+                txt = rpu.tail_file(unit['stdout_file'])
+            except UnicodeDecodeError:
+                txt = "unit stdout is binary -- use file staging"
 
-                unit['stdout'] += rpu.tail(txt)
+            unit['stdout'] += txt
 
         self._prof.prof('staging_stdout_stop',  uid=uid)
         self._prof.prof('staging_stderr_start', uid=uid)
 
         # TODO: disable this at scale?
         if os.path.isfile(unit['stderr_file']):
-            with open(unit['stderr_file'], 'r') as stderr_f:
-                try:
-                    txt = unicode(stderr_f.read(), "utf-8")
-                except UnicodeDecodeError:
-                    txt = "unit stderr is binary -- use file staging"
+            try:
+                txt = rpu.tail_file(unit['stderr_file'])
+            except UnicodeDecodeError:
+                txt = "unit stderr is binary -- use file staging"
 
-                unit['stderr'] += rpu.tail(txt)
+            unit['stderr'] += txt
 
         self._prof.prof('staging_stderr_stop', uid=uid)
         self._prof.prof('staging_uprof_start', uid=uid)
 
         unit_prof = "%s/%s.prof" % (sandbox, uid)
 
-        if os.path.isfile(unit_prof):
+        # the raw unit profile is collected here, and merged in `work()`
+        if self._uprof and os.path.isfile(unit_prof):
             try:
                 with open(unit_prof, 'r') as prof_f:
                     txt = prof_f.read()
-                    for line in txt.split("\n"):
-                        if line:
-                            ts, event, comp, tid, _uid, state, msg = line.split(',')
-                            self._prof.prof(timestamp=float(ts), event=event,
-                                            comp=comp, tid=tid, uid=_uid,
-                                            state=state, msg=msg)
+                    if txt and not txt.endswith('\n'):
+                        txt += '\n'
+                    unit_profs.append(txt)
             except Exception as e:
                 self._log.error("Pre/Post profile read failed: `%s`" % e)
 
@@ -176,15 +511,7 @@ class Default(AgentStagingOutputComponent):
 
     # --------------------------------------------------------------------------
     #
-    def _handle_unit_staging(self, unit, actionables):
-
-        ru.raise_on('work unit')
-
-        uid = unit['uid']
-
-        # NOTE: see documentation of cu['sandbox'] semantics in the ComputeUnit
-        #       class definition.
-        sandbox = ru.Url(unit['unit_sandbox']).path
+    def _get_contexts(self, unit):
 
         # By definition, this compoentn lives on the pilot's target resource.
         # As such, we *know* that all staging ops which would refer to the
@@ -194,29 +521,54 @@ class Default(AgentStagingOutputComponent):
         #
         #   * paths are directly translatable across schemas
         #   * resource level storage is in fact accessible via file://
-        #
-        # FIXME: this is costly and should be cached.
 
-        unit_sandbox     = ru.Url(unit['unit_sandbox'])
-        pilot_sandbox    = ru.Url(unit['pilot_sandbox'])
-        resource_sandbox = ru.Url(unit['resource_sandbox'])
+        unit_sandbox     = self._resolver.localize(unit['unit_sandbox'])
+        pilot_sandbox    = self._resolver.localize(unit['pilot_sandbox'])
+        resource_sandbox = self._resolver.localize(unit['resource_sandbox'])
+
+        src_context = {'pwd'      : unit_sandbox,       # !!!
+                       'unit'     : unit_sandbox, 
+                       'pilot'    : pilot_sandbox, 
+                       'resource' : resource_sandbox}
+        tgt_context = {'pwd'      : unit_sandbox,       # !!!
+                       'unit'     : unit_sandbox, 
+                       'pilot'    : pilot_sandbox, 
+                       'resource' : resource_sandbox}
+
+        return src_context, tgt_context
+
+
+    # --------------------------------------------------------------------------
+    #
+    def _get_lane(self, unit, actionables):
+
+        src_context, _ = self._get_contexts(unit)
 
-        unit_sandbox.schema     = 'file'
-        pilot_sandbox.schema    = 'file'
-        resource_sandbox.schema = 'file'
+        def _resolve(src):
+            # client side sources are not staged here
+            if src.startswith('client://'):
+                return None
+            return self._resolver.path(src, src_context)
 
-        unit_sandbox.host       = 'localhost'
-        pilot_sandbox.host      = 'localhost'
-        resource_sandbox.host   = 'localhost'
+        return rpu.StagingPool.get_lane(actionables, _resolve, self._small)
 
-        src_context = {'pwd'      : str(unit_sandbox),       # !!!
-                       'unit'     : str(unit_sandbox), 
-                       'pilot'    : str(pilot_sandbox), 
-                       'resource' : str(resource_sandbox)}
-        tgt_context = {'pwd'      : str(unit_sandbox),       # !!!
-                       'unit'     : str(unit_sandbox), 
-                       'pilot'    : str(pilot_sandbox), 
-                       'resource' : str(resource_sandbox)}
+
+    # --------------------------------------------------------------------------
+    #
+    def _handle_unit_staging(self, unit, actionables):
+        '''
+        enact the staging directives of a unit -- this runs in the staging pool
+        '''
+
+        ru.raise_on('work unit')
+
+        uid = unit['uid']
+
+        # NOTE: see documentation of cu['sandbox'] semantics in the ComputeUnit
+        #       class definition.
+        sandbox = ru.Url(unit['unit_sandbox']).path
+
+        src_context, tgt_context = self._get_contexts(unit)
 
         # we can now handle the actionable staging directives
         for sd in actionables:
@@ -257,8 +609,8 @@ class Default(AgentStagingOutputComponent):
                 tgt = os.path.join(tgt, os.path.basename(src))
                 
 
-            src = complete_url(src, src_context, self._log)
-            tgt = complete_url(tgt, tgt_context, self._log)
+            src = self._resolver.url(src, src_context)
+            tgt = self._resolver.url(tgt, tgt_context)
 
             # Currently, we use the same schema for files and folders.
             assert(src.schema == 'file'), 'staging src must be file://'
@@ -313,9 +665,6 @@ class Default(AgentStagingOutputComponent):
 
             self._prof.prof('staging_out_stop', uid=uid, msg=did)
 
-        # all agent staging is done -- pass on to umgr output staging
-        self.advance(unit, rps.UMGR_STAGING_OUTPUT_PENDING, publish=True, push=False)
-
 
 # ------------------------------------------------------------------------------
 
@@ -70,6 +70,7 @@ class ComputePilot(object):
         self._state         = rps.NEW
         self._log           = pmgr._log
         self._pilot_dict    = dict()
+        self._metrics       = None
         self._callbacks     = dict()
         self._cache         = dict()    # cache of SAGA dir handles
         self._cb_lock       = threading.RLock()
@@ -188,6 +189,28 @@ class ComputePilot(object):
         self._pmgr._call_pilot_callbacks(self, self.state)
 
 
+    # --------------------------------------------------------------------------
+    #
+    def _update_metrics(self, metrics):
+        """
+        This is invoked by the pilot manager when the agent reported new
+        metrics, and invokes the pilot's `PILOT_METRICS` callbacks.
+        """
+
+        self._metrics = metrics
+
+        with self._cb_lock:
+            for cb_name, cb_val in self._callbacks[rpt.PILOT_METRICS].iteritems():
+
+                cb      = cb_val['cb']
+                cb_data = cb_val['cb_data']
+
+                self._log.debug('%s calls metrics cb %s', self.uid, cb)
+
+                if cb_data: cb(self, metrics, cb_data)
+                else      : cb(self, metrics)
+
+
     # --------------------------------------------------------------------------
     #
     def as_dict(self):
@@ -253,6 +276,27 @@ class ComputePilot(object):
         return self._pilot_dict.get('resource_details')
 
 
+    # --------------------------------------------------------------------------
+    #
+    @property
+    def metrics(self):
+        """
+        Returns the latest metrics reported by the pilot agent (or `None`).
+        Metrics are only reported while the agent is active, and if
+        `metrics_interval` is set in the agent configuration.  The returned
+        dict contains:
+
+          * `time`     : time the metrics were collected (agent clock)
+          * `cores`    : [busy, free] cores
+          * `gpus`     : [busy, free] gpus
+          * `wait_pool`: number of units waiting for free resources
+          * `units`    : number of units per agent state
+          * `rates`    : units/sec entering each state since the last sample
+          * `queues`   : number of units in each agent queue
+        """
+        return self._metrics
+
+
     # --------------------------------------------------------------------------
     #
     @property
@@ -422,6 +466,10 @@ class ComputePilot(object):
 
         and 'cb_data' are passed along.
 
+        If `metric` is `PILOT_METRICS`, the callback fires whenever the pilot
+        agent reports new metrics (see `metrics`), and `state` is replaced by
+        the metrics dict.
+
         """
         if metric not in rpt.PMGR_METRICS :
             raise ValueError ("Metric '%s' is not available on the pilot manager" % metric)
@@ -436,7 +484,7 @@ class ComputePilot(object):
     #
     def unregister_callback(self, cb, metric=rpt.PILOT_STATE):
 
-        if metric and metric not in rpt.UMGR_METRICS :
+        if metric and metric not in rpt.PMGR_METRICS :
             raise ValueError ("Metric '%s' is not available on the pilot manager" % metric)
 
         if not metric:
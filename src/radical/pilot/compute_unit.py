@@ -72,6 +72,7 @@ class ComputeUnit(object):
         self._state            = rps.NEW
         self._log              = umgr._log
         self._exit_code        = None
+        self._rusage           = None
         self._stdout           = None
         self._stderr           = None
         self._pilot            = descr.get('pilot')
@@ -165,7 +166,7 @@ class ComputeUnit(object):
         # we update all fields
         # FIXME: well, not all really :/
         # FIXME: setattr is ugly...  we should maintain all state in a dict.
-        for key in ['state', 'stdout', 'stderr', 'exit_code', 'pilot', 
+        for key in ['state', 'stdout', 'stderr', 'exit_code', 'rusage', 'pilot',
                     'resource_sandbox', 'pilot_sandbox', 'unit_sandbox', 
                     'client_sandbox']:
 
@@ -202,6 +203,7 @@ class ComputeUnit(object):
             'name':             self.name,
             'state':            self.state,
             'exit_code':        self.exit_code,
+            'rusage':           self.rusage,
             'stdout':           self.stdout,
             'stderr':           self.stderr,
             'pilot':            self.pilot,
@@ -300,6 +302,24 @@ class ComputeUnit(object):
         return self._exit_code
 
 
+    # --------------------------------------------------------------------------
+    #
+    @property
+    def rusage(self):
+        """
+        Returns the resource usage of the unit's executable, if that is already
+        known, or 'None' otherwise.  The resource usage is only recorded by
+        some agent executors, and contains user and system CPU time (`utime`,
+        `stime`), wall time (`wtime`), all in seconds, and max RSS (`maxrss`,
+        in kB).
+
+        **Returns:**
+            * rusage (dict)
+        """
+
+        return self._rusage
+
+
     # --------------------------------------------------------------------------
     #
     @property
@@ -16,6 +16,43 @@ from .. import utils     as rpu
 from .. import states    as rps
 
 
+# ------------------------------------------------------------------------------
+#
+# The session collection is queried along a small number of hot access paths:
+#
+#   - agent_0._check_units_cb       : (type, pilot, control)
+#   - umgr._unit_pull_cb, get_units : (type, umgr,  control)
+#   - get_pilots, agent_0._update_db: (type, uid)
+#
+# We create compound indexes which cover exactly those paths (plus the unique
+# 'uid' index).  On reconnect, the indexes are verified and missing ones are
+# (re)created.  Each entry is a tuple of [index keys, unique].
+#
+_INDEXES = [
+    ([('uid',  pymongo.ASCENDING)],                                True ),
+    ([('type', pymongo.ASCENDING), ('uid',     pymongo.ASCENDING)], False),
+    ([('type', pymongo.ASCENDING), ('pilot',   pymongo.ASCENDING),
+                                   ('control', pymongo.ASCENDING)], False),
+    ([('type', pymongo.ASCENDING), ('umgr',    pymongo.ASCENDING),
+                                   ('control', pymongo.ASCENDING)], False),
+]
+
+# Pilot commands (and heartbeats) are not stored in the pilot documents, but are
+# sent over a separate, capped collection '<sid>.cmd' (the command channel).
+# The agents block-read new commands from a tailable cursor on that collection,
+# in insertion order.  Sessions thus don't see any write traffic for idle
+# pilots.  Sessions created by older RP versions have no command channel: their
+# commands are still pushed into the pilot documents.
+CMD_CHANNEL_EXT   = 'cmd'
+_CMD_CHANNEL_SIZE = 16 * 1024 * 1024    # bytes
+
+# Agents which report metrics (see `metrics_interval` in the agent config)
+# append their samples to another capped collection, '<sid>.metrics', which the
+# pilot managers tail.
+METRICS_EXT       = 'metrics'
+_METRICS_SIZE     = 16 * 1024 * 1024    # bytes
+
+
 #-----------------------------------------------------------------------------
 #
 class DBSession(object):
@@ -36,6 +73,7 @@ class DBSession(object):
         units   : document describing a rp.Unit
         """
 
+        self._sid        = sid
         self._dburl      = dburl
         self._log        = logger
         self._mongo      = None
@@ -44,6 +82,9 @@ class DBSession(object):
         self._connected  = None
         self._closed     = None
         self._c          = None
+        self._cc         = None       # command channel
+        self._mc         = None       # metrics channel
+        self._tails      = dict()     # key: [cursor, last seen _id, skip]
         self._can_remove = False
 
         if not connect:
@@ -64,11 +105,25 @@ class DBSession(object):
         # NOTE: hell will break loose if session IDs are not unique!
         if not self._c.count():
 
-            # make 'uid', 'type' and 'state' indexes, as we frequently query
-            # based on combinations of those.  Only 'uid' is unique
-            self._c.create_index([('uid',   pymongo.ASCENDING)], unique=True,  sparse=False)
-            self._c.create_index([('type',  pymongo.ASCENDING)], unique=False, sparse=False)
-            self._c.create_index([('state', pymongo.ASCENDING)], unique=False, sparse=False)
+            # create the indexes which cover our hot queries.  Only 'uid' is
+            # unique.
+            self._ensure_indexes()
+
+            # create the command channel.  We insert an initial document, as
+            # tailable cursors die on empty collections.
+            self._cc = self._db.create_collection(
+                                   '%s.%s' % (sid, CMD_CHANNEL_EXT),
+                                   capped=True, size=_CMD_CHANNEL_SIZE)
+            self._cc.insert({'pids' : [],
+                             'cmd'  : None,
+                             'arg'  : None})
+
+            # same for the metrics channel
+            self._mc = self._db.create_collection(
+                                   '%s.%s' % (sid, METRICS_EXT),
+                                   capped=True, size=_METRICS_SIZE)
+            self._mc.insert({'pid'     : None,
+                             'metrics' : None})
 
             # insert the session doc
             self._can_delete = True
@@ -90,9 +145,52 @@ class DBSession(object):
             self._created    = doc['created']
             self._connected  = time.time()
 
+            # make sure the index plan is in place -- sessions created by older
+            # RP versions only have single-field indexes.  Missing indexes are
+            # built in the background, so that we don't block other clients.
+            self._ensure_indexes(background=True)
+
+            # use the command and metrics channels if the session has them
+            names   = self._db.collection_names()
+            cc_name = '%s.%s' % (sid, CMD_CHANNEL_EXT)
+            mc_name = '%s.%s' % (sid, METRICS_EXT)
+
+            if cc_name in names:
+                self._cc = self._db[cc_name]
+            else:
+                self._log.info('no command channel - use pilot documents')
+
+            if mc_name in names:
+                self._mc = self._db[mc_name]
+            else:
+                self._log.info('no metrics channel - no pilot metrics')
+
             # FIXME: get bridge addresses from DB?  If not, from where?
 
 
+    #--------------------------------------------------------------------------
+    #
+    def _ensure_indexes(self, background=False):
+        """
+        Check the indexes on the session collection against the index plan in
+        `_INDEXES`, and create any index which is missing.  Index names are not
+        compared, only the index keys.
+        """
+
+        # NOTE: index keys compare equal for int and float directions
+        existing = [list(info['key'])
+                    for info in self._c.index_information().values()]
+
+        for keys, unique in _INDEXES:
+
+            if keys in existing:
+                continue
+
+            self._log.info('create index %s (unique: %s)', keys, unique)
+            self._c.create_index(keys, unique=unique, sparse=False,
+                                 background=background)
+
+
     #--------------------------------------------------------------------------
     #
     @property
@@ -166,12 +264,25 @@ class DBSession(object):
         if delete and self._can_remove:
             self._log.info('delete session')
             self._c.drop()
+            if self._cc:
+                self._cc.drop()
+            if self._mc:
+                self._mc.drop()
+
+        elif self._can_remove:
+            # mark the session as closed, so that session exporters know that
+            # the session content will not change anymore (and can be cached)
+            self._c.update({'type' : 'session',
+                            'uid'  : self._c.name},
+                           {'$set' : {'closed' : self._closed}})
 
         if self._mongo:
             self._mongo.close()
 
         self._closed = time.time()
-        self._c = None
+        self._c  = None
+        self._cc = None
+        self._mc = None
 
 
     #--------------------------------------------------------------------------
@@ -212,7 +323,6 @@ class DBSession(object):
             doc['type']    = 'pilot'
             doc['control'] = 'pmgr'
             doc['states']  = [doc['state']]
-            doc['cmd']     = list()
             bulk.insert(doc)
 
         try:
@@ -229,7 +339,8 @@ class DBSession(object):
     #
     def pilot_command(self, cmd, arg, pids=None):
         """
-        send a command and arg to a set of pilots
+        send a command and arg to a set of pilots (or to all pilots if `pids`
+        is not given).  The command is appended to the command channel.
         """
 
         if self.closed:
@@ -243,25 +354,200 @@ class DBSession(object):
             pids = [pids]
 
         try:
-            cmd_spec = {'cmd' : cmd,
-                        'arg' : arg}
-
             # FIXME: evaluate res
-            if pids:
-                res = self._c.update({'type'  : 'pilot',
-                                      'uid'   : {'$in' : pids}},
-                                     {'$push' : {'cmd' : cmd_spec}},
-                                     multi = True)
+            if self._cc:
+                # a single insert: the readers see commands in insertion order
+                res = self._cc.insert({'pids' : pids,
+                                       'cmd'  : cmd,
+                                       'arg'  : arg,
+                                       'ts'   : time.time()})
+
             else:
-                res = self._c.update({'type'  : 'pilot'},
-                                     {'$push' : {'cmd' : cmd_spec}},
-                                     multi = True)
+                cmd_spec = {'cmd' : cmd,
+                            'arg' : arg}
+
+                if pids:
+                    res = self._c.update({'type'  : 'pilot',
+                                          'uid'   : {'$in' : pids}},
+                                         {'$push' : {'cmd' : cmd_spec}},
+                                         multi = True)
+                else:
+                    res = self._c.update({'type'  : 'pilot'},
+                                         {'$push' : {'cmd' : cmd_spec}},
+                                         multi = True)
+
+        except pymongo.errors.OperationFailure as e:
+            self._log.exception('pymongo error: %s' % e.details)
+            raise RuntimeError ('pymongo error: %s' % e.details)
+
+
+    #--------------------------------------------------------------------------
+    #
+    def get_pilot_commands(self, pid, timeout=None):
+        """
+        Return the list of commands (dicts with 'cmd' and 'arg') which have
+        been sent to the given pilot since the last call.  If no command is
+        available, block for up to `timeout` seconds to wait for one.
+
+        Commands are read in insertion order from a tailable cursor on the
+        command channel, which we keep open between calls.  This method does
+        not write to the database.  For sessions without command channel, the
+        commands are pulled from the pilot document instead.
+        """
+
+        if self.closed:
+            return list()
+
+        if not self._c:
+            raise Exception('session is disconnected ')
+
+        if not self._cc:
+            return self._get_pilot_doc_commands(pid, timeout)
+
+        ret = list()
+        for doc in self._read_tail(('cmd', pid), self._cc, timeout):
+
+            if doc['cmd'] is None:
+                # initial document
+                continue
+
+            if doc['pids'] is None or pid in doc['pids']:
+                ret.append({'cmd' : doc['cmd'],
+                            'arg' : doc['arg']})
+
+        return ret
+
+
+    #--------------------------------------------------------------------------
+    #
+    def _read_tail(self, key, coll, timeout=None):
+        """
+        Return the documents which have been added to the given capped
+        collection since the last call for the same `key`.  If there are none,
+        block for up to `timeout` seconds to wait for some.
+
+        Documents are read in insertion order from a tailable cursor, which we
+        keep open between calls.  A capped collection keeps insertion order, so
+        a reopened tail reads from the start, and skips all documents up to the
+        last one we have seen.  If that one got rotated out of the collection
+        meanwhile, we can't tell which documents we have seen, and consider all
+        of them new.
+        """
+
+        if key not in self._tails:
+            self._tails[key] = [None, None, False]
+
+        start = time.time()
+        ret   = list()
+
+        while True:
+
+            cursor, last, skip = self._tails[key]
+
+            if not cursor or not cursor.alive:
+                skip = bool(last)
+                if skip and not coll.find_one({'_id' : last}):
+                    self._log.warn('%s rotated for %s', coll.name, key)
+                    skip = False
+
+                cursor = coll.find(tailable=True, await_data=bool(timeout))
+                self._tails[key] = [cursor, last, skip]
+
+            try:
+                # blocks up to the await timeout of the server (1 second)
+                while True:
+                    doc = cursor.next()
+
+                    if skip:
+                        if doc['_id'] == last:
+                            skip = False
+                            self._tails[key][2] = skip
+                        continue
+
+                    last = doc['_id']
+                    self._tails[key][1] = last
+                    ret.append(doc)
+
+            except StopIteration:
+                pass
+
+            if ret or not timeout or time.time() - start >= timeout:
+                break
+
+            if not cursor.alive:
+                # don't spin on dead cursors
+                time.sleep(min(1.0, timeout))
+
+        return ret
+
+
+    #--------------------------------------------------------------------------
+    #
+    def _get_pilot_doc_commands(self, pid, timeout=None):
+        """
+        Pull (and wipe) the commands from the pilot document, for sessions
+        without command channel.  We don't block on the database here, but
+        sleep for `timeout` if there are no commands.
+        """
+
+        retdoc = self._c.find_and_modify(
+                    query ={'type' : 'pilot',
+                            'uid'  : pid},
+                    update={'$set' : {'cmd': []}},  # Wipe content of array
+                    fields=['cmd'])
+
+        ret = list()
+        if retdoc:
+            ret = [{'cmd' : spec['cmd'],
+                    'arg' : spec['arg']} for spec in retdoc.get('cmd', [])]
+
+        if not ret and timeout:
+            time.sleep(timeout)
+
+        return ret
+
+
+    #--------------------------------------------------------------------------
+    #
+    def publish_pilot_metrics(self, pid, metrics):
+        """
+        Append a metrics sample of the given pilot to the metrics channel.
+        """
+
+        if self.closed:
+            return None
+
+        if not self._mc:
+            return None
+
+        try:
+            self._mc.insert({'pid'     : pid,
+                             'metrics' : metrics})
 
         except pymongo.errors.OperationFailure as e:
             self._log.exception('pymongo error: %s' % e.details)
             raise RuntimeError ('pymongo error: %s' % e.details)
 
 
+    #--------------------------------------------------------------------------
+    #
+    def get_pilot_metrics(self, reader):
+        """
+        Return the list of `[pid, metrics]` samples which have been published
+        since the last call by the same `reader`.  This does not block.
+        """
+
+        if self.closed:
+            return list()
+
+        if not self._mc:
+            return list()
+
+        return [[doc['pid'], doc['metrics']]
+                for doc in self._read_tail(('metrics', reader), self._mc)
+                if  doc['metrics']]
+
+
     #--------------------------------------------------------------------------
     #
     def get_pilots(self, pmgr_uid=None, pilot_ids=None):
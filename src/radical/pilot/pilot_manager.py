@@ -125,6 +125,10 @@ class PilotManager(rpu.Component):
         self.register_timed_cb(self._state_pull_cb, 
                                timer=self._cfg['db_poll_sleeptime'])
 
+        # pull the metrics which the agents publish (if so configured)
+        self.register_timed_cb(self._metrics_pull_cb, 
+                               timer=self._cfg['db_poll_sleeptime'])
+
         # also listen to the state pubsub for pilot state changes
         self.register_subscriber(rpc.STATE_PUBSUB, self._state_sub_cb)
 
@@ -347,6 +351,41 @@ class PilotManager(rpu.Component):
             return True
 
 
+    # --------------------------------------------------------------------------
+    #
+    def _metrics_pull_cb(self):
+
+        if self._terminate.is_set():
+            return False
+
+        # agents which report metrics append their samples to the session's
+        # metrics channel.  We read new samples for our pilots, and invoke the
+        # pilot and pmgr level callbacks.
+        for pid, metrics in self._session._dbs.get_pilot_metrics(self.uid):
+
+            with self._pilots_lock:
+                pilot = self._pilots.get(pid)
+
+            if not pilot:
+                # not our pilot
+                continue
+
+            pilot._update_metrics(metrics)
+
+            with self._pcb_lock:
+                for cb_name, cb_val in self._callbacks[rpt.PILOT_METRICS].iteritems():
+
+                    cb      = cb_val['cb']
+                    cb_data = cb_val['cb_data']
+
+                    self._log.debug('pmgr calls metrics cb %s for %s', cb, pid)
+
+                    if cb_data: cb(pilot, metrics, cb_data)
+                    else      : cb(pilot, metrics)
+
+        return True
+
+
     # --------------------------------------------------------------------------
     #
     def _call_pilot_callbacks(self, pilot_obj, state):
@@ -765,6 +804,10 @@ class PilotManager(rpu.Component):
           * `PILOT_STATE`: fires when the state of any of the pilots which are
             managed by this pilot manager instance is changing.  It communicates
             the pilot object instance and the pilots new state.
+
+          * `PILOT_METRICS`: fires when any of the pilots reports new agent
+            metrics (see `ComputePilot.metrics`).  It communicates the pilot
+            object instance and the metrics dict.
         """
 
         # FIXME: the signature should be (self, metrics, cb, cb_data)
@@ -7,8 +7,10 @@ import os
 import copy
 import math
 import time
+import heapq
 import pprint
 import shutil
+import logging
 import tempfile
 import threading
 
@@ -21,6 +23,7 @@ import radical.utils        as ru
 from .... import pilot      as rp
 from ...  import states     as rps
 from ...  import constants  as rpc
+from ...  import utils      as rpu
 
 from .base import PMGRLaunchingComponent
 
@@ -37,7 +40,11 @@ DEFAULT_VIRTENV_DIST  = 'default'
 DEFAULT_AGENT_CONFIG  = 'default'
 
 JOB_CANCEL_DELAY      = 120  # seconds between cancel signal and job kill
-JOB_CHECK_INTERVAL    =  60  # seconds between runs of the job state check loop
+JOB_CHECK_INTERVAL    =  60  # seconds between job state checks, running pilots
+JOB_CHECK_MIN         =  10  # min seconds between job state checks (and
+                             # period of the job state check loop)
+JOB_CHECK_MAX         = 300  # max seconds between job state checks (backoff
+                             # limit for queued pilots)
 JOB_CHECK_MAX_MISSES  =   3  # number of times to find a job missing before
                              # declaring it dead
 
@@ -65,10 +72,10 @@ class Default(PMGRLaunchingComponent):
 
         self._pilots        = dict()             # dict for all known pilots
         self._pilots_lock   = threading.RLock()  # lock on maipulating the above
-        self._checking      = list()             # pilots to check state on
+        self._checking      = dict()             # pilots to check state on
         self._check_lock    = threading.RLock()  # lock on maipulating the above
-        self._saga_fs_cache = dict()             # cache of saga directories
-        self._saga_js_cache = dict()             # cache of saga job services
+        self._cancel_queue  = list()             # heap of cancel deadlines
+        self._saga_js_cache = dict()             # borrowed saga job services
         self._sandboxes     = dict()             # cache of resource sandbox URLs
         self._cache_lock    = threading.RLock()  # lock for cache
 
@@ -80,7 +87,7 @@ class Default(PMGRLaunchingComponent):
                             rpc.PMGR_LAUNCHING_QUEUE, self.work)
 
         # FIXME: make interval configurable
-        self.register_timed_cb(self._pilot_watcher_cb, timer=10.0)
+        self.register_timed_cb(self._pilot_watcher_cb, timer=JOB_CHECK_MIN)
 
         # we listen for pilot cancel and input staging commands
         self.register_subscriber(rpc.CONTROL_PUBSUB, self._pmgr_control_cb)
@@ -110,9 +117,8 @@ class Default(PMGRLaunchingComponent):
 
         with self._cache_lock:
             for url,js in self._saga_js_cache.iteritems():
-                self._log.debug('close  js to %s', url)
-                js.close()
-                self._log.debug('closed js to %s', url)
+                self._log.debug('return js to %s', url)
+                self._session._conn_pool.put(js)
             self._saga_js_cache.clear()
         self._log.debug('finalized child')
 
@@ -210,15 +216,8 @@ class Default(PMGRLaunchingComponent):
 
             self._log.debug ("rs.file.Directory ('%s')", key)
 
-            with self._cache_lock:
-                if key in self._saga_fs_cache:
-                    fs = self._saga_fs_cache[key]
-
-                else:
-                    fs = rsfs.Directory(key, session=self._session)
-                    self._saga_fs_cache[key] = fs
-
-            fs.copy(src, tgt, flags=flags)
+            with self._session._conn_pool.borrow(rpu.CONN_FS, key) as fs:
+                fs.copy(src, tgt, flags=flags)
 
             sd['pmgr_state'] = rps.DONE
 
@@ -248,42 +247,62 @@ class Default(PMGRLaunchingComponent):
         #          disappeared
         #        This implies that we want to communicate 'final_cause'
 
-        # we don't want to lock our members all the time.  For that reason we
-        # use a copy of the pilots_tocheck list and iterate over that, and only
-        # lock other members when they are manipulated.
+        # To avoid hammering the batch systems, we check the job state of
+        # pilots which are due for a check (see `_schedule_check()`), and we
+        # check the jobs of each job service in a single bulk.
 
         ru.raise_on('pilot_watcher_cb')
 
-        tc = rs.job.Container()
-        with self._pilots_lock, self._check_lock:
+        now = time.time()
+        due = dict()  # job service: [pids]
+        with self._check_lock:
+            for pid, check in self._checking.iteritems():
+                if check['next'] <= now:
+                    due.setdefault(check['js'], list()).append(pid)
 
-            for pid in self._checking:
-                tc.add(self._pilots[pid]['job'])
+        final_pilots = list()
+        for js, pids in due.iteritems():
 
-        states = tc.get_states()
+            with self._pilots_lock:
+                tc = rs.job.Container()
+                for pid in pids:
+                    tc.add(self._pilots[pid]['job'])
 
-        self._log.debug('bulk states: %s', states)
+            try:
+                states = tc.get_states()
+                self._log.debug('bulk states for %s: %s', js, states)
 
-        # if none of the states is final, we have nothing to do.
-        # We can't rely on the ordering of tasks and states in the task
-        # container, so we hope that the task container's bulk state query lead
-        # to a caching of state information, and we thus have cache hits when
-        # querying the pilots individually
+            except Exception:
+                self._log.exception('state check failed for %s', js)
+                with self._check_lock:
+                    for pid in pids:
+                        if pid in self._checking:
+                            check = self._checking[pid]
+                            self._schedule_check(check, check['state'], now)
+                continue
+
+            # We can't rely on the ordering of tasks and states in the task
+            # container, so we hope that the task container's bulk state query
+            # lead to a caching of state information, and we thus have cache
+            # hits when querying the pilots individually
+            with self._pilots_lock, self._check_lock:
 
-        final_pilots = list()
-        with self._pilots_lock, self._check_lock:
+                for pid in pids:
 
-            for pid in self._checking:
+                    if pid not in self._checking:
+                        continue
 
-                state = self._pilots[pid]['job'].state
-                self._log.debug('saga job state: %s %s', pid, state)
+                    state = self._pilots[pid]['job'].state
+                    self._log.debug('saga job state: %s %s', pid, state)
 
-                if state in [rs.job.DONE, rs.job.FAILED, rs.job.CANCELED]:
-                    pilot = self._pilots[pid]['pilot']
-                    if state == rs.job.DONE    : pilot['state'] = rps.DONE
-                    if state == rs.job.FAILED  : pilot['state'] = rps.FAILED
-                    if state == rs.job.CANCELED: pilot['state'] = rps.CANCELED
-                    final_pilots.append(pilot)
+                    if state in [rs.job.DONE, rs.job.FAILED, rs.job.CANCELED]:
+                        pilot = self._pilots[pid]['pilot']
+                        if state == rs.job.DONE    : pilot['state'] = rps.DONE
+                        if state == rs.job.FAILED  : pilot['state'] = rps.FAILED
+                        if state == rs.job.CANCELED: pilot['state'] = rps.CANCELED
+                        final_pilots.append(pilot)
+                    else:
+                        self._schedule_check(self._checking[pid], state, now)
 
         if final_pilots:
 
@@ -291,7 +310,7 @@ class Default(PMGRLaunchingComponent):
 
                 with self._check_lock:
                     # stop monitoring this pilot
-                    self._checking.remove(pilot['uid'])
+                    self._checking.pop(pilot['uid'], None)
 
                 self._log.debug('final pilot %s %s', pilot['uid'], pilot['state'])
 
@@ -299,25 +318,29 @@ class Default(PMGRLaunchingComponent):
 
         # all checks are done, final pilots are weeded out.  Now check if any
         # pilot is scheduled for cancellation and is overdue, and kill it
-        # forcefully.
+        # forcefully.  Cancellation deadlines are kept in a heap.
         to_cancel  = list()
         with self._pilots_lock:
 
-            for pid in self._pilots:
+            while self._cancel_queue and self._cancel_queue[0][0] <= now:
 
+                _, pid  = heapq.heappop(self._cancel_queue)
                 pilot   = self._pilots[pid]['pilot']
                 time_cr = pilot.get('cancel_requested')
 
-                # check if the pilot is final meanwhile
-                if pilot['state'] in rps.FINAL:
+                # check if the pilot is final meanwhile, or got killed already
+                if pilot['state'] in rps.FINAL or not time_cr:
+                    continue
+
+                # a repeated cancel request has its own (later) deadline
+                if time_cr + JOB_CANCEL_DELAY > now:
                     continue
 
-                if time_cr and time_cr + JOB_CANCEL_DELAY < time.time():
-                    self._log.debug('pilot needs killing: %s :  %s + %s < %s',
-                            pid, time_cr, JOB_CANCEL_DELAY, time.time())
-                    del(pilot['cancel_requested'])
-                    self._log.debug(' cancel pilot %s', pid)
-                    to_cancel.append(pid)
+                self._log.debug('pilot needs killing: %s :  %s + %s < %s',
+                        pid, time_cr, JOB_CANCEL_DELAY, now)
+                del(pilot['cancel_requested'])
+                self._log.debug(' cancel pilot %s', pid)
+                to_cancel.append(pid)
 
         if to_cancel:
             self._kill_pilots(to_cancel)
@@ -325,6 +348,44 @@ class Default(PMGRLaunchingComponent):
         return True
 
 
+    # --------------------------------------------------------------------------
+    #
+    def _schedule_check(self, check, state, now):
+        '''
+        Determine when to check the job state of a pilot again.  Queued pilots
+        are checked with exponential backoff (from JOB_CHECK_MIN up to
+        JOB_CHECK_MAX), running pilots every JOB_CHECK_INTERVAL.  We check
+        every JOB_CHECK_MIN seconds if the job state just changed, if the pilot
+        nears the end of its runtime, or if it is being canceled.
+        '''
+
+        if state != check['state']:
+            # state changed - look again soon
+            check['state']    = state
+            check['interval'] = JOB_CHECK_MIN
+
+            if state == rs.job.RUNNING:
+                check['started'] = now
+
+        elif state == rs.job.RUNNING:
+            check['interval'] = JOB_CHECK_INTERVAL
+
+            # tighten the interval when nearing the end of the pilot runtime
+            if check['runtime'] and check.get('started'):
+                end = check['started'] + check['runtime']
+                if now + 2 * JOB_CHECK_INTERVAL > end:
+                    check['interval'] = JOB_CHECK_MIN
+
+        else:
+            # pilot is queued (or the check failed): back off
+            check['interval'] = min(check['interval'] * 2, JOB_CHECK_MAX)
+
+        if check['canceled']:
+            check['interval'] = JOB_CHECK_MIN
+
+        check['next'] = now + check['interval']
+
+
     # --------------------------------------------------------------------------
     #
     def _cancel_pilots(self, pids):
@@ -351,6 +412,15 @@ class Default(PMGRLaunchingComponent):
                 if pid in self._pilots:
                     self._log.debug('update cancel req: %s %s', pid, now)
                     self._pilots[pid]['pilot']['cancel_requested'] = now
+                    heapq.heappush(self._cancel_queue,
+                                   (now + JOB_CANCEL_DELAY, pid))
+
+        # watch the canceled pilots closely from now on
+        with self._check_lock:
+            for pid in pids:
+                if pid in self._checking:
+                    self._checking[pid]['canceled'] = True
+                    self._checking[pid]['next']     = now
 
 
     # --------------------------------------------------------------------------
@@ -412,8 +482,7 @@ class Default(PMGRLaunchingComponent):
         # we don't want the watcher checking for these pilot anymore
         with self._check_lock:
             for pid in pids:
-                if pid in self._checking:
-                    self._checking.remove(pid)
+                self._checking.pop(pid, None)
 
 
         self._log.debug('killing pilots: kill! %s', pids)
@@ -614,17 +683,11 @@ class Default(PMGRLaunchingComponent):
 
         self._log.debug ("rs.file.Directory ('%s')", fs_url)
 
-        with self._cache_lock:
-            if fs_url in self._saga_fs_cache:
-                fs = self._saga_fs_cache[fs_url]
-            else:
-                fs = rsfs.Directory(fs_url, session=self._session)
-                self._saga_fs_cache[fs_url] = fs
-
         tar_rem      = rs.Url(fs_url)
         tar_rem.path = "%s/%s" % (session_sandbox, tar_name)
 
-        fs.copy(tar_url, tar_rem, flags=rsfs.CREATE_PARENTS)
+        with self._session._conn_pool.borrow(rpu.CONN_FS, fs_url) as fs:
+            fs.copy(tar_url, tar_rem, flags=rsfs.CREATE_PARENTS)
 
         shutil.rmtree(tmp_dir)
 
@@ -644,18 +707,12 @@ class Default(PMGRLaunchingComponent):
             if js_url.scheme not in ['ssh', 'gsissh']:
                 js_url.scheme = 'fork'
 
-        with self._cache_lock:
-            if  js_url in self._saga_js_cache:
-                js_tmp  = self._saga_js_cache[js_url]
-            else:
-                js_tmp  = rs.job.Service(js_url, session=self._session)
-                self._saga_js_cache[js_url] = js_tmp
-
      ## cmd = "tar zmxvf %s/%s -C / ; rm -f %s" % \
         cmd = "tar zmxvf %s/%s -C %s" % \
                 (session_sandbox, tar_name, session_sandbox)
-        j = js_tmp.run_job(cmd)
-        j.wait()
+        with self._session._conn_pool.borrow(rpu.CONN_JS, js_url) as js_tmp:
+            j = js_tmp.run_job(cmd)
+            j.wait()
 
         self._log.debug('tar cmd : %s', cmd)
         self._log.debug('tar done: %s, %s, %s', j.state, j.stdout, j.stderr)
@@ -665,13 +722,14 @@ class Default(PMGRLaunchingComponent):
             self._prof.prof('submission_start', uid=pilot['uid'])
 
         # look up or create JS for actual pilot submission.  This might result
-        # in the same js url as above, or not.
+        # in the same js url as above, or not.  We hold on to that js for the
+        # lifetime of the component, as the pilot jobs are bound to it.
         js_ep  = rcfg['job_manager_endpoint']
         with self._cache_lock:
             if js_ep in self._saga_js_cache:
                 js = self._saga_js_cache[js_ep]
             else:
-                js = rs.job.Service(js_ep, session=self._session)
+                js = self._session._conn_pool.get(rpu.CONN_JS, js_ep)
                 self._saga_js_cache[js_ep] = js
 
         # now that the scripts are in place and configured, 
@@ -679,7 +737,8 @@ class Default(PMGRLaunchingComponent):
         jc = rs.job.Container()
 
         for jd in jd_list:
-            self._log.debug('jd: %s', pprint.pformat(jd.as_dict()))
+            if self._log.isEnabledFor(logging.DEBUG):
+                self._log.debug('jd: %s', pprint.pformat(jd.as_dict()))
             jc.add(js.create_job(jd))
 
         jc.run()
@@ -722,7 +781,14 @@ class Default(PMGRLaunchingComponent):
 
             # make sure we watch that pilot
             with self._check_lock:
-                self._checking.append(pid)
+                self._checking[pid] = {
+                        'js'       : js_ep,
+                        'state'    : None,
+                        'next'     : 0.0,
+                        'interval' : JOB_CHECK_MIN,
+                        'started'  : None,
+                        'canceled' : False,
+                        'runtime'  : (pilot['description'].get('runtime') or 0) * 60}
 
         for pilot in pilots:
             self._prof.prof('submission_stop', uid=pilot['uid'])
@@ -800,6 +866,7 @@ class Default(PMGRLaunchingComponent):
         rp_version              = rcfg.get('rp_version',          DEFAULT_RP_VERSION)
         virtenv_mode            = rcfg.get('virtenv_mode',        DEFAULT_VIRTENV_MODE)
         virtenv                 = rcfg.get('virtenv',             default_virtenv)
+        virtenv_pack            = rcfg.get('virtenv_pack')
         cores_per_node          = rcfg.get('cores_per_node', 0)
         gpus_per_node           = rcfg.get('gpus_per_node',  0)
         python_dist             = rcfg.get('python_dist')
@@ -814,9 +881,9 @@ class Default(PMGRLaunchingComponent):
         mandatory_args          = rcfg.get('mandatory_args', [])
         saga_jd_supplement      = rcfg.get('saga_jd_supplement', {})
 
-        import pprint
-        self._log.debug(cores_per_node)
-        self._log.debug(pprint.pformat(rcfg))
+        if self._log.isEnabledFor(logging.DEBUG):
+            self._log.debug('cores per node: %s', cores_per_node)
+            self._log.debug('rcfg: %s', pprint.pformat(rcfg))
 
         # make sure that mandatory args are known
         for ma in mandatory_args:
@@ -879,6 +946,26 @@ class Default(PMGRLaunchingComponent):
                              'session_sandbox' : session_sandbox,
                              'resource_sandbox': resource_sandbox}
 
+        # a packed virtenv is content addressed: it is unpacked into
+        # a hash-named ve in the resource sandbox, which is then used as is by
+        # all pilots on that resource.  The pack contains the radical stack, so
+        # we neither stage sdists nor install RP into the pilot sandbox.
+        if virtenv_pack:
+            virtenv_pack = os.path.abspath(os.path.expanduser(virtenv_pack))
+            pack_name    = os.path.basename(virtenv_pack)
+
+            if not pack_name.startswith('ve.') or \
+               not pack_name.endswith('.tgz'):
+                raise ValueError("invalid virtenv pack name '%s' (ve.<sha1>.tgz)"
+                                % virtenv_pack)
+
+            virtenv      = '%s/%s' % (resource_sandbox, pack_name[:-4])
+            virtenv_mode = 'use'
+
+            if rp_version != 'installed':
+                self._log.info('use RP from virtenv pack (not %s)', rp_version)
+            rp_version   = 'installed'
+
         # Check for deprecated global_virtenv
         if 'global_virtenv' in rcfg:
             raise RuntimeError("'global_virtenv' is deprecated (%s)" % resource)
@@ -1034,6 +1121,7 @@ class Default(PMGRLaunchingComponent):
         if python_interpreter:      bootstrap_args += " -i '%s'" % python_interpreter
         if tunnel_bind_device:      bootstrap_args += " -t '%s'" % tunnel_bind_device
         if cleanup:                 bootstrap_args += " -x '%s'" % cleanup
+        if virtenv_pack:            bootstrap_args += " -z '%s'" % pack_name
 
         for arg in pre_bootstrap_0:
             bootstrap_args += " -e '%s'" % arg
@@ -1078,7 +1166,8 @@ class Default(PMGRLaunchingComponent):
 
         # Convert dict to json file
         self._log.debug("Write agent cfg to '%s'.", cfg_tmp_file)
-        self._log.debug(pprint.pformat(agent_cfg))
+        if self._log.isEnabledFor(logging.DEBUG):
+            self._log.debug(pprint.pformat(agent_cfg))
         ru.write_json(agent_cfg, cfg_tmp_file)
 
         ret['ft'].append({'src' : cfg_tmp_file, 
@@ -1111,6 +1200,11 @@ class Default(PMGRLaunchingComponent):
                                       'tgt' : '%s/%s' % (session_sandbox, base),
                                       'rem' : False})
 
+                if virtenv_pack:
+                    ret['ft'].append({'src' : virtenv_pack, 
+                                      'tgt' : '%s/%s' % (session_sandbox, pack_name),
+                                      'rem' : False})
+
                 # Copy the bootstrap shell script.
                 bootstrapper_path = os.path.abspath("%s/agent/%s"
                                   % (self._root_dir, BOOTSTRAPPER_0))
@@ -1201,6 +1295,11 @@ class Default(PMGRLaunchingComponent):
                     'site:%s/%s > %s' % (session_sandbox, cc_name, cc_name)
                 ])
 
+            if virtenv_pack:
+                jd.file_transfer.extend([
+                    'site:%s/%s > %s' % (session_sandbox, pack_name, pack_name)
+                ])
+
         self._log.debug("Bootstrap command line: %s %s", jd.executable, jd.arguments)
 
         ret['jd'] = jd
@@ -42,6 +42,7 @@ TUNNEL_BIND_DEVICE          = "tunnel_bind_device"
 VALID_ROOTS                 = 'valid_roots'
 VIRTENV                     = 'virtenv'
 VIRTENV_MODE                = 'private'
+VIRTENV_PACK                = 'virtenv_pack'
 SHARED_FILESYSTEM           = 'shared_filesystem'
 HEALTH_CHECK                = 'health_check'
 PYTHON_DISTRIBUTION         = 'python_dist'
@@ -147,6 +148,14 @@ class ResourceConfig(attributes.Attributes):
 
        [Type: `string`] [optional] TODO
 
+    .. data:: virtenv_pack
+
+       [Type: `string`] [optional] Local path to a packed virtualenv
+       (`ve.<sha1>.tgz`, as created by `radical-pilot-create-static-ve -p`).
+       The tarball is unpacked once into the resource sandbox and used by
+       all pilots on that resource.  The pack must contain the radical stack:
+       `rp_version` is then ignored, and no RP sdists are staged.
+
     .. data:: lrms
 
        [Type: `string`] [optional] TODO
@@ -249,6 +258,7 @@ class ResourceConfig(attributes.Attributes):
         self._attributes_register(VALID_ROOTS            ,  None, attributes.STRING, attributes.VECTOR, attributes.WRITEABLE)
         self._attributes_register(VIRTENV                ,  None, attributes.STRING, attributes.SCALAR, attributes.WRITEABLE)
         self._attributes_register(VIRTENV_MODE           ,  None, attributes.STRING, attributes.SCALAR, attributes.WRITEABLE)
+        self._attributes_register(VIRTENV_PACK           ,  None, attributes.STRING, attributes.SCALAR, attributes.WRITEABLE)
         self._attributes_register(STAGE_CACERTS          ,  None, attributes.BOOL,   attributes.SCALAR, attributes.WRITEABLE)
         self._attributes_register(SHARED_FILESYSTEM      ,  None, attributes.BOOL,   attributes.SCALAR, attributes.WRITEABLE)
         self._attributes_register(HEALTH_CHECK           ,  None, attributes.BOOL,   attributes.SCALAR, attributes.WRITEABLE)
@@ -25,7 +25,6 @@ import threading
 
 import radical.utils        as ru
 import saga                 as rs
-import saga.utils.pty_shell as rsup
 
 from . import utils         as rpu
 from . import states        as rps
@@ -113,6 +112,10 @@ class Session(rs.Session):
         self._cache['session_sandbox']  = dict()
         self._cache['pilot_sandbox']    = dict()
 
+        # pool of SAGA handles, shared by all session components (see
+        # `rpu.ConnectionPool`)
+        self._conn_pool   = None
+
         # before doing anything else, set up the debug helper for the lifetime
         # of the session.
         self._debug_helper = ru.DebugHelper()
@@ -182,6 +185,9 @@ class Session(rs.Session):
         self._log    = self._get_logger  (name=self._cfg['owner'],
                                           level=self._cfg.get('debug'))
 
+        self._conn_pool = rpu.ConnectionPool(session=self, log=self._log,
+                                             cfg=self._cfg.get('conn_pool'))
+
         if _connect:
 
             # we need a dburl to connect to.
@@ -299,6 +305,7 @@ class Session(rs.Session):
         pass
 
     def _atfork_child(self)  : 
+        self._conn_pool.reset()
         self._components = list()
         self._bridges    = list()
         self._to_close   = list()
@@ -500,6 +507,8 @@ class Session(rs.Session):
             self._log.debug("session %s closes db (%s)", self._uid, cleanup)
             self._dbs.close(delete=cleanup)
 
+        self._conn_pool.close()
+
         self._log.debug("session %s closed (delete=%s)", self._uid, cleanup)
         self._prof.prof("session_stop", uid=self._uid)
         self._prof.close()
@@ -1016,10 +1025,10 @@ class Session(rs.Session):
                     else:
                         raise Exception("unsupported access schema: %s" % js_url.schema)
         
-                    self._log.debug("rsup.PTYShell('%s')", js_url)
-                    shell = rsup.PTYShell(js_url, self)
-        
-                    ret, out, err = shell.run_sync(' echo "WORKDIR: %s"' % sandbox_raw)
+                    with self._conn_pool.borrow(rpu.CONN_SHELL, js_url) as shell:
+                        ret, out, err = shell.run_sync(' echo "WORKDIR: %s"'
+                                                       % sandbox_raw)
+
                     if ret == 0 and 'WORKDIR:' in out:
                         sandbox_base = out.split(":")[1].strip()
                         self._log.debug("sandbox base %s: '%s'", js_url, sandbox_base)
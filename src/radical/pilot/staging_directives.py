@@ -1,6 +1,7 @@
 
 import os
 import sys
+import urlparse
 
 import radical.utils as ru
 
@@ -214,5 +215,150 @@ def complete_url(path, context, log=None):
     return purl
 
 
+# ------------------------------------------------------------------------------
+#
+# max number of resolved URLs cached by a `StagingResolver`
+STAGING_RESOLVER_CACHE = 100 * 1024
+
+
+class StagingResolver(object):
+    '''
+    Expands staging URLs the same way as `complete_url()`, but for use on the
+    hot paths of the staging components: the sandbox URLs in the contexts are
+    parsed once and cached, the expansion of `client://`, `unit://`, `pilot://`,
+    `resource://` and relative paths is a string operation, and the resolved
+    (path, context) pairs are cached.  Any other URL is handed to
+    `complete_url()`.
+
+    The contexts are the same dicts as used for `complete_url()`.  A resolver
+    is not bound to a specific context: one resolver per component serves all
+    pilots and units, and can be used concurrently by its threads.
+    '''
+
+    # --------------------------------------------------------------------------
+    #
+    def __init__(self, log, size=STAGING_RESOLVER_CACHE):
+
+        self._log   = log
+        self._size  = size
+        self._bases = dict()  # context URL        : (prefix, path)
+        self._cache = dict()  # (path, context URL): (url, path)
+
+
+    # --------------------------------------------------------------------------
+    #
+    def _base(self, url):
+
+        if not isinstance(url, basestring):
+            url = str(url)
+
+        ret = self._bases.get(url)
+
+        if not ret:
+            parts = urlparse.urlsplit(url)
+            ret   = ('%s://%s' % (parts.scheme or 'file', parts.netloc),
+                     parts.path)
+            if len(self._bases) >= self._size:
+                self._bases = dict()
+            self._bases[url] = ret
+
+        return ret
+
+
+    # --------------------------------------------------------------------------
+    #
+    def _resolve(self, path, context):
+
+        if not isinstance(path, basestring):
+            path = str(path)
+
+        # queries, fragments and other unusual URLs take the slow path
+        if '?' in path or '#' in path:
+            schema, rest = None, None
+
+        elif '://' in path:
+            schema, rest = path.split('://', 1)
+
+        elif ':' in path:
+            schema, rest = None, None
+
+        elif path.startswith('/'):
+            # absolute paths are not expanded
+            return 'file://%s' % path, path
+
+        else:
+            schema, rest = 'pwd', path
+
+        if schema == 'client':
+            # 'client' is 'pwd' in client context.
+            schema = 'pwd'
+
+        if schema in ['pwd', 'unit', 'pilot', 'resource'] and \
+           schema in context:
+            ctx = context[schema]
+            if not isinstance(ctx, basestring):
+                ctx = str(ctx)
+        else:
+            ctx = None
+
+        key = (path, ctx)
+        ret = self._cache.get(key)
+
+        if ret:
+            return ret
+
+        if ctx is None:
+            # not expanded by us
+            url = complete_url(path, context, self._log)
+            ret = (str(url), url.path)
+
+        else:
+            prefix, base = self._base(ctx)
+
+            if schema in ['resource', 'pilot']:
+                # use a dedicated staging area dir
+                base += '/staging_area'
+
+            base = '%s/%s' % (base, rest or '.')
+            ret  = ('%s%s' % (prefix, base), base)
+
+        if len(self._cache) >= self._size:
+            self._cache = dict()
+        self._cache[key] = ret
+
+        return ret
+
+
+    # --------------------------------------------------------------------------
+    #
+    def path(self, path, context):
+        '''
+        Return the path element of `complete_url(path, context)`, as string.
+        '''
+
+        return self._resolve(path, context)[1]
+
+
+    # --------------------------------------------------------------------------
+    #
+    def url(self, path, context):
+        '''
+        Return `complete_url(path, context)`, as a new instance of ru.Url.
+        '''
+
+        return ru.Url(self._resolve(path, context)[0])
+
+
+    # --------------------------------------------------------------------------
+    #
+    def localize(self, url):
+        '''
+        Return the given URL as `file://localhost/<path>` string, for
+        components which live on the target resource of that URL.
+        '''
+
+        return 'file://localhost%s' % self._base(url)[1]
+
+
 # ------------------------------------------------------------------------------
 
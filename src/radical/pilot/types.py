@@ -12,7 +12,9 @@ UMGR_METRICS         = [UNIT_STATE,
                         WAIT_QUEUE_SIZE]
 
 PILOT_STATE          = 'PILOT_STATE'
-PMGR_METRICS         = [PILOT_STATE]
+PILOT_METRICS        = 'PILOT_METRICS'
+PMGR_METRICS         = [PILOT_STATE,
+                        PILOT_METRICS]
 
 
 
@@ -4,6 +4,7 @@ __license__   = "MIT"
 
 import os
 import pprint
+import logging
 import threading
 
 import radical.utils as ru
@@ -302,29 +303,34 @@ class Backfilling(UMGRSchedulingComponent):
                 cores   = unit['description']['cpu_processes'] \
                         * unit['description']['cpu_threads']
                 success = False
-                for pid in pids:
 
-                    info = self._pilots[pid]['info']
+                # all pilots below their HWM are candidates -- we prefer the one
+                # which holds most of the unit's input data
+                candidates = [pid for pid in pids
+                              if self._pilots[pid]['info']['used'] <=
+                                 self._pilots[pid]['info']['hwm']]
 
-                    if info['used'] <= info['hwm']:
+                if candidates:
 
-                      # self._log.debug('sch unit  %s -> %s', uid, pid)
-                        self._log.info('schedule %s -> %s', uid, pid)
+                    pid, nbytes, nfiles = self._select_pilot(unit, candidates)
+                    info = self._pilots[pid]['info']
 
-                        pilot = self._pilots[pid]['pilot']
-                        info['units'].append(unit['uid'])
-                        info['used']   += cores
+                  # self._log.debug('sch unit  %s -> %s', uid, pid)
+                    self._log.info('schedule %s -> %s (local inputs: %d bytes, '
+                                   '%d files)', uid, pid, nbytes, nfiles)
 
-                        self._assign_pilot(unit, pilot)
-                        scheduled.append(unit)
-                        success = True
+                    pilot = self._pilots[pid]['pilot']
+                    info['units'].append(unit['uid'])
+                    info['used']   += cores
 
-                        # this pilot might now be full.  If so, remove it from
-                        # list of eligible pids
-                        if info['used'] >= info['hwm']:
-                            pids.remove(pid)
+                    self._assign_pilot(unit, pilot)
+                    scheduled.append(unit)
+                    success = True
 
-                        break  # stop looking through pilot list
+                    # this pilot might now be full.  If so, remove it from
+                    # list of eligible pids
+                    if info['used'] >= info['hwm']:
+                        pids.remove(pid)
 
                 if not success:
                     # we did not find a useable pilot for this unit -- keep it
@@ -336,9 +342,10 @@ class Backfilling(UMGRSchedulingComponent):
           #         len(unscheduled), len(pids))
 
             # all unscheduled units *are* the new wait pool
-            self._log.debug(' 1 > waits: %s', self._wait_pool.keys())
+            if self._log.isEnabledFor(logging.DEBUG):
+                self._log.debug(' 1 > waits: %s', self._wait_pool.keys())
+                self._log.debug(' 2 > waits: %s', unscheduled.keys())
             self._wait_pool = unscheduled
-            self._log.debug(' 2 > waits: %s', self._wait_pool.keys())
 
         # advance scheduled units
         if scheduled:
@@ -346,8 +353,8 @@ class Backfilling(UMGRSchedulingComponent):
                          publish=True, push=True)
 
 
-        self._log.debug('\nafter schedule:')
-        self._log.debug('waits:    %s', self._wait_pool.keys())
+        if self._log.isEnabledFor(logging.DEBUG):
+            self._log.debug('after schedule: waits: %s', self._wait_pool.keys())
       # for pid in self._pilots:
       #     print 'pilot %s' % pid
       #     pprint.pprint(self._pilots[pid]['info'])
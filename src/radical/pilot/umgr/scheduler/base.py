@@ -13,6 +13,8 @@ from ... import utils     as rpu
 from ... import states    as rps
 from ... import constants as rpc
 
+from ..staging_input.default import STAGING_CACHE_DIR
+
 
 # ------------------------------------------------------------------------------
 # 'enum' for RPs's umgr scheduler types
@@ -28,6 +30,12 @@ ADDED   = 'added'
 REMOVED = 'removed'
 FAILED  = 'failed'
 
+# By default, schedulers which know about pilot capacity place units on the
+# pilot with free capacity which already holds most of their input data (see
+# `_select_pilot()`).  This can be disabled in the umgr config.  Schedulers
+# without a notion of capacity (RoundRobin) disable it.
+SCHEDULER_LOCALITY = True
+
 
 
 # ==============================================================================
@@ -58,6 +66,12 @@ class UMGRSchedulingComponent(rpu.Component):
         self._units       = dict()            # dict of scheduled unit IDs
         self._units_lock  = threading.RLock() # lock on the above dict
 
+        # data residency, protected by the pilots lock
+        self._locality    = self._cfg.get('scheduler_locality', SCHEDULER_LOCALITY)
+        self._resident    = dict()            # pid: {data key: size}
+        self._staged      = dict()            # uid: [pid, {did: [src, tgt, size]}]
+        self._data_sizes  = dict()            # client data key: size
+
         # configure the scheduler instance
         self._configure()
 
@@ -200,6 +214,10 @@ class UMGRSchedulingComponent(rpu.Component):
                     self._pilots[pid]['state'] = target
                     self._log.debug('update pilot state: %s -> %s', current, passed)
 
+                    # data on final pilots is not useful anymore
+                    if target in rps.FINAL:
+                        self._resident.pop(pid, None)
+
       # self._log.debug('to update: %s', to_update)
         if to_update:
             self.update_pilots(to_update)
@@ -210,9 +228,173 @@ class UMGRSchedulingComponent(rpu.Component):
     #
     def _update_unit_states(self, units):
 
+        if self._locality:
+            self._update_residency(units)
+
         self.update_units(units)
 
 
+    # --------------------------------------------------------------------------
+    #
+    def _get_data_key(self, url):
+        '''
+        Return the key under which we track the residency of the given staging
+        source or target, or `None` if we don't track it.  Client files are
+        keyed by their absolute path, files in the pilot sandbox by their
+        normalized `pilot://` URL.
+        '''
+
+        url = str(url)
+
+        if url.startswith('pilot://'):
+            return 'pilot://%s' % os.path.normpath('/%s' % url[8:])
+
+        if url.startswith('client://'):
+            # interpreted relative to the client's pwd (see `complete_url()`)
+            path = os.path.join(self._client_sandbox, url[9:].lstrip('/'))
+
+        elif '://' in url:
+            return None
+
+        else:
+            path = os.path.join(self._client_sandbox, url)
+
+        return 'client://%s' % os.path.normpath(path)
+
+
+    # --------------------------------------------------------------------------
+    #
+    def _get_data_size(self, key):
+
+        if key not in self._data_sizes:
+            path = key[9:]
+            if os.path.isfile(path): size = os.path.getsize(path)
+            else                   : size = 0
+            self._data_sizes[key] = size
+
+        return self._data_sizes[key]
+
+
+    # --------------------------------------------------------------------------
+    #
+    def _get_unit_inputs(self, unit):
+
+        inputs = list()
+        for sd in unit['description'].get('input_staging') or []:
+            key = self._get_data_key(sd['source'])
+            if key:
+                inputs.append(key)
+
+        return inputs
+
+
+    # --------------------------------------------------------------------------
+    #
+    def _select_pilot(self, unit, pids):
+        '''
+        Out of the given candidate pilots, select the one which holds most of
+        the unit's input data (in bytes, and then in number of files).  Ties
+        are resolved by the order of `pids`, so that the scheduler's own
+        placement policy applies if no pilot holds any of the unit's inputs.
+        Returns a tuple `(pid, nbytes, nfiles)` of the selected pilot and the
+        amount of input data it holds.
+        '''
+
+        best = (pids[0], 0, 0)
+
+        if not self._locality or not self._resident:
+            return best
+
+        inputs = self._get_unit_inputs(unit)
+        if not inputs:
+            return best
+
+        for pid in pids:
+
+            resident = self._resident.get(pid)
+            if not resident:
+                continue
+
+            nbytes = 0
+            nfiles = 0
+            for key in inputs:
+                if key in resident:
+                    nbytes += resident[key]
+                    nfiles += 1
+
+            if (nbytes, nfiles) > best[1:]:
+                best = (pid, nbytes, nfiles)
+
+        return best
+
+
+    # --------------------------------------------------------------------------
+    #
+    def _update_residency(self, units):
+        '''
+        Data become resident on a pilot once the staging directives which put
+        them there are completed.  Client side inputs are only resident if the
+        umgr input staging placed them in the pilot's staging cache (it then
+        rewrites the directive into a link to the cached file) -- otherwise they
+        are just copied into the unit sandbox, and are of no use to other units.
+        Inputs staged to `pilot://` targets are resident once the unit's input
+        staging is done.  Unit outputs staged into the pilot sandbox are
+        resident once the unit is DONE.
+        '''
+
+        staged_val = rps._unit_state_value(rps.AGENT_STAGING_INPUT_PENDING)
+        cache_pfx  = 'pilot:///%s/' % STAGING_CACHE_DIR
+
+        with self._pilots_lock:
+
+            for unit in units:
+
+                uid   = unit['uid']
+                state = unit.get('state')
+
+                if not state or (uid not in self._staged and state != rps.DONE):
+                    continue
+
+                # we need the staging directives as rewritten by the umgr input
+                # staging, which come with the full unit update once staging is
+                # done
+                descr = unit.get('description')
+
+                if uid in self._staged and descr and \
+                   (state in rps.FINAL or
+                    rps._unit_state_value(state) >= staged_val):
+
+                    pid, data = self._staged.pop(uid)
+                    resident  = self._resident.get(pid)
+
+                    if resident is not None and \
+                       state not in [rps.FAILED, rps.CANCELED]:
+
+                        sources = dict()
+                        for sd in descr.get('input_staging') or []:
+                            sources[sd['uid']] = str(sd['source'])
+
+                        for did, [src, tgt, size] in data.iteritems():
+                            if sources.get(did, '').startswith(cache_pfx):
+                                resident[src] = size
+                            if tgt:
+                                resident[tgt] = size
+
+                if state == rps.DONE and unit.get('description'):
+
+                    pid = unit.get('pilot')
+                    if pid not in self._resident:
+                        continue
+
+                    # we don't know the size of unit outputs
+                    resident = self._resident[pid]
+                    for sd in unit['description'].get('output_staging') or []:
+                        key = self._get_data_key(sd['target'])
+                        if key and key.startswith('pilot://') and \
+                                   key not in resident:
+                            resident[key] = 0
+
+
     # --------------------------------------------------------------------------
     #
     def _base_command_cb(self, topic, msg):
@@ -355,6 +537,20 @@ class UMGRSchedulingComponent(rpu.Component):
                 self._units[pid] = list()
             self._units[pid].append(uid)
 
+        # remember what data the unit's input staging may bring to the pilot
+        if self._locality:
+            self._resident.setdefault(pid, dict())
+            data = dict()
+            for sd in unit['description'].get('input_staging') or []:
+                src = self._get_data_key(sd['source'])
+                tgt = self._get_data_key(sd['target'])
+                if src and src.startswith('client://'):
+                    if not tgt or not tgt.startswith('pilot://'):
+                        tgt = None
+                    data[sd['uid']] = [src, tgt, self._get_data_size(src)]
+            if data:
+                self._staged[uid] = [pid, data]
+
 
     # --------------------------------------------------------------------------
     #
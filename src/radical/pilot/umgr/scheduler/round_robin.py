@@ -34,6 +34,11 @@ class RoundRobin(UMGRSchedulingComponent):
         self._pids = list()
         self._idx  = 0
 
+        # Without any notion of pilot capacity, locality would move all units
+        # which share an input onto a single pilot, and leave the others idle.
+        # We thus stick to plain round robin placement.
+        self._locality = False
+
         self._log.debug('RoundRobin umgr scheduler configured')
 
 
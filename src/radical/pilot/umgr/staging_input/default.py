@@ -4,7 +4,9 @@ __license__   = "MIT"
 
 
 import os
+import time
 import pprint
+import hashlib
 import tempfile
 import threading     as mt
 import tarfile
@@ -14,10 +16,11 @@ import radical.utils as ru
 
 from ...   import states    as rps
 from ...   import constants as rpc
+from ...   import utils     as rpu
 
 from .base import UMGRStagingInputComponent
 
-from ...staging_directives import complete_url
+from ...staging_directives import StagingResolver
 
 
 # if we receive more than a certain numnber of units in a bulk, we create the
@@ -29,6 +32,22 @@ from ...staging_directives import complete_url
 UNIT_BULK_MKDIR_THRESHOLD = 128
 UNIT_BULK_MKDIR_MECHANISM = 'tar'
 
+# Input files which are staged for many units can be transferred only once per
+# pilot, into a staging cache in the pilot sandbox, and the units get a link to
+# the cached copy.  Files are identified by path, size and mtime, or optionally
+# by a hash of their content.  Small files are not cached.  The cache size per
+# pilot can be limited (in bytes, 0 means no limit), unused files are evicted
+# if needed.  All settings can be overwritten in the umgr config.
+#
+# The cache is disabled by default: cached inputs are symlinks to a file shared
+# by all units on the pilot, so a unit which modifies its input in place changes
+# it for all other units, too.
+STAGING_CACHE          = False
+STAGING_CACHE_DIR      = 'staging_cache'
+STAGING_CACHE_HASH     = False
+STAGING_CACHE_MIN_SIZE = 1024 * 1024
+STAGING_CACHE_LIMIT    = 0
+
 
 # ==============================================================================
 #
@@ -52,9 +71,9 @@ class Default(UMGRStagingInputComponent):
     #
     def initialize_child(self):
 
-        # we keep a cache of SAGA dir handles
-        self._fs_cache    = dict()
-        self._js_cache    = dict()
+        # SAGA handles are borrowed from the session's connection pool
+        self._pool        = self._session._conn_pool
+        self._resolver    = StagingResolver(self._log)
         self._pilots      = dict()
         self._pilots_lock = mt.RLock()
 
@@ -68,20 +87,29 @@ class Default(UMGRStagingInputComponent):
         # to this unit manager.
         self.register_subscriber(rpc.CONTROL_PUBSUB, self._base_command_cb)
 
+        # pilot level staging cache
+        cfg = self._cfg
+        self._cache_enabled  = cfg.get('staging_cache',          STAGING_CACHE)
+        self._cache_hash     = cfg.get('staging_cache_hash',     STAGING_CACHE_HASH)
+        self._cache_min_size = cfg.get('staging_cache_min_size', STAGING_CACHE_MIN_SIZE)
+        self._cache_limit    = cfg.get('staging_cache_limit',    STAGING_CACHE_LIMIT)
+        self._cache          = dict()  # pid: {digest: cache entry}
+        self._cache_refs     = dict()  # uid: [[pid, digest], ...]
+        self._cache_digests  = dict()  # (path, size, mtime): content hash
+
+        # we watch unit and pilot states to release cache references
+        if self._cache_enabled:
+            self.register_subscriber(rpc.STATE_PUBSUB, self._cache_state_cb)
 
 
     # --------------------------------------------------------------------------
     #
     def finalize_child(self):
 
-        self.unregister_subscriber(rpc.STATE_PUBSUB, self._base_command_cb)
+        self.unregister_subscriber(rpc.CONTROL_PUBSUB, self._base_command_cb)
 
-        try:
-            [fs.close() for fs in self._fs_cache.values()]
-            [js.close() for js in self._js_cache.values()]
-
-        except:
-            pass
+        if self._cache_enabled:
+            self.unregister_subscriber(rpc.STATE_PUBSUB, self._cache_state_cb)
 
 
     # --------------------------------------------------------------------------
@@ -112,6 +140,164 @@ class Default(UMGRStagingInputComponent):
         return True
 
 
+    # --------------------------------------------------------------------------
+    #
+    def _cache_state_cb(self, topic, msg):
+
+        # release the cache references of final units, and drop the cache of
+        # final pilots (their sandbox is gone or not used anymore)
+
+        cmd = msg.get('cmd')
+        arg = msg.get('arg')
+
+        if cmd not in ['update', 'state_update']:
+            return True
+
+        if not isinstance(arg, list): things = [arg]
+        else                        : things =  arg
+
+        for thing in things:
+
+            if thing.get('state') not in rps.FINAL:
+                continue
+
+            if thing['type'] == 'pilot':
+                if self._cache.pop(thing['uid'], None) is not None:
+                    self._log.debug('drop staging cache for %s', thing['uid'])
+
+            elif thing['type'] == 'unit':
+                for pid, digest in self._cache_refs.pop(thing['uid'], []):
+                    entry = self._cache.get(pid, {}).get(digest)
+                    if entry:
+                        entry['refs'] -= 1
+
+        return True
+
+
+    # --------------------------------------------------------------------------
+    #
+    def _cache_digest(self, path):
+        '''
+        return the cache digest and size for a local file
+        '''
+
+        path = os.path.realpath(path)
+        st   = os.stat(path)
+        key  = (path, st.st_size, st.st_mtime)
+
+        if not self._cache_hash:
+            return hashlib.md5('%s:%d:%f' % key).hexdigest(), st.st_size
+
+        if key not in self._cache_digests:
+            md5 = hashlib.md5()
+            with open(path, 'rb') as fin:
+                for chunk in iter(lambda: fin.read(1024 * 1024), ''):
+                    md5.update(chunk)
+            self._cache_digests[key] = md5.hexdigest()
+
+        return self._cache_digests[key], st.st_size
+
+
+    # --------------------------------------------------------------------------
+    #
+    def _cache_evict(self, cache, size, saga_dir):
+        '''
+        make room for `size` bytes in the given pilot cache by removing unused
+        entries (least recently used first).  Returns `False` if that is not
+        possible.
+        '''
+
+        if not self._cache_limit:
+            return True
+
+        used = sum([e['size'] for e in cache.values()])
+        if used + size <= self._cache_limit:
+            return True
+
+        unused = sorted([[e['used'], d] for d, e in cache.iteritems()
+                                        if not e['refs']])
+        for _, digest in unused:
+
+            entry = cache.pop(digest)
+            self._log.debug('evict %s from staging cache', entry['url'])
+            try:
+                saga_dir.remove(entry['url'])
+            except Exception:
+                self._log.exception('cache eviction failed for %s', entry['url'])
+
+            used -= entry['size']
+            if used + size <= self._cache_limit:
+                return True
+
+        return False
+
+
+    # --------------------------------------------------------------------------
+    #
+    def _stage_cached(self, unit, actionables, saga_dir, src_context,
+                      tgt_context):
+        '''
+        Stage all eligible input files of the unit via the pilot's staging
+        cache: files not yet cached are transferred into the cache, and the
+        unit's staging directives are changed into links to the cached files
+        (which are enacted by the agent).  The directives which are not served
+        from the cache are returned.
+        '''
+
+        uid   = unit['uid']
+        pid   = unit['pilot']
+        cache = self._cache.setdefault(pid, dict())
+        ret   = list()
+
+        for sd in actionables:
+
+            did = sd['uid']
+            src = self._resolver.url(sd['source'], src_context)
+
+            # we only cache regular local files of a certain size
+            if src.schema != 'file'                       or \
+               src.host not in [None, '', 'localhost']    or \
+               not os.path.isfile(src.path)               or \
+               os.path.getsize(src.path) < self._cache_min_size:
+                ret.append(sd)
+                continue
+
+            digest, size = self._cache_digest(src.path)
+            entry        = cache.get(digest)
+
+            if not entry:
+
+                if not self._cache_evict(cache, size, saga_dir):
+                    # no space in cache -- stage as usual
+                    ret.append(sd)
+                    continue
+
+                url = self._resolver.url('pilot:///%s/%s'
+                                         % (STAGING_CACHE_DIR, digest), tgt_context)
+
+                self._prof.prof('staging_in_start', uid=uid, msg=did)
+                saga_dir.copy(src, url, flags=rs.filesystem.CREATE_PARENTS)
+                self._prof.prof('staging_in_stop', uid=uid, msg=did)
+
+                entry = {'url'  : url,
+                         'size' : size,
+                         'refs' : 0}
+                cache[digest] = entry
+
+            else:
+                self._prof.prof('staging_in_cached', uid=uid, msg=did)
+
+            entry['refs'] += 1
+            entry['used']  = time.time()
+            self._cache_refs.setdefault(uid, list()).append([pid, digest])
+
+            # the agent links the cached file into the unit sandbox
+            sd['action'] = rpc.LINK
+            sd['source'] = 'pilot:///%s/%s' % (STAGING_CACHE_DIR, digest)
+
+        return ret
+
+
     # --------------------------------------------------------------------------
     #
     def work(self, units):
@@ -140,6 +326,9 @@ class Default(UMGRStagingInputComponent):
             # component
             actionables = list()
             for sd in unit['description'].get('input_staging', []):
+                # skip tarball extraction directives added by `_handle_tarball()`
+                if sd.get('extract'):
+                    continue
                 if sd['action'] in [rpc.TRANSFER, rpc.TARBALL]:
                     actionables.append(sd)
 
@@ -198,73 +387,61 @@ class Default(UMGRStagingInputComponent):
 
                 # no matter the bulk mechanism, we need a SAGA handle to the
                 # remote FS
-                sbox_fs      = ru.Url(session_sbox)  # deep copy
-                sbox_fs.path = '/'
-                sbox_fs_str  = str(sbox_fs)
-                if sbox_fs_str not in self._fs_cache:
-                    self._fs_cache[sbox_fs_str] = rs.filesystem.Directory(sbox_fs,
-                                                  session=self._session)
-                saga_dir = self._fs_cache[sbox_fs_str]
-
-                # we have two options for a bulk mkdir:
-                # 1) ask SAGA to create the sandboxes in a bulk op
-                # 2) create a tarball with all unit sandboxes, push it over, and
-                #    untar it (one untar op then creates all dirs).  We implement
-                #    both
-                if UNIT_BULK_MKDIR_MECHANISM == 'saga':
-
-                    tc = rs.task.Container()
-                    for sbox in unit_sboxes:
-                        tc.add(saga_dir.make_dir(sbox, ttype=rs.TASK))
-                    tc.run()
-                    tc.wait()
-
-                elif UNIT_BULK_MKDIR_MECHANISM == 'tar':
-
-                    tmp_path = tempfile.mkdtemp(prefix='rp_agent_tar_dir')
-                    tmp_dir  = os.path.abspath(tmp_path)
-                    tar_name = '%s.%s.tgz' % (self._session.uid, self.uid)
-                    tar_tgt  = '%s/%s'     % (tmp_dir, tar_name)
-                    tar_url  = ru.Url('file://localhost/%s' % tar_tgt)
-
-                    for sbox in unit_sboxes:
-                        os.makedirs('%s/%s' % (tmp_dir, ru.Url(sbox).path))
-
-                    cmd = "cd %s && tar zchf %s *" % (tmp_dir, tar_tgt)
-                    out, err, ret = ru.sh_callout(cmd, shell=True)
-
-                    self._log.debug('tar : %s', cmd)
-                    self._log.debug('tar : %s\n---\n%s\n---\n%s', out, err, ret)
-
-                    if ret:
-                        raise RuntimeError('failed callout %s: %s' % (cmd, err))
-
-                    tar_rem_path = "%s/%s" % (str(session_sbox), tar_name)
-
-                    self._log.debug('sbox: %s [%s]', session_sbox, type(session_sbox))
-                    self._log.debug('copy: %s -> %s', tar_url, tar_rem_path)
-                    saga_dir.copy(tar_url, tar_rem_path, flags=rs.filesystem.CREATE_PARENTS)
-
-                  # ru.sh_callout('rm -r %s' % tmp_path)
-
-                    # get a job service handle to the target resource and run
-                    # the untar command.  Use the hop to skip the batch system
-                    js_url = pilot['js_hop']
-                    self._log.debug('js  : %s', js_url)
-
-                    if  js_url in self._js_cache:
-                        js_tmp = self._js_cache[js_url]
-                    else:
-                        js_tmp = rs.job.Service(js_url, session=self._session)
-                        self._js_cache[js_url] = js_tmp
-
-                    cmd = "tar zmxvf %s/%s -C /" % (session_sbox.path, tar_name)
-                    j   = js_tmp.run_job(cmd)
-                    j.wait()
-                    self._log.debug('untar : %s', cmd)
-                    self._log.debug('untar : %s\n---\n%s\n---\n%s',
-                            j.get_stdout_string(), j.get_stderr_string(),
-                            j.exit_code)
+                with self._pool.borrow(rpu.CONN_FS, session_sbox) as saga_dir:
+
+                    # we have two options for a bulk mkdir:
+                    # 1) ask SAGA to create the sandboxes in a bulk op
+                    # 2) create a tarball with all unit sandboxes, push it over, and
+                    #    untar it (one untar op then creates all dirs).  We implement
+                    #    both
+                    if UNIT_BULK_MKDIR_MECHANISM == 'saga':
+
+                        # NOTE: the pooled handle only supports synchronous
+                        #       operations (see `rpu.ConnectionPool`)
+                        for sbox in unit_sboxes:
+                            saga_dir.make_dir(sbox)
+
+                    elif UNIT_BULK_MKDIR_MECHANISM == 'tar':
+
+                        tmp_path = tempfile.mkdtemp(prefix='rp_agent_tar_dir')
+                        tmp_dir  = os.path.abspath(tmp_path)
+                        tar_name = '%s.%s.tgz' % (self._session.uid, self.uid)
+                        tar_tgt  = '%s/%s'     % (tmp_dir, tar_name)
+                        tar_url  = ru.Url('file://localhost/%s' % tar_tgt)
+
+                        for sbox in unit_sboxes:
+                            os.makedirs('%s/%s' % (tmp_dir, ru.Url(sbox).path))
+
+                        cmd = "cd %s && tar zchf %s *" % (tmp_dir, tar_tgt)
+                        out, err, ret = ru.sh_callout(cmd, shell=True)
+
+                        self._log.debug('tar : %s', cmd)
+                        self._log.debug('tar : %s\n---\n%s\n---\n%s', out, err, ret)
+
+                        if ret:
+                            raise RuntimeError('failed callout %s: %s' % (cmd, err))
+
+                        tar_rem_path = "%s/%s" % (str(session_sbox), tar_name)
+
+                        self._log.debug('sbox: %s [%s]', session_sbox, type(session_sbox))
+                        self._log.debug('copy: %s -> %s', tar_url, tar_rem_path)
+                        saga_dir.copy(tar_url, tar_rem_path, flags=rs.filesystem.CREATE_PARENTS)
+
+                      # ru.sh_callout('rm -r %s' % tmp_path)
+
+                        # get a job service handle to the target resource and run
+                        # the untar command.  Use the hop to skip the batch system
+                        js_url = pilot['js_hop']
+                        self._log.debug('js  : %s', js_url)
+
+                        cmd = "tar zmxvf %s/%s -C /" % (session_sbox.path, tar_name)
+                        with self._pool.borrow(rpu.CONN_JS, js_url) as js_tmp:
+                            j = js_tmp.run_job(cmd)
+                            j.wait()
+                        self._log.debug('untar : %s', cmd)
+                        self._log.debug('untar : %s\n---\n%s\n---\n%s',
+                                j.get_stdout_string(), j.get_stderr_string(),
+                                j.exit_code)
 
 
         if no_staging_units:
@@ -273,13 +450,42 @@ class Default(UMGRStagingInputComponent):
             self.advance(no_staging_units, rps.AGENT_STAGING_INPUT_PENDING,
                          publish=True, push=True)
 
+        # units with tarball inputs are collected per pilot: their tarballs are
+        # packed and transferred together
+        tar_units = dict()
+
+        # a failing unit must not stall the others, and in particular not the
+        # units collected for a tarball so far
         for unit,actionables in staging_units:
-            self._handle_unit(unit, actionables)
+            try:
+                tar_members = self._handle_unit(unit, actionables)
+            except Exception:
+                self._log.exception('staging failed for %s', unit['uid'])
+                self.advance(unit, rps.FAILED, publish=True, push=False)
+                continue
+
+            if tar_members:
+                tar_units.setdefault(unit['pilot'], list()).append(
+                                                        [unit, tar_members])
+
+        for pid in tar_units:
+            try:
+                self._handle_tarball(pid, tar_units[pid])
+            except Exception:
+                self._log.exception('tarball staging failed for %s', pid)
+                self.advance([unit for unit, _ in tar_units[pid]], rps.FAILED,
+                             publish=True, push=False)
 
 
     # --------------------------------------------------------------------------
     #
     def _handle_unit(self, unit, actionables):
+        '''
+        Create the unit sandbox and enact the transfer directives of the unit.
+        Tarball directives are not enacted here: if there are any, the unit is
+        not advanced, and `[did, src_path, tgt_path]` tuples for the files to
+        pack are returned instead.
+        '''
 
         # FIXME: we should created unit sandboxes in a bulk
 
@@ -299,118 +505,139 @@ class Default(UMGRStagingInputComponent):
         # we have actionable staging directives, and thus we need a unit
         # sandbox.
         sandbox = rs.Url(unit["unit_sandbox"])
-        tmp     = rs.Url(unit["unit_sandbox"])
-
-        # url used for cache (sandbox url w/o path)
-        tmp.path = '/'
-        key = str(tmp)
-        self._log.debug('key %s / %s', key, tmp)
 
-        if key not in self._fs_cache:
-            self._fs_cache[key] = rs.filesystem.Directory(tmp, 
-                                             session=self._session)
+        with self._pool.borrow(rpu.CONN_FS, sandbox) as saga_dir:
+            saga_dir.make_dir(sandbox, flags=rs.filesystem.CREATE_PARENTS)
+            self._prof.prof("create_sandbox_stop", uid=uid)
 
-        saga_dir = self._fs_cache[key]
-        saga_dir.make_dir(sandbox, flags=rs.filesystem.CREATE_PARENTS)
-        self._prof.prof("create_sandbox_stop", uid=uid)
+            # serve what we can from the pilot's staging cache
+            if self._cache_enabled:
+                actionables = self._stage_cached(unit, actionables, saga_dir,
+                                                 src_context, tgt_context)
 
-        # Loop over all transfer directives and filter out tarball staging
-        # directives.  Those files are added into a tarball, and a single
-        # actionable to stage that tarball replaces the original actionables.
+            # Filter out tarball staging directives: those files are not
+            # transferred individually, but are packed into one tarball
+            # together with the tarball inputs of all other units in this bulk
+            # which go to the same pilot (see `_handle_tarball()`).
+            tar_members = list()
 
-        # create a new actionable list during the filtering
-        new_actionables = list()
-        tar_file        = None
-
-        for sd in actionables:
-
-            # don't touch non-tar SDs
-            if sd['action'] != rpc.TARBALL:
-                new_actionables.append(sd)
-
-            else:
+            for sd in actionables:
 
                 action = sd['action']
-                flags  = sd['flags']   # NOTE: we don't use those
+                flags  = sd['flags']
                 did    = sd['uid']
                 src    = sd['source']
                 tgt    = sd['target']
 
-                src = complete_url(src, src_context, self._log)
-                tgt = complete_url(tgt, tgt_context, self._log)
-
-                self._prof.prof('staging_in_tar_start', uid=uid, msg=did)
-
-                # create a tarfile on the first match, and register for transfer
-                if not tar_file:
-                    tmp_file = tempfile.NamedTemporaryFile(
-                                                prefix='rp_usi_%s.' % uid,
-                                                suffix='.tar',
-                                                delete=False)
-                    tar_path = tmp_file.name
-                    tar_file = tarfile.open(fileobj=tmp_file, mode='w')
-                    tar_src  = ru.Url('file://localhost/%s' % tar_path)
-                    tar_tgt  = ru.Url('unit:////%s.tar'     % uid)
-                    tar_did  = ru.generate_id('sd')
-                    tar_sd   = {'action' : rpc.TRANSFER, 
-                                'flags'  : rpc.DEFAULT_FLAGS,
-                                'uid'    : tar_did,
-                                'source' : str(tar_src),
-                                'target' : str(tar_tgt),
-                               }
-                    new_actionables.append(tar_sd)
-
-                # add the src file
-                tar_file.add(src.path, arcname=tgt.path)
-
-                self._prof.prof('staging_in_tar_stop',  uid=uid, msg=did)
-
-
-        # make sure tarball is flushed to disk
-        if tar_file:
-            tar_file.close()
+                if action == rpc.TARBALL:
 
-        # work on the filtered TRANSFER actionables 
-        for sd in new_actionables:
+                    src = self._resolver.url(src, src_context)
+                    tgt = self._resolver.url(tgt, tgt_context)
 
-            action = sd['action']
-            flags  = sd['flags']
-            did    = sd['uid']
-            src    = sd['source']
-            tgt    = sd['target']
+                    tar_members.append([did, src.path, tgt.path])
 
-            if action == rpc.TRANSFER:
+                elif action == rpc.TRANSFER:
 
-                src = complete_url(src, src_context, self._log)
-                tgt = complete_url(tgt, tgt_context, self._log)
+                    src = self._resolver.url(src, src_context)
+                    tgt = self._resolver.url(tgt, tgt_context)
 
-                # Check if the src is a folder, if true
-                # add recursive flag if not already specified
-                if os.path.isdir(src.path):
-                    flags |= rs.filesystem.RECURSIVE
+                    # Check if the src is a folder, if true
+                    # add recursive flag if not already specified
+                    if os.path.isdir(src.path):
+                        flags |= rs.filesystem.RECURSIVE
 
-                # Always set CREATE_PARENTS
-                flags |= rs.filesystem.CREATE_PARENTS
+                    # Always set CREATE_PARENTS
+                    flags |= rs.filesystem.CREATE_PARENTS
 
-                src = complete_url(src, src_context, self._log)
-                tgt = complete_url(tgt, tgt_context, self._log)
+                    self._prof.prof('staging_in_start', uid=uid, msg=did)
+                    saga_dir.copy(src, tgt, flags=flags)
+                    self._prof.prof('staging_in_stop', uid=uid, msg=did)
 
-                self._prof.prof('staging_in_start', uid=uid, msg=did)
-                saga_dir.copy(src, tgt, flags=flags)
-                self._prof.prof('staging_in_stop', uid=uid, msg=did)
+        if tar_members:
+            # the unit is advanced once the tarball is staged
+            return tar_members
+
+        # staging is done, we can advance the unit at last
+        self.advance(unit, rps.AGENT_STAGING_INPUT_PENDING, publish=True, push=True)
 
 
-        if tar_file:
+    # --------------------------------------------------------------------------
+    #
+    def _handle_tarball(self, pid, tar_units):
+        '''
+        Pack the tarball inputs of all given units (which are staged to the same
+        pilot) into one tarball, transfer it once into the pilot sandbox, and
+        add a directive to all units for the agent to extract it.  The files are
+        added under their absolute target paths, so that the per-unit sandbox
+        paths separate the units' files in the tarball.  `tar_units` is a list
+        of `[unit, tar_members]` tuples as returned by `_handle_unit()`.
+        '''
+
+        units    = [unit for unit, _ in tar_units]
+        tar_did  = ru.generate_id('sd')
+        tar_path = None
 
-            # some tarball staging was done.  Add a staging directive for the
-            # agent to untar the tarball, and clean up.
-            tar_sd['action'] = rpc.TARBALL
-            unit['description']['input_staging'].append(tar_sd)
-            os.remove(tar_path)
+        try:
+            tmp_file = tempfile.NamedTemporaryFile(prefix='rp_usi_%s.' % pid,
+                                                   suffix='.tar', delete=False)
+            tar_path = tmp_file.name
+            tar_file = tarfile.open(fileobj=tmp_file, mode='w')
+
+            for unit, tar_members in tar_units:
+                for did, src, tgt in tar_members:
+                    self._prof.prof('staging_in_tar_start', uid=unit['uid'], msg=did)
+                    tar_file.add(src, arcname=tgt)
+                    self._prof.prof('staging_in_tar_stop',  uid=unit['uid'], msg=did)
+
+            # make sure tarball is flushed to disk
+            tar_file.close()
+            tmp_file.close()
 
+            # all units share the pilot sandbox
+            tgt_context = {'pwd'      : units[0]['unit_sandbox'],
+                           'unit'     : units[0]['unit_sandbox'],
+                           'pilot'    : units[0]['pilot_sandbox'],
+                           'resource' : units[0]['resource_sandbox']}
 
-        # staging is done, we can advance the unit at last
-        self.advance(unit, rps.AGENT_STAGING_INPUT_PENDING, publish=True, push=True)
+            tar_src = ru.Url('file://localhost/%s' % tar_path)
+            tar_tgt = 'pilot:///%s.tar' % tar_did
+            tgt     = self._resolver.url(tar_tgt, tgt_context)
+
+            for unit in units:
+                self._prof.prof('staging_in_start', uid=unit['uid'], msg=tar_did)
+
+            with self._pool.borrow(rpu.CONN_FS, tgt) as saga_dir:
+                saga_dir.copy(tar_src, tgt, flags=rs.filesystem.CREATE_PARENTS)
+
+            for unit in units:
+                self._prof.prof('staging_in_stop', uid=unit['uid'], msg=tar_did)
+
+        except Exception:
+            self._log.exception('tarball staging failed for %s', pid)
+            self.advance(units, rps.FAILED, publish=True, push=False)
+            return
+
+        finally:
+            if tar_path and os.path.exists(tar_path):
+                os.remove(tar_path)
+
+        # Add a staging directive for the agent to untar the tarball.  The agent
+        # extracts it once, for whichever unit comes first, and forgets about it
+        # once all 'members' units are handled.  The directive is marked via
+        # 'extract', as the agent ignores the original tarball directives of
+        # the unit.
+        for unit in units:
+            unit['description']['input_staging'].append(
+                    {'action'  : rpc.TARBALL,
+                     'flags'   : rpc.DEFAULT_FLAGS,
+                     'uid'     : tar_did,
+                     'source'  : tar_tgt,
+                     'target'  : tar_tgt,
+                     'extract' : True,
+                     'members' : len(units)})
+
+        # staging is done, we can advance the units at last
+        self.advance(units, rps.AGENT_STAGING_INPUT_PENDING, publish=True, push=True)
 
 
 # ------------------------------------------------------------------------------
@@ -4,15 +4,31 @@ __license__   = "MIT"
 
 
 import os
-import saga as rs
+import time
+import shutil
+import tarfile
+import tempfile
+
+import saga          as rs
+import radical.utils as ru
 
 from ...   import states             as rps
 from ...   import constants          as rpc
+from ...   import utils              as rpu
 from ...   import staging_directives as rpsd
 
 from .base import UMGRStagingOutputComponent
 
 
+# an output archive is fetched that many times before its members are staged
+# individually (see `_handle_archives()`)
+ARCHIVE_FETCH_ATTEMPTS = 3
+ARCHIVE_FETCH_DELAY    = 1.0   # seconds between attempts
+
+# the staging directive keys with which the agent marks archived outputs
+ARCHIVE_KEYS = ['archive', 'member', 'archive_members']
+
+
 # ==============================================================================
 #
 class Default(UMGRStagingOutputComponent):
@@ -35,24 +51,29 @@ class Default(UMGRStagingOutputComponent):
     #
     def initialize_child(self):
 
-        # we keep a cache of SAGA dir handles
-        self._cache = dict()
+        # SAGA handles are borrowed from the session's connection pool
+        self._pool     = self._session._conn_pool
+        self._resolver = rpsd.StagingResolver(self._log)
 
         self.register_input(rps.UMGR_STAGING_OUTPUT_PENDING, 
                             rpc.UMGR_STAGING_OUTPUT_QUEUE, self.work)
 
         # we don't need an output queue -- units will be final
 
+        # The units of an output archive can arrive in different bulks, so we
+        # keep fetched archives until all their members are extracted:
+        #   (pid, archive url) : {'dir' : tmp dir, 'path' : local copy,
+        #                         'left': number of members not yet extracted}
+        self._archives = dict()
+
 
     # --------------------------------------------------------------------------
     #
     def finalize_child(self):
 
-        try:
-            for key in self._cache:
-                self._cache[key].close()
-        except:
-            pass
+        for archive in self._archives.values():
+            shutil.rmtree(archive['dir'], ignore_errors=True)
+        self._archives = dict()
 
 
     # --------------------------------------------------------------------------
@@ -100,15 +121,28 @@ class Default(UMGRStagingOutputComponent):
                 unit['state'] = unit['target_state']
             self.advance(no_staging_units, publish=True, push=True)
 
+        # outputs which the agent packed into archives are fetched in bulk, and
+        # the remaining directives are enacted per unit
+        staging_units, failed_units = self._handle_archives(staging_units)
+
+        if failed_units:
+            self.advance(failed_units, rps.FAILED, publish=True, push=True)
+
+        done_units = list()
         for unit,actionables in staging_units:
-            self._handle_unit(unit, actionables)
+            if actionables:
+                self._handle_unit(unit, actionables)
+            else:
+                unit['state'] = unit['target_state']
+                done_units.append(unit)
+
+        if done_units:
+            self.advance(done_units, publish=True, push=True)
 
 
     # --------------------------------------------------------------------------
     #
-    def _handle_unit(self, unit, actionables):
-
-        uid = unit['uid']
+    def _get_contexts(self, unit):
 
         src_context = {'pwd'      : unit['unit_sandbox'],       # !!!
                        'unit'     : unit['unit_sandbox'], 
@@ -119,47 +153,243 @@ class Default(UMGRStagingOutputComponent):
                        'pilot'    : unit['pilot_sandbox'], 
                        'resource' : unit['resource_sandbox']}
 
-        # url used for cache (sandbox url w/o path)
-        tmp      = rs.Url(unit["unit_sandbox"])
-        tmp.path = '/'
-        key      = str(tmp)
+        return src_context, tgt_context
+
+
+    # --------------------------------------------------------------------------
+    #
+    def _handle_archives(self, staging_units):
+        '''
+        The agent packs small output files into archives in the pilot sandbox,
+        and marks the respective directives with the archive URL, the member
+        name, and the number of members in the archive.  We fetch each archive
+        once, extract the members to their targets, and keep the local copy
+        until all members are extracted -- the remote archive is then removed,
+        too.
+
+        If an archive cannot be fetched, or a member cannot be extracted, the
+        respective files are staged individually -- unless the agent removed
+        the unit sandbox already (for units with `cleanup`), in which case the
+        unit fails.  Returns the list of `[unit, actionables]` with the
+        actionables which remain to be enacted, and the list of units which
+        failed.  The archive markers are removed from all directives.
+        '''
+
+        archives  = dict()  # (pid, archive url): [[unit, sd], ...]
+        remaining = dict()  # uid: actionables to stage individually
+        ret       = list()
+
+        for unit, actionables in staging_units:
+
+            remaining[unit['uid']] = list()
+            for sd in actionables:
+                if sd.get('archive'):
+                    key = (unit['pilot'], sd['archive'])
+                    archives.setdefault(key, list()).append([unit, sd])
+                else:
+                    remaining[unit['uid']].append(sd)
+
+            ret.append([unit, remaining[unit['uid']]])
+
+        failed = set()
+
+        def _fallback(unit, sd):
+            if unit['description'].get('cleanup'):
+                failed.add(unit['uid'])
+            else:
+                self._log.info('stage %s of %s individually',
+                               sd['uid'], unit['uid'])
+                remaining[unit['uid']].append(sd)
+
+        for key, items in archives.iteritems():
+
+            src_context, _ = self._get_contexts(items[0][0])
+            src = self._resolver.url(key[1], src_context)
+
+            for unit, _ in items:
+                self._prof.prof('staging_out_tar_start', uid=unit['uid'])
+
+            try:
+                archive = self._get_archive(key, src, items[0][1])
+                tar     = tarfile.open(archive['path'])
+
+            except Exception:
+                self._log.exception('cannot fetch output archive %s', src)
+                for unit, sd in items:
+                    _fallback(unit, sd)
+                self._drop_archive(key, src, len(items))
+                continue
+
+            for unit, sd in items:
+
+                uid = unit['uid']
+                did = sd['uid']
+
+                if uid in failed:
+                    continue
+
+                self._prof.prof('staging_out_start', uid=uid, msg=did)
+
+                try:
+                    _, tgt_context = self._get_contexts(unit)
+                    tgt = self._resolver.url(sd['target'], tgt_context)
+
+                    # same semantics as a copy: into existing directories, and
+                    # create parent directories as needed
+                    path = tgt.path
+                    if os.path.isdir(path):
+                        path = '%s/%s' % (path, os.path.basename(sd['source']))
+                    rpu.rec_makedir(os.path.dirname(path))
+
+                    info = tar.getmember(sd['member'])
+                    fin  = tar.extractfile(info)
+                    with open(path, 'wb') as fout:
+                        shutil.copyfileobj(fin, fout)
+                    os.chmod(path, info.mode)
+
+                except Exception:
+                    self._log.exception('cannot extract %s for %s', did, uid)
+                    _fallback(unit, sd)
+                    continue
+
+                self._prof.prof('staging_out_stop', uid=uid, msg=did)
+
+            tar.close()
+            self._drop_archive(key, src, len(items))
+
+            for unit, _ in items:
+                self._prof.prof('staging_out_tar_stop', uid=unit['uid'])
+
+        # the archive markers are internal, and must not end up in the unit
+        # descriptions reported to the client
+        for items in archives.itervalues():
+            for _, sd in items:
+                for k in ARCHIVE_KEYS:
+                    sd.pop(k, None)
+
+        failed_units = [unit for unit, _ in ret if unit['uid'] in failed]
+        ret          = [[unit, actionables] for unit, actionables in ret
+                                            if unit['uid'] not in failed]
+
+        return ret, failed_units
+
+
+    # --------------------------------------------------------------------------
+    #
+    def _get_archive(self, key, src, sd):
+        '''
+        Return the cache entry for the given output archive, and fetch the
+        archive if we don't have a local copy yet.  The fetch (including
+        a check that the archive can be opened) is attempted
+        `ARCHIVE_FETCH_ATTEMPTS` times.
+        '''
+
+        if key not in self._archives:
+
+            tmp_dir = tempfile.mkdtemp(prefix='rp_uso_%s.' % key[0])
+            tmp     = '%s/%s' % (tmp_dir, os.path.basename(src.path))
+
+            attempt = 0
+            while True:
+
+                attempt += 1
+                try:
+                    with self._pool.borrow(rpu.CONN_FS, src) as saga_dir:
+                        saga_dir.copy(src, ru.Url('file://localhost/%s' % tmp))
+                    tarfile.open(tmp).close()
+                    break
+
+                except Exception:
+                    if attempt < ARCHIVE_FETCH_ATTEMPTS:
+                        self._log.exception('fetch %s failed (attempt %d)',
+                                            src, attempt)
+                        time.sleep(ARCHIVE_FETCH_DELAY)
+                        continue
+
+                    shutil.rmtree(tmp_dir, ignore_errors=True)
+                    raise
+
+            # directives of older agents carry no member count: the archive is
+            # then dropped after this bulk
+            self._archives[key] = {'dir'  : tmp_dir,
+                                   'path' : tmp,
+                                   'left' : sd.get('archive_members')}
+
+        return self._archives[key]
+
+
+    # --------------------------------------------------------------------------
+    #
+    def _drop_archive(self, key, src, n_members):
+        '''
+        Count `n_members` members of the archive as handled.  Once all members
+        are handled, the local copy and the remote archive are removed.
+        '''
+
+        archive = self._archives.get(key)
+        if not archive:
+            return
+
+        if archive['left']:
+            archive['left'] -= n_members
+            if archive['left'] > 0:
+                return
+
+        shutil.rmtree(archive['dir'], ignore_errors=True)
+        del(self._archives[key])
+
+        if archive['left'] is None:
+            # we don't know if other units still need the archive
+            return
+
+        try:
+            with self._pool.borrow(rpu.CONN_FS, src) as saga_dir:
+                saga_dir.remove(src)
+
+        except Exception:
+            self._log.exception('cannot remove output archive %s', src)
+
+
+    # --------------------------------------------------------------------------
+    #
+    def _handle_unit(self, unit, actionables):
+
+        uid = unit['uid']
 
-        if key not in self._cache:
-            self._cache[key] = rs.filesystem.Directory(tmp, 
-                    session=self._session)
-        saga_dir = self._cache[key]
+        src_context, tgt_context = self._get_contexts(unit)
 
+        with self._pool.borrow(rpu.CONN_FS, unit['unit_sandbox']) as saga_dir:
 
-        # Loop over all transfer directives and execute them.
-        for sd in actionables:
+            # Loop over all transfer directives and execute them.
+            for sd in actionables:
 
-            action = sd['action']
-            flags  = sd['flags']
-            did    = sd['uid']
-            src    = sd['source']
-            tgt    = sd['target']
+                action = sd['action']
+                flags  = sd['flags']
+                did    = sd['uid']
+                src    = sd['source']
+                tgt    = sd['target']
 
-            self._prof.prof('staging_out_start', uid=uid, msg=did)
+                self._prof.prof('staging_out_start', uid=uid, msg=did)
 
-            self._log.debug('src: %s', src)
-            self._log.debug('tgt: %s', tgt)
+                self._log.debug('src: %s', src)
+                self._log.debug('tgt: %s', tgt)
 
-            src = rpsd.complete_url(src, src_context, self._log)
-            tgt = rpsd.complete_url(tgt, tgt_context, self._log)
+                src = self._resolver.url(src, src_context)
+                tgt = self._resolver.url(tgt, tgt_context)
 
-            self._log.debug('src: %s', src)
-            self._log.debug('tgt: %s', tgt)
+                self._log.debug('src: %s', src)
+                self._log.debug('tgt: %s', tgt)
 
-            # Check if the src is a folder, if true
-            # add recursive flag if not already specified
-            if saga_dir.is_dir(src.path):
-                flags |= rs.filesystem.RECURSIVE
+                # Check if the src is a folder, if true
+                # add recursive flag if not already specified
+                if saga_dir.is_dir(src.path):
+                    flags |= rs.filesystem.RECURSIVE
 
-            # Always set CREATE_PARENTS
-            flags |= rs.filesystem.CREATE_PARENTS
+                # Always set CREATE_PARENTS
+                flags |= rs.filesystem.CREATE_PARENTS
 
-            saga_dir.copy(src, tgt, flags=flags)
-            self._prof.prof('staging_out_stop', uid=uid, msg=did)
+                saga_dir.copy(src, tgt, flags=flags)
+                self._prof.prof('staging_out_stop', uid=uid, msg=did)
 
         # all staging is done -- at this point the unit is final
         unit['state'] = unit['target_state']
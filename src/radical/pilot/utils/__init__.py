@@ -25,6 +25,9 @@ from .pubsub       import *
 from .session      import *
 from .component    import *
 from .slot_utils   import *
+from .conn_pool    import *
+from .staging_pool import *
+from .cleaner      import *
 
 
 # ------------------------------------------------------------------------------
@@ -0,0 +1,196 @@
+
+__copyright__ = "Copyright 2017, http://radical.rutgers.edu"
+__license__   = "MIT"
+
+
+import os
+import sys
+import stat
+import time
+import Queue
+import threading as mt
+
+
+# ------------------------------------------------------------------------------
+#
+# default cleaner settings, can be overwritten in the component config
+CLEANUP_BULK_SIZE = 100     # max number of sandboxes removed in one batch
+CLEANUP_DELAY     = 1.0     # max time to collect sandboxes for a batch (sec)
+CLEANUP_RATE      = 1000    # max number of removed entries per second
+CLEANUP_NICE      = 10      # nice increment for the cleaner thread
+
+
+# ------------------------------------------------------------------------------
+#
+class SandboxCleaner(object):
+    '''
+    A single, low priority worker thread which removes unit sandboxes.
+    Sandboxes are collected into batches of up to `bulk_size` sandboxes, or for
+    up to `delay` seconds, and the removal is limited to `rate` directory
+    entries per second, so that the cleanup does not compete with the staging
+    and execution of units for the metadata server of a shared file system.
+
+    The number of removed sandboxes and bytes are reported as `cleanup_bulk`
+    profile events per batch, and as a `cleanup_total` event on `stop()`.
+    '''
+
+    # --------------------------------------------------------------------------
+    #
+    def __init__(self, name, log, prof, bulk_size=None, delay=None, rate=None):
+
+        if not bulk_size: bulk_size = CLEANUP_BULK_SIZE
+        if delay is None: delay     = CLEANUP_DELAY
+        if not rate     : rate      = CLEANUP_RATE
+
+        self._name      = name
+        self._log       = log
+        self._prof      = prof
+        self._bulk_size = bulk_size
+        self._delay     = delay
+        self._rate      = rate
+        self._term      = mt.Event()
+        self._queue     = Queue.Queue()
+        self._n_total   = 0   # number of removed sandboxes
+        self._b_total   = 0   # number of removed bytes
+        self._t_next    = 0.0 # earliest time for the next removal (throttle)
+
+        self._worker = mt.Thread(target=self._work, name=name)
+        self._worker.daemon = True
+        self._worker.start()
+
+
+    # --------------------------------------------------------------------------
+    #
+    def submit(self, uid, sandbox):
+
+        self._queue.put([uid, sandbox])
+
+
+    # --------------------------------------------------------------------------
+    #
+    def _work(self):
+
+        # On Linux, the nice value is a per-thread property, so this does not
+        # affect the other threads of the component.
+        if sys.platform.startswith('linux'):
+            try:
+                os.nice(CLEANUP_NICE)
+            except OSError:
+                pass
+
+        while not self._term.is_set():
+
+            batch = self._get_batch()
+            if batch:
+                self._cleanup(batch)
+
+
+    # --------------------------------------------------------------------------
+    #
+    def _get_batch(self):
+
+        batch = list()
+        start = None
+
+        while not self._term.is_set() and len(batch) < self._bulk_size:
+
+            if batch and time.time() - start >= self._delay:
+                break
+
+            try:
+                batch.append(self._queue.get(timeout=0.1))
+            except Queue.Empty:
+                continue
+
+            if not start:
+                start = time.time()
+
+        return batch
+
+
+    # --------------------------------------------------------------------------
+    #
+    def _cleanup(self, batch):
+
+        n_boxes = 0
+        n_bytes = 0
+
+        for uid, sandbox in batch:
+
+            if self._term.is_set():
+                break
+
+            try:
+                n_bytes += self._remove(sandbox)
+                n_boxes += 1
+
+            except Exception:
+                self._log.exception('cannot remove sandbox %s', sandbox)
+
+        self._n_total += n_boxes
+        self._b_total += n_bytes
+
+        self._log.debug('removed %d sandboxes (%d bytes)', n_boxes, n_bytes)
+        self._prof.prof('cleanup_bulk', msg='%d sandboxes, %d bytes'
+                                           % (n_boxes, n_bytes))
+
+
+    # --------------------------------------------------------------------------
+    #
+    def _remove(self, path):
+        '''
+        Remove a directory tree like `shutil.rmtree()`, but count the removed
+        bytes on the way, and throttle to the configured rate.  Returns the
+        number of removed bytes.
+        '''
+
+        nbytes = 0
+
+        for name in os.listdir(path):
+
+            entry = os.path.join(path, name)
+            st    = os.lstat(entry)
+
+            if stat.S_ISDIR(st.st_mode):
+                nbytes += self._remove(entry)
+
+            else:
+                self._throttle()
+                os.unlink(entry)
+                nbytes += st.st_size
+
+        self._throttle()
+        os.rmdir(path)
+
+        return nbytes
+
+
+    # --------------------------------------------------------------------------
+    #
+    def _throttle(self):
+
+        # each removal is due `1/rate` seconds after the previous one.  We don't
+        # sleep for each single removal though, but let small bursts pass.
+        now          = time.time()
+        self._t_next = max(self._t_next, now) + 1.0 / self._rate
+
+        ahead = self._t_next - now
+        if ahead > 0.01:
+            self._term.wait(ahead)
+
+
+    # --------------------------------------------------------------------------
+    #
+    def stop(self):
+
+        self._term.set()
+        self._worker.join()
+
+        self._log.info('removed %d sandboxes (%d bytes), %d left',
+                       self._n_total, self._b_total, self._queue.qsize())
+        self._prof.prof('cleanup_total', msg='%d sandboxes, %d bytes'
+                                            % (self._n_total, self._b_total))
+
+
+# ------------------------------------------------------------------------------
+
@@ -5,6 +5,7 @@ import copy
 import time
 import pprint
 import signal
+import logging
 
 import setproctitle    as spt
 import threading       as mt
@@ -117,6 +118,12 @@ class Component(ru.Process):
         if those bridges have endpoints documented.  If so, we assume they are
         running, and that's fine.  If not, we start them and add the respective
         enspoint information to the config.  
+
+        Bridges are forked one after the other, as forking from concurrent
+        threads is not safe, but we don't wait for the address handshake of
+        each bridge before starting the next one: the endpoint addresses of all
+        bridges are collected once all of them are started (unless
+        `cfg['parallel_startup']` is set to `False`).
         
         This method will return a list of created bridge instances.  It is up to
         the callee to watch those bridges for health and to terminate them as
@@ -124,14 +131,18 @@ class Component(ru.Process):
         '''
 
         bspec = cfg.get('bridges', {})
-        log.debug('start bridges   : %s', pprint.pformat(bspec))
+        if log.isEnabledFor(logging.DEBUG):
+            log.debug('start bridges   : %s', pprint.pformat(bspec))
 
         if not bspec:
             # nothing to do
             return list()
 
-        # start all bridges which don't yet have an address
-        bridges = list()
+        # startup events are recorded per pilot on the agent side
+        uid = cfg.get('pilot_id', session.uid)
+
+        # find all bridges which don't yet have an address
+        bnames = list()
         for bname,bcfg in bspec.iteritems():
 
             addr_in  = bcfg.get('addr_in')
@@ -142,32 +153,43 @@ class Component(ru.Process):
                 assert(addr_out), 'addr_out not set, invalid bridge'
                 continue
 
-            # bridge needs starting
-            log.info('create bridge %s', bname)
-            
-            bcfg_clone = copy.deepcopy(bcfg)
-
             # The type of bridge (queue or pubsub) is derived from the name.
-            if bname.endswith('queue'):
-                bridge = rpu_Queue(session, bname, rpu_QUEUE_BRIDGE, bcfg_clone)
+            if not bname.endswith('queue') and not bname.endswith('pubsub'):
+                raise ValueError('unknown bridge type for %s' % bname)
 
-            elif bname.endswith('pubsub'):
-                bridge = rpu_Pubsub(session, bname, rpu_PUBSUB_BRIDGE, bcfg_clone)
+            bnames.append(bname)
 
-            else:
-                raise ValueError('unknown bridge type for %s' % bname)
+        if not bnames:
+            return list()
+
+        session._prof.prof('bridges_start', uid=uid)
 
-            # bridge addresses are URLs
-            bcfg['addr_in']  = str(bridge.addr_in)
-            bcfg['addr_out'] = str(bridge.addr_out)
+        # NOTE: the bridges copy their config section
+        wait    = not cfg.get('parallel_startup', True)
+        bridges = list()
+        for bname in bnames:
 
-            # we keep a handle to the bridge for later shutdown
+            log.info('create bridge %s', bname)
+            if bname.endswith('queue'):
+                bridge = rpu_Queue(session, bname, rpu_QUEUE_BRIDGE,
+                                   bspec[bname], wait=wait)
+            else:
+                bridge = rpu_Pubsub(session, bname, rpu_PUBSUB_BRIDGE,
+                                    bspec[bname], wait=wait)
             bridges.append(bridge)
 
-            # make bridge address part of the
-            # session config
+        # all bridges are started: collect the bridge addresses (URLs), and make
+        # them part of the config
+        for bname, bridge in zip(bnames, bridges):
+            if not wait:
+                bridge.wait_bridge()
+            bspec[bname]['addr_in']  = str(bridge.addr_in)
+            bspec[bname]['addr_out'] = str(bridge.addr_out)
             log.info('created bridge %s (%s)', bname, bridge.name)
 
+        session._prof.prof('bridges_stop', uid=uid)
+
+        # we return the handles to the callee for later shutdown
         return bridges
 
 
@@ -181,6 +203,10 @@ class Component(ru.Process):
         instances.  Components are, however,  *always* created, independent of
         any existing instances.
 
+        The component instances are created from one shared copy of the given
+        config (merged with their component config section): each instance
+        makes its own copy of that config (see `Component.__init__()`).
+
         This method will return a list of created component instances.  It is up
         to the callee to watch those components for health and to terminate them
         as needed.  
@@ -210,7 +236,8 @@ class Component(ru.Process):
         # ----------------------------------------------------------------------
 
         cspec  = cfg.get('components', {})
-        log.debug('start components: %s', pprint.pformat(cspec))
+        if log.isEnabledFor(logging.DEBUG):
+            log.debug('start components: %s', pprint.pformat(cspec))
 
         if not cspec:
             # nothing to do
@@ -220,7 +247,19 @@ class Component(ru.Process):
         # config
         ru.dict_merge(cfg['bridges'], session._cfg.get('bridges', {}), ru.PRESERVE)
 
-        # start components
+        # startup events are recorded per pilot on the agent side
+        uid = cfg.get('pilot_id', session.uid)
+        session._prof.prof('components_start', uid=uid)
+
+        # for components, we pass on the original cfg (or rather one shared copy
+        # of that), and merge the component's config section into it.  We avoid
+        # recursion - but keep bridge information around.
+        base_cfg = copy.deepcopy(cfg)
+        base_cfg['owner']      = cfg.get('uid', session.uid)
+        base_cfg['agents']     = dict()
+        base_cfg['components'] = dict()
+
+        # create component instances
         components = list()
         for cname,ccfg in cspec.iteritems():
 
@@ -234,26 +273,33 @@ class Component(ru.Process):
             ctype = _ctypemap[cname]
             for i in range(cnum):
 
-                # for components, we pass on the original cfg (or rather a copy
-                # of that), and merge the component's config section into it
-                tmp_cfg = copy.deepcopy(cfg)
-                tmp_cfg['cname']      = cname
-                tmp_cfg['number']     = i
-                tmp_cfg['owner']      = cfg.get('uid', session.uid)
-
-                # avoid recursion - but keep bridge information around.  
-                tmp_cfg['agents']     = dict()
-                tmp_cfg['components'] = dict()
-
-                # merge the component config section (overwrite)
-                ru.dict_merge(tmp_cfg, ccfg, ru.OVERWRITE)
+                # the instance copies its config on construction, so we only
+                # need to protect the shared config from the merge below
+                tmp_cfg = copy.copy(base_cfg)
+                tmp_cfg['cname']  = cname
+                tmp_cfg['number'] = i
+
+                # merge the component config section (overwrite), on private
+                # copies of the affected sections
+                for key,val in ccfg.iteritems():
+                    if isinstance(val, dict) and \
+                       isinstance(tmp_cfg.get(key), dict):
+                        tmp_cfg[key] = copy.deepcopy(tmp_cfg[key])
+                        ru.dict_merge(tmp_cfg[key], val, ru.OVERWRITE)
+                    else:
+                        tmp_cfg[key] = val
 
                 comp = ctype.create(tmp_cfg, session)
-                comp.start()
-
-                log.info('%-30s starts %s',  tmp_cfg['owner'], comp.uid)
+                log.info('%-30s starts %s',  base_cfg['owner'], comp.uid)
                 components.append(comp)
 
+        # components are forked one after the other: forking from concurrent
+        # threads is not safe
+        for comp in components:
+            comp.start()
+
+        session._prof.prof('components_stop', uid=uid)
+
         # components are started -- we return the handles to the callee for
         # lifetime management
         return components
@@ -1245,6 +1291,7 @@ class Component(ru.Process):
                 assert(state in self._workers), 'no worker for state %s' % state
 
                 try:
+                    debug     = self._log.isEnabledFor(logging.DEBUG)
                     to_cancel = list()
                     for thing in things:
                         uid   = thing['uid']
@@ -1258,7 +1305,8 @@ class Component(ru.Process):
                                 self._cancel_list.remove(uid)
                             to_cancel.append(thing)
 
-                        self._log.debug('got %s (%s)', ttype, uid)
+                        if debug:
+                            self._log.debug('got %s (%s)', ttype, uid)
 
                     if to_cancel:
                         self.advance(to_cancel, rps.CANCELED, publish=True, push=False)
@@ -1312,7 +1360,11 @@ class Component(ru.Process):
         if not isinstance(things, list):
             things = [things]
 
-        self._log.debug('advance bulk size: %s [%s, %s]', len(things), push, publish)
+        # this is a hot path: only log per thing if that log is actually used
+        debug = self._log.isEnabledFor(logging.DEBUG)
+        if debug:
+            self._log.debug('advance bulk size: %s [%s, %s]',
+                            len(things), push, publish)
 
         # assign state, sort things by state
         buckets = dict()
@@ -1386,7 +1438,8 @@ class Component(ru.Process):
                 if _state in rps.FINAL:
                     # things in final state are dropped
                     for thing in _things:
-                        self._log.debug('final %s [%s]', thing['uid'], _state)
+                        if debug:
+                            self._log.debug('final %s [%s]', thing['uid'], _state)
                         self._prof.prof('drop', uid=thing['uid'], state=_state,
                                         timestamp=ts)
                     continue
@@ -1394,7 +1447,8 @@ class Component(ru.Process):
                 if _state not in self._outputs:
                     # unknown target state -- error
                     for thing in _things:
-                        self._log.debug("lost  %s [%s]", thing['uid'], _state)
+                        if debug:
+                            self._log.debug("lost  %s [%s]", thing['uid'], _state)
                         self._prof.prof('lost', uid=thing['uid'], state=_state,
                                         timestamp=ts)
                     continue
@@ -1402,7 +1456,8 @@ class Component(ru.Process):
                 if not self._outputs[_state]:
                     # empty output -- drop thing
                     for thing in _things:
-                        self._log.debug('drop  %s [%s]', thing['uid'], _state)
+                        if debug:
+                            self._log.debug('drop  %s [%s]', thing['uid'], _state)
                         self._prof.prof('drop', uid=thing['uid'], state=_state,
                                         timestamp=ts)
                     continue
@@ -0,0 +1,608 @@
+__copyright__ = "Copyright 2017, http://radical.rutgers.edu"
+__license__   = "MIT"
+
+
+import os
+import time
+import threading                  as mt
+import multiprocessing.connection as mpc
+
+import saga                 as rs
+import saga.utils.pty_shell as rsup
+
+import radical.utils        as ru
+
+
+# ------------------------------------------------------------------------------
+#
+# the kinds of SAGA handles we pool
+CONN_FS    = 'fs'      # rs.filesystem.Directory, opened on the host's root
+CONN_JS    = 'js'      # rs.job.Service
+CONN_SHELL = 'shell'   # rsup.PTYShell
+
+# default pool settings, can be overwritten in the `conn_pool` section of the
+# session config
+CONN_MAX_CHANNELS   =   8    # max number of concurrently used handles per host
+CONN_IDLE_TIMEOUT   = 300    # close unused handles after that many seconds
+CONN_CHECK_INTERVAL =  60    # check handles idle for longer before reuse
+CONN_WAIT_TIMEOUT   =  60    # fail if no channel to a busy host frees up
+CONN_SHARED         = False  # serve the handles to forked processes
+
+# the operations which forked processes can run on the handles of the pool
+# owner (see `ConnectionPool.borrow()`)
+_REMOTE_OPS = {CONN_FS    : ['copy', 'make_dir', 'remove', 'is_dir'],
+               CONN_JS    : ['run_job'],
+               CONN_SHELL : ['run_sync']}
+
+
+# ------------------------------------------------------------------------------
+#
+class ConnectionPool(object):
+    '''
+    A session-wide pool of SAGA handles (filesystem directories, job services
+    and shells).  Handles are keyed by kind, schema, host, port and user, so
+    that all components of a session which talk to the same resource share the
+    same connection -- which usually means the same ssh master channel.
+
+    A handle is used by one borrower at a time: `get()` hands out an unused
+    handle (or opens a new one), `put()` returns it to the pool.  Returned
+    handles are kept open for reuse, and are closed after `idle_timeout`
+    seconds of inactivity.  Idle handles are checked for health before reuse,
+    and borrowers can report broken handles on `put()`, which are then closed.
+
+    The number of handles per host which are in use at any point in time is
+    capped at `max_channels`: if that cap is reached, idle handles to that host
+    are evicted, and otherwise `get()` waits for a handle to be returned.  If
+    no handle to that host is returned for `wait_timeout` seconds, `get()`
+    fails.
+
+    SAGA handles cannot be shared across processes, and a forked child starts
+    with an empty pool (the parent's handles are dropped, not closed).  If the
+    pool is `shared` though, the process which created it serves its handles
+    to all forked processes: `borrow()` then returns a proxy in the children,
+    which runs the operations listed in `_REMOTE_OPS` on a handle of the
+    parent's pool.  Handles used via `get()` are always local to the calling
+    process.
+    '''
+
+    # --------------------------------------------------------------------------
+    #
+    def __init__(self, session, log, cfg=None):
+
+        if not cfg:
+            cfg = dict()
+
+        self._session        = session
+        self._log            = log
+        self._max_channels   = cfg.get('max_channels',   CONN_MAX_CHANNELS)
+        self._idle_timeout   = cfg.get('idle_timeout',   CONN_IDLE_TIMEOUT)
+        self._check_interval = cfg.get('check_interval', CONN_CHECK_INTERVAL)
+        self._wait_timeout   = cfg.get('wait_timeout',   CONN_WAIT_TIMEOUT)
+
+        self._conns    = dict()          # key: list of conn entries
+        self._returned = dict()          # host: time of last put()
+        self._lock     = mt.Condition()  # protects the above, signals put()
+
+        # the pool owner serves its handles to forked processes
+        self._pid      = os.getpid()
+        self._listener = None
+        self._closing  = False
+        self._clients  = mt.local()      # connections to the pool owner
+
+        if cfg.get('shared', CONN_SHARED):
+            self._authkey  = os.urandom(32)
+            self._listener = mpc.Listener(family='AF_UNIX',
+                                          authkey=self._authkey)
+            self._address  = self._listener.address
+
+            server = mt.Thread(target=self._serve, name='ConnPoolServer')
+            server.daemon = True
+            server.start()
+
+
+    # --------------------------------------------------------------------------
+    #
+    def _key(self, kind, url):
+
+        url = ru.Url(url)
+        return (kind, url.schema, url.host, url.port, url.username)
+
+
+    # --------------------------------------------------------------------------
+    #
+    def _open(self, kind, url):
+
+        url = rs.Url(url)  # deep copy
+
+        self._log.debug('conn pool: open %s %s', kind, url)
+
+        if kind == CONN_FS:
+            url.path = '/'
+            return rs.filesystem.Directory(url, session=self._session)
+
+        elif kind == CONN_JS:
+            return rs.job.Service(url, session=self._session)
+
+        elif kind == CONN_SHELL:
+            return rsup.PTYShell(url, self._session)
+
+        else:
+            raise ValueError('unknown connection type %s' % kind)
+
+
+    # --------------------------------------------------------------------------
+    #
+    def _close(self, conn):
+
+        self._log.debug('conn pool: close %s', conn['key'])
+        try:
+            if conn['kind'] == CONN_SHELL: conn['handle'].finalize(kill_pty=True)
+            else                         : conn['handle'].close()
+        except Exception:
+            self._log.exception('conn pool: close failed for %s', conn['key'])
+
+
+    # --------------------------------------------------------------------------
+    #
+    def _healthy(self, conn):
+
+        # job services have no cheap no-op, and are checked passively (see
+        # `put()`).
+        try:
+            if   conn['kind'] == CONN_FS   : conn['handle'].is_dir('/')
+            elif conn['kind'] == CONN_SHELL: return conn['handle'].alive()
+            return True
+
+        except Exception:
+            self._log.exception('conn pool: health check failed %s', conn['key'])
+            return False
+
+
+    # --------------------------------------------------------------------------
+    #
+    def _remove(self, conn):
+
+        # entries are compared by identity, not by value
+        conns = [c for c in self._conns[conn['key']] if c is not conn]
+        if conns: self._conns[conn['key']] = conns
+        else    : del(self._conns[conn['key']])
+
+
+    # --------------------------------------------------------------------------
+    #
+    def _evict(self, now, host=None):
+        '''
+        remove unused handles which have been idle for too long -- or, if
+        a `host` is given, all unused handles to that host.  The removed
+        handles are returned, and are to be closed once the lock is released.
+        '''
+
+        ret = list()
+        for key in self._conns.keys():
+
+            if host is not None and key[2] != host:
+                continue
+
+            for conn in list(self._conns[key]):
+
+                if conn['used_by'] or conn['busy']:
+                    continue
+
+                if host is None and now - conn['used'] < self._idle_timeout:
+                    continue
+
+                ret.append(conn)
+                self._remove(conn)
+
+        return ret
+
+
+    # --------------------------------------------------------------------------
+    #
+    def _n_channels(self, host):
+
+        # this includes placeholders for handles which are being opened
+        return sum([len(conns) for key, conns in self._conns.iteritems()
+                                               if key[2] == host])
+
+
+    # --------------------------------------------------------------------------
+    #
+    def get(self, kind, url):
+        '''
+        Borrow a handle of the given kind (`CONN_FS`, `CONN_JS`, `CONN_SHELL`)
+        for the given URL.  Filesystem handles are always opened on the root
+        directory of the target host.  The handle must be returned via `put()`.
+
+        Handles are opened and health checked without holding the pool lock, so
+        that a slow host does not block borrowers of other handles.
+        '''
+
+        key      = self._key(kind, url)
+        host     = key[2]
+        start    = time.time()
+        to_close = list()
+        action   = None
+
+        try:
+            with self._lock:
+
+                while True:
+
+                    now       = time.time()
+                    to_close += self._evict(now)
+
+                    # use any unused handle for that key
+                    conn = None
+                    for tmp in self._conns.get(key, []):
+                        if not tmp['used_by'] and not tmp['busy'] \
+                                              and not tmp['failed']:
+                            conn = tmp
+                            break
+
+                    if conn:
+                        conn['used_by'] = mt.current_thread().name
+                        if now - conn['used'] > self._check_interval:
+                            conn['busy'] = True
+                            action = 'check'
+                            break
+
+                        conn['used'] = now
+                        return conn['handle']
+
+                    # we need a new handle -- make sure we don't exceed the
+                    # channel cap for this host
+                    if self._n_channels(host) >= self._max_channels:
+                        to_close += self._evict(now, host=host)
+
+                    if self._n_channels(host) >= self._max_channels:
+
+                        # wait for a handle to be returned, but give up if
+                        # the host's borrowers don't make progress
+                        since = max(start, self._returned.get(host, 0))
+                        if now - since > self._wait_timeout:
+                            raise RuntimeError('conn pool: no free channel to '
+                                               '%s (max %d)'
+                                               % (host, self._max_channels))
+                        self._lock.wait(1.0)
+                        continue
+
+                    # keep a placeholder while we open the handle
+                    conn = {'key'     : key,
+                            'kind'    : kind,
+                            'handle'  : None,
+                            'used_by' : mt.current_thread().name,
+                            'used'    : now,
+                            'failed'  : False,
+                            'busy'    : True}
+                    self._conns.setdefault(key, list()).append(conn)
+                    action = 'open'
+                    break
+
+        finally:
+            for old in to_close:
+                self._close(old)
+
+        if action == 'check':
+
+            healthy = self._healthy(conn)
+
+            with self._lock:
+                conn['busy'] = False
+                if healthy:
+                    conn['used'] = time.time()
+                else:
+                    self._remove(conn)
+                self._lock.notify_all()
+
+            if healthy:
+                return conn['handle']
+
+            # replace the broken handle
+            self._close(conn)
+            return self.get(kind, url)
+
+        # action == 'open'
+        try:
+            handle = self._open(kind, url)
+
+        except Exception:
+            with self._lock:
+                self._remove(conn)
+                self._lock.notify_all()
+            raise
+
+        with self._lock:
+            conn['handle'] = handle
+            conn['busy']   = False
+            conn['used']   = time.time()
+            self._lock.notify_all()
+
+        return handle
+
+
+    # --------------------------------------------------------------------------
+    #
+    def put(self, handle, failed=False):
+        '''
+        Return a handle to the pool.  If `failed` is set, the handle is
+        considered broken, and is closed.
+        '''
+
+        conn = None
+
+        with self._lock:
+
+            for conns in self._conns.itervalues():
+                for conn in conns:
+                    if conn['handle'] is handle:
+                        break
+                else:
+                    continue
+                break
+            else:
+                self._log.warn('conn pool: unknown handle %s', handle)
+                return
+
+            now = time.time()
+            conn['used_by'] = None
+            conn['used']    = now
+            self._returned[conn['key'][2]] = now
+
+            if failed:
+                conn['failed'] = True
+                self._remove(conn)
+            else:
+                conn = None
+
+            self._lock.notify_all()
+
+        if conn:
+            self._close(conn)
+
+
+    # --------------------------------------------------------------------------
+    #
+    def borrow(self, kind, url):
+        '''
+        context manager around `get()` and `put()`: the handle is marked as
+        failed if the `with` block raises a SAGA exception.  In processes
+        forked from the owner of a shared pool, this yields a proxy which runs
+        the handle operations in the pool owner's process.
+        '''
+
+        if self._listener and os.getpid() != self._pid:
+            return _RemoteBorrowed(self, kind, url)
+
+        return _Borrowed(self, kind, url)
+
+
+    # --------------------------------------------------------------------------
+    #
+    def _serve(self):
+
+        while True:
+
+            try:
+                client = self._listener.accept()
+
+            except Exception:
+                if not self._closing:
+                    self._log.exception('conn pool: accept failed')
+                return
+
+            if self._closing:
+                client.close()
+                return
+
+            worker = mt.Thread(target=self._serve_client, args=[client],
+                               name='ConnPoolWorker')
+            worker.daemon = True
+            worker.start()
+
+
+    # --------------------------------------------------------------------------
+    #
+    def _serve_client(self, client):
+
+        try:
+            while True:
+
+                kind, url, op, args, kwargs = client.recv()
+
+                try:
+                    if op not in _REMOTE_OPS.get(kind, []):
+                        raise ValueError('unsupported operation %s' % op)
+
+                    with _Borrowed(self, kind, url) as handle:
+
+                        if op == 'run_job':
+                            j = handle.run_job(*args, **kwargs)
+                            j.wait()
+                            ret = {'state'     : j.state,
+                                   'exit_code' : j.exit_code,
+                                   'stdout'    : j.get_stdout_string(),
+                                   'stderr'    : j.get_stderr_string()}
+                        else:
+                            ret = getattr(handle, op)(*args, **kwargs)
+
+                    client.send(['ok', ret])
+
+                except Exception as e:
+                    self._log.exception('conn pool: %s failed on %s', op, url)
+                    client.send(['error', '%s: %s' % (type(e).__name__, e)])
+
+        except (EOFError, IOError):
+            # the client is gone
+            pass
+
+        finally:
+            client.close()
+
+
+    # --------------------------------------------------------------------------
+    #
+    def _call(self, kind, url, op, args, kwargs):
+
+        # one connection per thread, so that concurrent borrowers in a process
+        # don't serialize on it
+        client = getattr(self._clients, 'client', None)
+        if not client:
+            client = mpc.Client(self._address, authkey=self._authkey)
+            self._clients.client = client
+
+        # SAGA and RU URLs are passed as strings
+        args = [str(arg) if isinstance(arg, (rs.Url, ru.Url)) else arg
+                for arg in args]
+
+        try:
+            client.send([kind, str(url), op, args, kwargs])
+            res, ret = client.recv()
+
+        except (EOFError, IOError):
+            self._clients.client = None
+            raise RuntimeError('conn pool: lost connection to pool owner')
+
+        if res != 'ok':
+            raise RuntimeError('conn pool: %s on %s failed: %s' % (op, url, ret))
+
+        return ret
+
+
+    # --------------------------------------------------------------------------
+    #
+    def close(self):
+
+        # only the pool owner serves handles
+        if self._listener and os.getpid() == self._pid:
+
+            # wake up the server thread, so that it can terminate
+            self._closing = True
+            try:
+                mpc.Client(self._address, authkey=self._authkey).close()
+            except Exception:
+                pass
+
+            self._listener.close()
+            self._listener = None
+
+        with self._lock:
+            for conns in self._conns.values():
+                for conn in conns:
+                    if not conn['handle']:
+                        continue
+                    if conn['used_by']:
+                        self._log.debug('conn pool: %s still in use (%s)',
+                                        conn['key'], conn['used_by'])
+                    self._close(conn)
+            self._conns = dict()
+
+
+    # --------------------------------------------------------------------------
+    #
+    def reset(self):
+        '''
+        Drop all handles without closing them.  This is used after fork, as
+        the child must not use (or close) the parent's connections.  A shared
+        pool is still served by its owner.
+        '''
+
+        self._conns    = dict()
+        self._returned = dict()
+        self._lock     = mt.Condition()
+        self._clients  = mt.local()
+
+
+# ------------------------------------------------------------------------------
+#
+class _Borrowed(object):
+
+    def __init__(self, pool, kind, url):
+
+        self._pool   = pool
+        self._kind   = kind
+        self._url    = url
+        self._handle = None
+
+    def __enter__(self):
+
+        self._handle = self._pool.get(self._kind, self._url)
+        return self._handle
+
+    def __exit__(self, etype, value, traceback):
+
+        failed = bool(etype and issubclass(etype, rs.SagaException))
+        self._pool.put(self._handle, failed=failed)
+
+
+# ------------------------------------------------------------------------------
+#
+class _RemoteBorrowed(object):
+
+    def __init__(self, pool, kind, url):
+
+        self._handle = _RemoteHandle(pool, kind, url)
+
+    def __enter__(self):
+
+        return self._handle
+
+    def __exit__(self, etype, value, traceback):
+
+        # the pool owner returns its handle after each operation
+        pass
+
+
+# ------------------------------------------------------------------------------
+#
+class _RemoteHandle(object):
+    '''
+    Proxy for a handle in the pool owner's process: it supports the (blocking)
+    operations listed in `_REMOTE_OPS`.  `run_job()` waits for the job, and
+    returns a `_RemoteJob` with its final state and output.
+    '''
+
+    def __init__(self, pool, kind, url):
+
+        self._pool = pool
+        self._kind = kind
+        self._url  = url
+
+    def __getattr__(self, op):
+
+        if op not in _REMOTE_OPS[self._kind]:
+            raise AttributeError('%s not supported on shared %s handles'
+                                 % (op, self._kind))
+
+        def _op(*args, **kwargs):
+            ret = self._pool._call(self._kind, self._url, op, args, kwargs)
+            if op == 'run_job':
+                return _RemoteJob(ret)
+            return ret
+
+        return _op
+
+
+# ------------------------------------------------------------------------------
+#
+class _RemoteJob(object):
+
+    def __init__(self, info):
+
+        self.state     = info['state']
+        self.exit_code = info['exit_code']
+        self.stdout    = info['stdout']
+        self.stderr    = info['stderr']
+
+    def wait(self):
+        pass
+
+    def get_stdout_string(self):
+        return self.stdout
+
+    def get_stderr_string(self):
+        return self.stderr
+
+
+# ------------------------------------------------------------------------------
+
@@ -1,10 +1,13 @@
 
 import os
 import sys
+import json
 import time
 import datetime
 import pymongo
 
+from   bson.objectid import ObjectId
+
 import radical.utils as ru
 from   radical.pilot.states import *
 
@@ -14,25 +17,39 @@ _CACHE_BASEDIR = '/tmp/rp_cache_%d/' % os.getuid ()
 
 # ------------------------------------------------------------------------------
 #
-def bson2json (bson_data) :
+# thanks to
+# http://stackoverflow.com/questions/16586180/typeerror-objectid-is-not-json-serializable
+#
+class _BSONEncoder(json.JSONEncoder) :
+
+    def default (self, o):
+        if  isinstance (o, ObjectId) :
+            return str (o)
+        if  isinstance (o, datetime.datetime) :
+            seconds  = time.mktime (o.timetuple ())
+            seconds += (o.microsecond / 1000000.0) 
+            return seconds
+        return json.JSONEncoder.default (self, o)
+
+_bson_encoder = _BSONEncoder()
+
+
+# ------------------------------------------------------------------------------
+#
+def bson2str (bson_data) :
+    """
+    serialize bson data (ie. data containing ObjectIDs and datetimes) into
+    a json string
+    """
 
-    # thanks to
-    # http://stackoverflow.com/questions/16586180/typeerror-objectid-is-not-json-serializable
+    return _bson_encoder.encode (bson_data)
 
-    import json
-    from   bson.objectid import ObjectId
 
-    class MyJSONEncoder (json.JSONEncoder) :
-        def default (self, o):
-            if  isinstance (o, ObjectId) :
-                return str (o)
-            if  isinstance (o, datetime.datetime) :
-                seconds  = time.mktime (o.timetuple ())
-                seconds += (o.microsecond / 1000000.0) 
-                return seconds
-            return json.JSONEncoder.default (self, o)
+# ------------------------------------------------------------------------------
+#
+def bson2json (bson_data) :
 
-    return ru.parse_json (MyJSONEncoder ().encode (bson_data))
+    return ru.parse_json (bson2str (bson_data))
 
 
 # ------------------------------------------------------------------------------
@@ -40,7 +57,11 @@ def bson2json (bson_data) :
 def get_session_ids(db) :
 
     # this is not bein cashed, as the session list can and will change freqently
-    return db.collection_names(include_system_collections=False)
+    # NOTE: we skip the sessions' command and metrics channels ('<sid>.cmd',
+    #       '<sid>.metrics', see `DBSession.__init__()`)
+    return [name for name in db.collection_names(include_system_collections=False)
+                 if  not name.endswith('.cmd')
+                 and not name.endswith('.metrics')]
 
 
 # ------------------------------------------------------------------------------
@@ -52,37 +73,94 @@ def get_last_session(db) :
 
 
 # ------------------------------------------------------------------------------
+#
+# number of documents fetched per DB round trip when walking session cursors
+_BATCH_SIZE = 1024
+
+
+# ------------------------------------------------------------------------------
+#
+def iter_session_docs(db, sid, etype, fields=None, batch_size=_BATCH_SIZE):
+    """
+    Walk the session collection in batches, and yield the json representation
+    of all documents of the given type ('session', 'pmgr', 'pilot', 'umgr',
+    'unit') one at a time.  If `fields` is given, only those fields are
+    fetched from the database.
+    """
+
+    for doc in _iter_docs(db, sid, etype, fields, batch_size):
+        yield bson2json(doc)
+
+
+def _iter_docs(db, sid, etype, fields=None, batch_size=_BATCH_SIZE):
+
+    # same as above, but yield the raw bson documents
+    if fields:
+        fields = dict.fromkeys(fields, 1)
+
+    cursor = db[sid].find({'type' : etype}, fields).batch_size(batch_size)
+
+    for doc in cursor:
+        yield doc
+
+
+# ------------------------------------------------------------------------------
+#
+def _get_cached_session(fname):
+    """
+    Return the session doc from the head of a cached session export, but only
+    if that session was closed when the export was written -- otherwise the
+    cache is considered stale.
+    """
+
+    try:
+        if not os.path.isfile(fname):
+            return None
+
+        with open(fname, 'r') as fin:
+            if fname.endswith('.jsonl'):
+                session = ru.parse_json(fin.readline())
+            else:
+                session = ru.parse_json(fin.read()).get('session')
+
+        if session and session.get('closed'):
+            return session
+
+    except Exception as e:
+        # continue w/o cache
+        sys.stderr.write("warning: cannot read session cache at %s (%s)\n"
+                         % (fname, e))
+
+    return None
+
+
+# ------------------------------------------------------------------------------
+#
 def get_session_docs(db, sid, cache=None, cachedir=None) :
 
     # session docs may have been cached in /tmp/rp_cache_<uid>/<sid>.json -- in that
     # case we pull it from there instead of the database, which will be much
     # quicker.  Also, we do cache any retrieved docs to that place, for later
     # use.  An optional cachdir parameter changes that default location for
-    # lookup and storage.
+    # lookup and storage.  Only closed sessions are cached, as the content of
+    # active sessions can still change.
     if  not cachedir :
         cachedir = _CACHE_BASEDIR
 
     if  not cache :
         cache = "%s/%s.json" % (cachedir, sid)
 
-    try :
-        if  os.path.isfile (cache) :
-          # print 'using cache: %s' % cache
-            return ru.read_json (cache)
-    except Exception as e :
-        # continue w/o cache
-        sys.stderr.write ("warning: cannot read session cache at %s (%s)\n" % (cache, e))
+    if _get_cached_session(cache):
+      # print 'using cache: %s' % cache
+        return ru.read_json(cache)
 
 
     # cache not used or not found -- go to db
     json_data = dict()
 
     # convert bson to json, i.e. serialize the ObjectIDs into strings.
-    json_data['session'] = bson2json(list(db[sid].find({'type' : 'session'})))
-    json_data['pmgr'   ] = bson2json(list(db[sid].find({'type' : 'pmgr'   })))
-    json_data['pilot'  ] = bson2json(list(db[sid].find({'type' : 'pilot'  })))
-    json_data['umgr'   ] = bson2json(list(db[sid].find({'type' : 'umgr'   })))
-    json_data['unit'   ] = bson2json(list(db[sid].find({'type' : 'unit'   })))
+    for etype in ['session', 'pmgr', 'pilot', 'umgr']:
+        json_data[etype] = list(iter_session_docs(db, sid, etype))
 
     if  len(json_data['session']) == 0 :
         raise ValueError ('no session %s in db (was `cleanup` disabled on `session.close()`?)' % sid)
@@ -93,28 +171,124 @@ def get_session_docs(db, sid, cache=None, cachedir=None) :
     # there can only be one session, not a list of one
     json_data['session'] = json_data['session'][0]
 
-    # we want to add a list of handled units to each pilot doc
+    # we want to add a list of handled units to each pilot doc -- we collect
+    # those while walking the unit cursor
+    unit_ids = dict()
     for pilot in json_data['pilot'] :
+        pilot['unit_ids'] = unit_ids.setdefault(pilot['uid'], list())
 
-        pilot['unit_ids'] = list()
-
-        for unit in json_data['unit'] :
-
-            if  unit['pilot'] == pilot['uid']:
-                pilot['unit_ids'].append (unit['uid'])
+    json_data['unit'] = list()
+    for unit in iter_session_docs(db, sid, 'unit'):
+        json_data['unit'].append(unit)
+        if unit.get('pilot') in unit_ids:
+            unit_ids[unit['pilot']].append(unit['uid'])
 
     # if we got here, we did not find a cached version -- thus add this dataset
     # to the cache
-    try :
-        os.system ('mkdir -p %s' % cachedir)
-        ru.write_json (json_data, "%s/%s.json" % (cachedir, sid))
-    except Exception as e :
-        # we can live without cache, no problem...
-        pass
+    if json_data['session'].get('closed'):
+        try :
+            os.system ('mkdir -p %s' % cachedir)
+            ru.write_json (json_data, "%s/%s.json" % (cachedir, sid))
+        except Exception as e :
+            # we can live without cache, no problem...
+            pass
 
     return json_data
 
 
+# ------------------------------------------------------------------------------
+#
+def export_session(db, sid, tgt=None, fields=None, cachedir=None):
+    """
+    Stream all documents of a session into a file of newline-delimited json
+    (`<tgt>/<sid>.jsonl`), and return that file's name.  The database cursor is
+    walked in batches, so that memory consumption does not depend on the
+    session size.  The file contains one document per line, in the order:
+
+        session, pmgr(s), umgr(s), unit(s), pilot(s)
+
+    Pilot documents come last, as they carry the list of unit IDs handled by the
+    respective pilot (`unit_ids`), which is collected while units are streamed.
+
+    If `fields` is given, unit documents are projected to those fields ('uid',
+    'type' and 'pilot' are always included).
+
+    If the target file exists and the session was closed when it was written,
+    the file is reused and the database is not touched.
+    """
+
+    if  not tgt :
+        tgt = cachedir or _CACHE_BASEDIR
+
+    fname = '%s/%s.jsonl' % (tgt, sid)
+
+    if _get_cached_session(fname):
+        return fname
+
+    if fields:
+        fields = list(set(fields).union(['uid', 'type', 'pilot']))
+
+    session = db[sid].find_one({'type' : 'session'})
+    if not session:
+        raise ValueError('no session %s in db' % sid)
+
+    try:
+        os.makedirs(tgt)
+    except OSError:
+        pass # dir exists
+
+    # write to a temporary file first, so that readers never see partial
+    # exports
+    tmp = '%s.%d.tmp' % (fname, os.getpid())
+    with open(tmp, 'w') as fout:
+
+        def _write(doc):
+            fout.write(bson2str(doc))
+            fout.write('\n')
+
+        _write(session)
+
+        for etype in ['pmgr', 'umgr']:
+            for doc in _iter_docs(db, sid, etype):
+                _write(doc)
+
+        unit_ids = dict()
+        for unit in _iter_docs(db, sid, 'unit', fields=fields):
+            _write(unit)
+            unit_ids.setdefault(unit.get('pilot'), list()).append(unit['uid'])
+
+        for pilot in _iter_docs(db, sid, 'pilot'):
+            pilot['unit_ids'] = unit_ids.get(pilot['uid'], list())
+            _write(pilot)
+
+    os.rename(tmp, fname)
+
+    return fname
+
+
+# ------------------------------------------------------------------------------
+#
+def read_session_export(fname, etypes=None):
+    """
+    Lazily read a session export as written by `export_session()`, and yield
+    the documents one at a time.  If `etypes` is given (a type name or list of
+    type names), only documents of those types are returned.
+    """
+
+    if etypes and not isinstance(etypes, list):
+        etypes = [etypes]
+
+    with open(fname, 'r') as fin:
+        for line in fin:
+
+            line = line.strip()
+            if not line:
+                continue
+
+            doc = ru.parse_json(line)
+            if not etypes or doc.get('type') in etypes:
+                yield doc
+
 
 # ------------------------------------------------------------------------------
 #
@@ -131,6 +305,11 @@ def get_session_slothist(db, sid, cache=None, cachedir=None) :
 
     ret = dict()
 
+    # group units by pilot in a single pass
+    pilot_units = dict()
+    for unit_doc in docs['unit'] :
+        pilot_units.setdefault(unit_doc['pilot'], list()).append(unit_doc)
+
     for pilot_doc in docs['pilot'] :
 
         pilot_id     = pilot_doc['uid'] 
@@ -152,30 +331,28 @@ def get_session_slothist(db, sid, cache=None, cachedir=None) :
                 slot_infos  [slot_name] = list()
                 slot_started[slot_name] = sys.maxint
 
-        for unit_doc in docs['unit'] :
-            if unit_doc['pilot'] == pilot_doc['uid'] :
-
-                started  = None
-                finished = None
-                for event in sorted (unit_doc['state_history'], 
-                                     key=lambda x: x['timestamp']) :
-                    if started :
-                        finished = event['timestamp']
-                        break
-                    if event['state'] == AGENT_EXECUTING :
-                        started = event['timestamp']
-
-                if not started or not finished :
-                  # print "no start/finish for cu %s - ignored" % unit_doc['uid']
+        for unit_doc in pilot_units.get(pilot_id, []) :
+            started  = None
+            finished = None
+            for event in sorted (unit_doc['state_history'], 
+                                 key=lambda x: x['timestamp']) :
+                if started :
+                    finished = event['timestamp']
+                    break
+                if event['state'] == AGENT_EXECUTING :
+                    started = event['timestamp']
+
+            if not started or not finished :
+              # print "no start/finish for cu %s - ignored" % unit_doc['uid']
+                continue
+
+            for slot_id in unit_doc['opaque_slots'] :
+                if slot_id not in slot_infos :
+                  # print "slot %s for pilot %s unknown - ignored" % (slot_id, pilot_id)
                     continue
-
-                for slot_id in unit_doc['opaque_slots'] :
-                    if slot_id not in slot_infos :
-                      # print "slot %s for pilot %s unknown - ignored" % (slot_id, pilot_id)
-                        continue
-                    
-                    slot_infos[slot_id].append([started, finished])
-                    slot_started[slot_id] = min(started, slot_started[slot_id])
+                
+                slot_infos[slot_id].append([started, finished])
+                slot_started[slot_id] = min(started, slot_started[slot_id])
 
         for slot_id in slot_infos :
             slot_infos[slot_id].sort(key=lambda x: float(x[0]))
@@ -273,4 +450,120 @@ def get_session_events(db, sid, cache=None, cachedir=None) :
 
 
 # ------------------------------------------------------------------------------
+#
+# The queries RP components poll on while a session is active.  The templates
+# are completed with uids found in the session (see `get_session_query_stats`).
+_HOT_QUERIES = [
+    ['agent_0._check_units_cb', {'type'    : 'unit',
+                                 'pilot'   : '%(pid)s',
+                                 'control' : 'agent_pending'}],
+    ['umgr._unit_pull_cb',      {'type'    : 'unit',
+                                 'umgr'    : '%(umgr)s',
+                                 'control' : 'umgr_pending'}],
+    ['dbs.get_units',           {'type'    : 'unit',
+                                 'umgr'    : '%(umgr)s',
+                                 'control' : {'$ne' : 'umgr'}}],
+    ['dbs.get_pilots',          {'type'    : 'pilot',
+                                 'uid'     : '%(pid)s'}],
+]
+
+
+def _expand_query(query, uids):
+
+    ret = dict()
+    for k, v in query.iteritems():
+        if   isinstance(v, dict)      : ret[k] = _expand_query(v, uids)
+        elif isinstance(v, basestring): ret[k] = v % uids
+        else                          : ret[k] = v
+    return ret
+
+
+def _get_plan_index(plan):
+
+    # find the name of the index used by a (possibly nested) winning plan
+    if not plan:
+        return None
+
+    if 'indexName' in plan:
+        return plan['indexName']
+
+    for key in ['inputStage', 'outerStage', 'innerStage']:
+        name = _get_plan_index(plan.get(key))
+        if name:
+            return name
+
+    for stage in plan.get('inputStages', []):
+        name = _get_plan_index(stage)
+        if name:
+            return name
+
+    return plan.get('stage')
 
+
+def get_session_query_stats(db, sid, repeat=10):
+    """
+    For each of the hot queries in `_HOT_QUERIES`, report the query plan which
+    MongoDB picks for the given session, and the latency of that query as seen
+    by a polling component.  Returns a list of dicts with the keys:
+
+        name    : name of the polling code path
+        query   : query issued
+        index   : name of the index used (or 'COLLSCAN')
+        n_keys  : number of index keys examined
+        n_docs  : number of documents examined
+        n_ret   : number of documents returned
+        t_min   : minimal query latency (seconds) over 'repeat' runs
+        t_avg   : average query latency (seconds) over 'repeat' runs
+        t_max   : maximal query latency (seconds) over 'repeat' runs
+    """
+
+    coll = db[sid]
+
+    if not coll.find_one({'type' : 'session'}):
+        raise ValueError('no session %s in db' % sid)
+
+    # pick any pilot and umgr to complete the query templates
+    pilot = coll.find_one({'type' : 'pilot'}, {'uid' : 1})
+    umgr  = coll.find_one({'type' : 'umgr' }, {'uid' : 1})
+    uids  = {'pid'  : pilot['uid'] if pilot else None,
+             'umgr' : umgr ['uid'] if umgr  else None}
+
+    ret = list()
+    for name, template in _HOT_QUERIES:
+
+        query = _expand_query(template, uids)
+        plan  = coll.find(query).explain()
+
+        if 'queryPlanner' in plan:
+            # MongoDB >= 3.0
+            stats  = plan.get('executionStats', {})
+            index  = _get_plan_index(plan['queryPlanner'].get('winningPlan'))
+            n_keys = stats.get('totalKeysExamined')
+            n_docs = stats.get('totalDocsExamined')
+            n_ret  = stats.get('nReturned')
+        else:
+            index  = plan.get('cursor')
+            n_keys = plan.get('nscanned')
+            n_docs = plan.get('nscannedObjects')
+            n_ret  = plan.get('n')
+
+        times = list()
+        for _ in range(max(1, repeat)):
+            start = time.time()
+            list(coll.find(query))
+            times.append(time.time() - start)
+
+        ret.append({'name'   : name,
+                    'query'  : query,
+                    'index'  : index,
+                    'n_keys' : n_keys,
+                    'n_docs' : n_docs,
+                    'n_ret'  : n_ret,
+                    't_min'  : min(times),
+                    't_avg'  : sum(times) / len(times),
+                    't_max'  : max(times)})
+
+    return ret
+
+
+# ------------------------------------------------------------------------------
@@ -32,6 +32,47 @@ def tail(txt, maxlen=MAX_IO_LOGLENGTH):
         return txt
 
 
+# ------------------------------------------------------------------------------
+#
+def tail_file(fname, maxlen=MAX_IO_LOGLENGTH):
+    '''
+    Same as `tail(unicode(open(fname).read(), 'utf-8'), maxlen)`, but only reads
+    the end of the file: an UTF-8 character is at most 4 bytes long, so the last
+    `4 * maxlen` bytes contain the `maxlen` characters we want to keep.  Any
+    partial UTF-8 sequence at the start of that window is skipped.
+
+    Raises `UnicodeDecodeError` if the tail of the file is not valid UTF-8.
+    '''
+
+    # read a few extra bytes to cover a cut sequence at the window start
+    window = 4 * (maxlen + 1)
+
+    with open(fname, 'rb') as fin:
+
+        fin.seek(0, os.SEEK_END)
+        size   = fin.tell()
+        offset = max(0, size - window)
+
+        fin.seek(offset)
+        data = fin.read()
+
+    if offset:
+        # skip UTF-8 continuation bytes (10xxxxxx) of a cut character
+        start = 0
+        while start < 3 and start < len(data) \
+                        and (ord(data[start]) & 0xC0) == 0x80:
+            start += 1
+        data = data[start:]
+
+    txt = unicode(data, 'utf-8')
+
+    if offset:
+        # the file is longer than what we read, and thus than `maxlen`
+        return "[... CONTENT SHORTENED ...]\n%s" % txt[-maxlen:]
+    else:
+        return tail(txt, maxlen)
+
+
 # ------------------------------------------------------------------------------
 #
 def get_rusage():
@@ -50,6 +91,63 @@ def get_rusage():
          % (rtime, utime, stime, rss)
 
 
+# ------------------------------------------------------------------------------
+#
+def reap(proc, block=False):
+    '''
+    Collect the given `subprocess.Popen` child via `os.wait4()`.  Other than
+    `proc.wait()`, this preserves the resource usage of the child (which
+    includes all descendants it waited for).
+
+    Returns `(None, None)` if the child is still running and `block` is not
+    set, and `(exit_code, rusage)` otherwise.  The exit code follows the
+    `Popen.returncode` semantics (negative signal number if killed).  `rusage`
+    is a dict with user and system CPU time (seconds), max RSS (kB on Linux),
+    page faults, block I/O operations and context switches -- it is `None` if
+    the child was already collected elsewhere.
+    '''
+
+    if proc.returncode is not None:
+        return proc.returncode, None
+
+    if block: flags = 0
+    else    : flags = os.WNOHANG
+
+    while True:
+        try:
+            pid, status, usage = os.wait4(proc.pid, flags)
+            break
+
+        except OSError as e:
+            if e.errno == errno.EINTR:
+                continue
+            if e.errno == errno.ECHILD:
+                # already collected: no rusage
+                return proc.wait(), None
+            raise
+
+    if not pid:
+        return None, None
+
+    if os.WIFSIGNALED(status): exit_code = -os.WTERMSIG(status)
+    else                     : exit_code =  os.WEXITSTATUS(status)
+
+    # make sure Popen does not attempt to collect the child again
+    proc.returncode = exit_code
+
+    rusage = {'utime'   : usage.ru_utime,
+              'stime'   : usage.ru_stime,
+              'maxrss'  : usage.ru_maxrss,
+              'minflt'  : usage.ru_minflt,
+              'majflt'  : usage.ru_majflt,
+              'inblock' : usage.ru_inblock,
+              'oublock' : usage.ru_oublock,
+              'nvcsw'   : usage.ru_nvcsw,
+              'nivcsw'  : usage.ru_nivcsw}
+
+    return exit_code, rusage
+
+
 # ------------------------------------------------------------------------------
 #
 def rec_makedir(target):
@@ -1,6 +1,7 @@
 
 import os
 import glob
+import json
 
 import radical.utils               as ru
 from   radical.pilot import states as rps
@@ -58,11 +59,8 @@ def get_hostmap_deprecated(profiles):
 
 
 # ------------------------------------------------------------------------------
-# 
-def get_session_profile(sid, src=None):
-
-    if not src:
-        src = "%s/%s" % (os.getcwd(), sid)
+#
+def _get_profile_names(sid, src):
 
     if os.path.exists(src):
         # we have profiles locally
@@ -73,6 +71,13 @@ def get_session_profile(sid, src=None):
         from .session import fetch_profiles
         profiles = fetch_profiles(sid=sid, skip_existing=True)
 
+    return profiles
+
+
+# ------------------------------------------------------------------------------
+#
+def _read_session_profile(sid, profiles):
+
     #  filter out some frequent, but uninteresting events
     efilter = {ru.EVENT : ['publish', 'work start', 'work done'], 
                ru.MSG   : ['update unit state', 'unit update pushed', 
@@ -91,6 +96,567 @@ def get_session_profile(sid, src=None):
     return profile, accuracy, hostmap
 
 
+# ------------------------------------------------------------------------------
+# 
+def get_session_profile(sid, src=None):
+
+    if not src:
+        src = "%s/%s" % (os.getcwd(), sid)
+
+    # if the session profiles have been converted into a profile store, we use
+    # that, as it is much quicker to load.  The store is rebuilt first if any
+    # profile has changed since (e.g., if the profiles were fetched again).
+    store = "%s/%s.%s" % (src, sid, PROFILE_STORE_EXT)
+    if os.path.isdir(store):
+        convert_session_profile(sid, src=src, tgt=store)
+        profs = ProfileStore(store)
+        return list(profs.rows()), profs.accuracy, profs.hostmap
+
+    profiles = _get_profile_names(sid, src)
+
+    return _read_session_profile(sid, profiles)
+
+
+# ------------------------------------------------------------------------------
+#
+# A profile store is a directory which holds a combined and cleaned session
+# profile in columnar form:
+#
+#   <src>/<sid>.cprof/meta.json    : row count, accuracy, hostmap, and the
+#                                    dictionaries of interned column values
+#   <src>/<sid>.cprof/col_<n>.npy  : one numpy array per profile column
+#
+# The time column (`ru.TIME`) is stored as float64 array, all other columns are
+# stored as int32 codes into the respective value dictionary.  Column files can
+# be memory mapped, so that loading a store is cheap, and filtering is done
+# with vectorized operations on the codes.
+#
+PROFILE_STORE_EXT = 'cprof'
+
+
+def convert_session_profile(sid, src=None, tgt=None, force=False):
+    """
+    Read, combine and clean all profiles of the given session (see
+    `get_session_profile()`), and write the result into a profile store at
+    `tgt` (which defaults to `<src>/<sid>.cprof`).  The store is only rebuilt if
+    any of the profiles is newer than the store, or if `force` is set.
+
+    Returns the path to the profile store.
+    """
+
+    if not src:
+        src = "%s/%s" % (os.getcwd(), sid)
+
+    if not tgt:
+        tgt = "%s/%s.%s" % (src, sid, PROFILE_STORE_EXT)
+
+    profiles = _get_profile_names(sid, src)
+
+    if not force and _is_current_profile_store(tgt, profiles):
+        return tgt
+
+    profile, accuracy, hostmap = _read_session_profile(sid, profiles)
+
+    return write_profile_store(profile, accuracy, hostmap, tgt)
+
+
+# ------------------------------------------------------------------------------
+#
+def _is_current_profile_store(store, profiles):
+
+    # a store is current if it is complete, and not older than any profile
+    meta = "%s/meta.json" % store
+    if not os.path.isfile(meta):
+        return False
+
+    mtime = os.path.getmtime(meta)
+    return all([os.path.getmtime(p) <= mtime for p in profiles])
+
+
+# ------------------------------------------------------------------------------
+#
+def write_profile_store(profile, accuracy, hostmap, tgt):
+    """
+    Write the given profile rows into a profile store at `tgt`, and return
+    `tgt`.
+    """
+
+    import numpy as np
+
+    if not os.path.isdir(tgt):
+        os.makedirs(tgt)
+
+    n_rows = len(profile)
+    n_cols = max([len(row) for row in profile] or [ru.TIME + 1])
+    dicts  = dict()
+
+    for col in range(n_cols):
+
+        values = [row[col] if col < len(row) else None for row in profile]
+
+        if col == ru.TIME:
+            data = np.array(values, dtype=np.float64)
+
+        else:
+            # intern column values
+            lookup = dict()
+            codes  = [lookup.setdefault(v, len(lookup)) for v in values]
+            data   = np.array(codes, dtype=np.int32)
+
+            dicts[col] = [None] * len(lookup)
+            for v, code in lookup.iteritems():
+                dicts[col][code] = v
+
+        np.save("%s/col_%d.npy" % (tgt, col), data)
+
+    # meta data are written last, as they mark the store as complete
+    with open("%s/meta.json" % tgt, 'w') as fout:
+        json.dump({'n_rows'   : n_rows,
+                   'n_cols'   : n_cols,
+                   'accuracy' : accuracy,
+                   'hostmap'  : hostmap,
+                   'dicts'    : dicts}, fout)
+
+    return tgt
+
+
+# ------------------------------------------------------------------------------
+#
+class ProfileStore(object):
+    """
+    Read access to a profile store as written by `write_profile_store()`.
+    Columns are loaded lazily (and memory mapped) on first access.  Rows can be
+    selected by event, uid and time range, and can be retrieved in the row
+    format returned by `get_session_profile()`.
+    """
+
+    # --------------------------------------------------------------------------
+    #
+    def __init__(self, path):
+
+        import numpy as np
+
+        self._np   = np
+        self._path = path
+        self._cols = dict()
+
+        with open("%s/meta.json" % path, 'r') as fin:
+            meta = json.load(fin)
+
+        self._n_rows   = meta['n_rows']
+        self._n_cols   = meta['n_cols']
+        self._accuracy = meta['accuracy']
+        self._hostmap  = meta['hostmap']
+
+        # json turns the column indexes into strings
+        self._dicts = {int(col) : vals for col, vals in meta['dicts'].iteritems()}
+        self._codes = dict()  # reverse lookup, created on demand
+
+
+    # --------------------------------------------------------------------------
+    #
+    def __len__(self):
+        return self._n_rows
+
+    @property
+    def accuracy(self):
+        return self._accuracy
+
+    @property
+    def hostmap(self):
+        return self._hostmap
+
+
+    # --------------------------------------------------------------------------
+    #
+    def column(self, col):
+        """
+        Return the (memory mapped) numpy array for the given column.  For all
+        columns but `ru.TIME`, the array contains codes into `values(col)`.
+        """
+
+        if col not in self._cols:
+            self._cols[col] = self._np.load("%s/col_%d.npy" % (self._path, col),
+                                            mmap_mode='r')
+        return self._cols[col]
+
+
+    # --------------------------------------------------------------------------
+    #
+    def values(self, col):
+        """
+        Return the list of distinct values of the given column.
+        """
+        return self._dicts.get(col, [])
+
+
+    # --------------------------------------------------------------------------
+    #
+    def codes(self, col, values):
+        """
+        Return the codes of the given values in the given column.  Values which
+        do not appear in the column are ignored.
+        """
+
+        if col not in self._codes:
+            self._codes[col] = {v : i for i, v in enumerate(self.values(col))}
+
+        lookup = self._codes[col]
+        return [lookup[v] for v in values if v in lookup]
+
+
+    # --------------------------------------------------------------------------
+    #
+    def select(self, event=None, uid=None, tmin=None, tmax=None):
+        """
+        Return an index array of all rows which match the given filters.
+        `event` and `uid` can be single values or lists of values, `tmin` and
+        `tmax` limit the time range (inclusive).
+        """
+
+        np   = self._np
+        mask = np.ones(self._n_rows, dtype=bool)
+
+        for col, vals in [[ru.EVENT, event], [ru.UID, uid]]:
+
+            if vals is None:
+                continue
+
+            if not isinstance(vals, list):
+                vals = [vals]
+
+            mask &= np.in1d(self.column(col), self.codes(col, vals))
+
+        if tmin is not None: mask &= (self.column(ru.TIME) >= tmin)
+        if tmax is not None: mask &= (self.column(ru.TIME) <= tmax)
+
+        return np.nonzero(mask)[0]
+
+
+    # --------------------------------------------------------------------------
+    #
+    def rows(self, idx=None):
+        """
+        Generate profile rows (lists) for the given row indexes (as returned by
+        `select()`), or for all rows if no index is given.
+        """
+
+        if idx is None:
+            idx = self._np.arange(self._n_rows)
+
+        cols = [self.column(col)[idx] for col in range(self._n_cols)]
+
+        for i in range(len(idx)):
+            row = list()
+            for col in range(self._n_cols):
+                if col == ru.TIME:
+                    row.append(float(cols[col][i]))
+                else:
+                    row.append(self._dicts[col][cols[col][i]])
+            yield row
+
+
+# ------------------------------------------------------------------------------
+#
+# Pilot startup is split into phases, each delimited by a start and a stop
+# event which carry the pilot ID as uid.  Start and stop are given as lists of
+# `(event, state)` tuples, any of which match (`state=None` matches any
+# state).  For both, the mode determines if the first or the last matching
+# event is used -- the latter is needed for phases which are executed by
+# several agent instances, or which depend on several conditions.  Stop events
+# are only considered if they happen after the phase started.
+#
+STARTUP_PHASES = [
+    # phase         start events                                   mode
+    #               stop  events                                   mode
+    ['launch'     , [('advance', rps.PMGR_LAUNCHING)],                 'first',
+                    [('advance', rps.PMGR_ACTIVE_PENDING)],            'first'],
+    ['queue_wait' , [('advance', rps.PMGR_ACTIVE_PENDING)],            'first',
+                    [('bootstrap_0_start', None)],                     'first'],
+    ['sandbox'    , [('bootstrap_0_start', None)],                     'first',
+                    [('ve_unpack_start',   None),
+                     ('ve_setup_start',    None)],                     'first'],
+    ['ve'         , [('ve_unpack_start',   None),
+                     ('ve_setup_start',    None)],                     'first',
+                    [('ve_setup_stop',     None)],                     'first'],
+    ['agent_start', [('ve_setup_stop',     None)],                     'first',
+                    [('bridges_start',     None)],                     'first'],
+    ['bridges'    , [('bridges_start',     None)],                     'first',
+                    [('bridges_stop',      None)],                     'first'],
+    ['lrms'       , [('lrms_start',        None)],                     'first',
+                    [('lrms_stop',         None)],                     'first'],
+    ['lm_hooks'   , [('lm_hooks_start',    None)],                     'first',
+                    [('lm_hooks_stop',     None)],                     'first'],
+    ['sub_agents' , [('sub_agents_start',  None)],                     'first',
+                    [('sub_agents_stop',   None)],                     'first'],
+    ['components' , [('components_start',  None)],                     'first',
+                    [('components_stop',   None)],                     'last' ],
+    ['first_unit' , [('advance', rps.PMGR_ACTIVE),
+                     ('components_stop',   None)],                     'last' ,
+                    [('exec_first',        None)],                     'first'],
+]
+
+
+def get_startup_phases(profile, pids=None):
+    '''
+    For each pilot in the given (combined) session profile, derive the timings
+    of the startup phases defined in `STARTUP_PHASES`.  This returns a dict
+
+        { pid : { phase : [start, stop] } }
+
+    Phases for which no start or stop event is found are omitted.  If `pids` is
+    given, only those pilots are considered.
+    '''
+
+    # collect the event specs we are interested in
+    specs = set()
+    for _, starts, _, stops, _ in STARTUP_PHASES:
+        specs.update(starts)
+        specs.update(stops)
+
+    if pids is not None:
+        pids = set(pids)
+
+    # one pass over the profile: collect event times per pilot and spec
+    times = dict()
+    for row in profile:
+
+        uid = row[ru.UID]
+        if pids is not None and uid not in pids:
+            continue
+
+        spec = (row[ru.EVENT], row[ru.STATE])
+        if spec not in specs:
+            spec = (row[ru.EVENT], None)
+            if spec not in specs:
+                continue
+
+        times.setdefault(uid, dict()).setdefault(spec, list()).append(row[ru.TIME])
+
+    ret = dict()
+    for pid, ptimes in times.iteritems():
+
+        phases = dict()
+        for name, starts, smode, stops, emode in STARTUP_PHASES:
+
+            tstarts = [t for s in starts for t in ptimes.get(s, [])]
+            if not tstarts:
+                continue
+
+            if smode == 'last': start = max(tstarts)
+            else              : start = min(tstarts)
+
+            tstops = [t for s in stops  for t in ptimes.get(s, []) if t >= start]
+            if not tstops:
+                continue
+
+            if emode == 'last': stop  = max(tstops)
+            else              : stop  = min(tstops)
+
+            phases[name] = [start, stop]
+
+        if phases:
+            ret[pid] = phases
+
+    return ret
+
+
+# ------------------------------------------------------------------------------
+#
+def get_startup_critical_path(phases):
+    '''
+    Given the phases of a single pilot (as returned by `get_startup_phases()`),
+    determine the critical path through the startup: starting from the phase
+    which finishes last, we walk backward and, at each step, pick the phase
+    which finished last before the current one started (ie. the phase the
+    current one waited for).  Time on the path which is not covered by any
+    phase is reported as `idle`.  Returns a list of `[phase, start, stop]`
+    entries in time order.
+    '''
+
+    if not phases:
+        return list()
+
+    todo = dict(phases)
+    name = max(todo, key=lambda p: todo[p][1])
+    path = list()
+
+    while name:
+
+        start, stop = todo.pop(name)
+        path.append([name, start, stop])
+
+        prev = [p for p in todo if todo[p][1] <= start]
+        if not prev:
+            break
+
+        name = max(prev, key=lambda p: todo[p][1])
+        if todo[name][1] < start:
+            path.append(['idle', todo[name][1], start])
+
+    path.reverse()
+    return path
+
+
+# ------------------------------------------------------------------------------
+#
+def _get_stats(values):
+
+    n    = len(values)
+    mean = sum(values) / n
+    std  = (sum([(v - mean) ** 2 for v in values]) / n) ** 0.5
+
+    return {'n'   : n,
+            'mean': mean,
+            'std' : std,
+            'min' : min(values),
+            'max' : max(values)}
+
+
+def get_startup_summary(startup):
+    '''
+    Aggregate the startup phases of all pilots (as returned by
+    `get_startup_phases()`).  This returns a dict with duration statistics
+    (`n`, `mean`, `std`, `min`, `max`) for
+
+        'total'    : time from the first phase start to the last phase stop
+        'phases'   : each phase
+        'critical' : each phase, counting only the pilots for which the phase
+                     is on the critical path
+    '''
+
+    totals   = list()
+    phases   = dict()
+    critical = dict()
+
+    for pid in sorted(startup):
+
+        for name, (start, stop) in startup[pid].iteritems():
+            phases.setdefault(name, list()).append(stop - start)
+
+        path = get_startup_critical_path(startup[pid])
+        for name, start, stop in path:
+            critical.setdefault(name, list()).append(stop - start)
+
+        if path:
+            totals.append(path[-1][2] - path[0][1])
+
+    ret = {'total'   : _get_stats(totals) if totals else None,
+           'phases'  : dict(),
+           'critical': dict()}
+
+    for name, durations in phases.iteritems():
+        ret['phases'][name] = _get_stats(durations)
+
+    for name, durations in critical.iteritems():
+        ret['critical'][name] = _get_stats(durations)
+
+    return ret
+
+
+# ------------------------------------------------------------------------------
+#
+def get_session_startup(sid, src=None):
+    '''
+    Read the session profile (see `get_session_profile()`), and return the
+    pilot startup phases as returned by `get_startup_phases()`.
+    '''
+
+    profile, _, _ = get_session_profile(sid, src)
+
+    return get_startup_phases(profile)
+
+
+# ------------------------------------------------------------------------------
+#
+def _get_unit_cores(descr):
+
+    procs   = descr.get('cpu_processes') or descr.get('cores') or 1
+    threads = descr.get('cpu_threads')   or 1
+
+    return procs * threads
+
+
+def get_rusage_summary(units):
+    '''
+    Aggregate the resource usage of units (as recorded in the unit documents by
+    the agent executor, see `rpu.reap()`) per pilot.  For each pilot, this
+    returns a dict with
+
+        'n_units'     : number of units with resource usage information
+        'cpu_time'    : user + system CPU time used by the units (core-seconds)
+        'alloc_time'  : wall time * allocated cores of the units (core-seconds)
+        'wall_time'   : summed wall time of the units (seconds)
+        'max_rss'     : the largest max RSS of all units (kB)
+        'utilization' : cpu_time / alloc_time (or None)
+        'units'       : duration statistics (see `get_startup_summary()`) for
+                        the units' 'cpu_time' and 'wall_time'
+    '''
+
+    ret = dict()
+
+    for unit in units:
+
+        rusage = unit.get('rusage')
+        if not rusage or not rusage.get('wtime'):
+            continue
+
+        pid  = unit.get('pilot')
+        info = ret.setdefault(pid, {'n_units'   : 0,
+                                    'cpu_time'  : 0.0,
+                                    'alloc_time': 0.0,
+                                    'wall_time' : 0.0,
+                                    'max_rss'   : 0,
+                                    'units'     : {'cpu_time'  : list(),
+                                                   'wall_time' : list()}})
+
+        cpu_time = rusage['utime'] + rusage['stime']
+        cores    = _get_unit_cores(unit.get('description', dict()))
+
+        info['n_units']    += 1
+        info['cpu_time']   += cpu_time
+        info['wall_time']  += rusage['wtime']
+        info['alloc_time'] += rusage['wtime'] * cores
+        info['max_rss']     = max(info['max_rss'], rusage['maxrss'])
+
+        info['units']['cpu_time' ].append(cpu_time)
+        info['units']['wall_time'].append(rusage['wtime'])
+
+    for info in ret.values():
+
+        if info['alloc_time']:
+            info['utilization'] = info['cpu_time'] / info['alloc_time']
+        else:
+            info['utilization'] = None
+
+        for key in info['units']:
+            info['units'][key] = _get_stats(info['units'][key])
+
+    return ret
+
+
+# ------------------------------------------------------------------------------
+#
+def get_session_rusage(sid, src=None, dburl=None):
+    '''
+    Read the session json (see `get_session_description()`), and return the
+    per-pilot resource usage as returned by `get_rusage_summary()`.
+    '''
+
+    from .session import fetch_json
+
+    if not src:
+        src = "%s/%s" % (os.getcwd(), sid)
+
+    if os.path.isfile('%s/%s.json' % (src, sid)):
+        json = ru.read_json('%s/%s.json' % (src, sid))
+    else:
+        ftmp = fetch_json(sid=sid, dburl=dburl, tgt=src, skip_existing=True)
+        json = ru.read_json(ftmp)
+
+    return get_rusage_summary(json.get('unit', list()))
+
+
 # ------------------------------------------------------------------------------
 # 
 def get_session_description(sid, src=None, dburl=None):
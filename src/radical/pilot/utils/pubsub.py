@@ -69,11 +69,12 @@ def _uninterruptible(f, *args, **kwargs):
 #
 class Pubsub(ru.Process):
 
-    def __init__(self, session, channel, role, cfg, addr=None):
+    def __init__(self, session, channel, role, cfg, addr=None, wait=True):
         """
         Addresses are of the form 'tcp://host:port'.  Both 'host' and 'port' can
         be wildcards for BRIDGE roles -- the bridge will report the in and out
-        addresses as obj.addr_in and obj.addr_out.
+        addresses as obj.addr_in and obj.addr_out.  If `wait` is `False`, those
+        are only known after calling `wait_bridge()`.
         """
 
         self._session = session
@@ -138,19 +139,10 @@ class Pubsub(ru.Process):
             self._pqueue = mp.Queue()
             self.start()
 
-            try:
-                [addr_in, addr_out] = self._pqueue.get(True, _BRIDGE_TIMEOUT)
-
-                # store addresses
-                self._addr_in  = ru.Url(addr_in)
-                self._addr_out = ru.Url(addr_out)
-
-                # use the local hostip for bridge addresses
-                self._addr_in.host  = rpu_hostip()
-                self._addr_out.host = rpu_hostip()
-
-            except pyq.Empty as e:
-                raise RuntimeError ("bridge did not come up! (%s)" % e)
+            # the bridge addresses can also be collected later on (see
+            # `Component.start_bridges()`)
+            if wait:
+                self.wait_bridge()
 
 
         # ----------------------------------------------------------------------
@@ -166,6 +158,30 @@ class Pubsub(ru.Process):
             self.start(spawn=False)
 
 
+    # --------------------------------------------------------------------------
+    #
+    def wait_bridge(self):
+        '''
+        Wait for the bridge child process to report its addresses.
+        '''
+
+        assert(self._role == PUBSUB_BRIDGE), 'only bridges report addresses'
+
+        try:
+            [addr_in, addr_out] = self._pqueue.get(True, _BRIDGE_TIMEOUT)
+
+            # store addresses
+            self._addr_in  = ru.Url(addr_in)
+            self._addr_out = ru.Url(addr_out)
+
+            # use the local hostip for bridge addresses
+            self._addr_in.host  = rpu_hostip()
+            self._addr_out.host = rpu_hostip()
+
+        except pyq.Empty as e:
+            raise RuntimeError ("bridge did not come up! (%s)" % e)
+
+
     # --------------------------------------------------------------------------
     #
     @property
@@ -27,7 +27,7 @@ QUEUE_BRIDGE  = 'bridge'
 QUEUE_OUTPUT  = 'output'
 QUEUE_ROLES   = [QUEUE_INPUT, QUEUE_BRIDGE, QUEUE_OUTPUT]
 
-_BRIDGE_TIMEOUT  =     1  # how long to wait for bridge startup
+_BRIDGE_TIMEOUT  =     5  # how long to wait for bridge startup
 _LINGER_TIMEOUT  =   250  # ms to linger after close
 _HIGH_WATER_MARK =     0  # number of messages to buffer before dropping
 
@@ -103,7 +103,7 @@ def _uninterruptible(f, *args, **kwargs):
 #
 class Queue(ru.Process):
 
-    def __init__(self, session, qname, role, cfg, addr=None):
+    def __init__(self, session, qname, role, cfg, addr=None, wait=True):
         """
         This Queue type sets up an zmq channel of this kind:
 
@@ -121,7 +121,8 @@ class Queue(ru.Process):
 
         Addresses are of the form 'tcp://host:port'.  Both 'host' and 'port' can
         be wildcards for BRIDGE roles -- the bridge will report the in and out
-        addresses as obj.addr_in and obj.addr_out.  """
+        addresses as obj.addr_in and obj.addr_out.  If `wait` is `False`, those
+        are only known after calling `wait_bridge()`.  """
 
         self._session = session
         self._qname   = qname
@@ -189,19 +190,10 @@ class Queue(ru.Process):
             self._pqueue = mp.Queue()
             self.start()
 
-            try:
-                [addr_in, addr_out] = self._pqueue.get(True, _BRIDGE_TIMEOUT)
-
-                # store addresses
-                self._addr_in  = ru.Url(addr_in)
-                self._addr_out = ru.Url(addr_out)
-
-                # use the local hostip for bridge addresses
-                self._addr_in.host  = rpu_hostip()
-                self._addr_out.host = rpu_hostip()
-
-            except pyq.Empty as e:
-                raise RuntimeError ("bridge did not come up! (%s)" % e)
+            # the bridge addresses can also be collected later on (see
+            # `Component.start_bridges()`)
+            if wait:
+                self.wait_bridge()
 
 
         # ----------------------------------------------------------------------
@@ -217,6 +209,30 @@ class Queue(ru.Process):
             self.start(spawn=False)
 
 
+    # --------------------------------------------------------------------------
+    #
+    def wait_bridge(self):
+        '''
+        Wait for the bridge child process to report its addresses.
+        '''
+
+        assert(self._role == QUEUE_BRIDGE), 'only bridges report addresses'
+
+        try:
+            [addr_in, addr_out] = self._pqueue.get(True, _BRIDGE_TIMEOUT)
+
+            # store addresses
+            self._addr_in  = ru.Url(addr_in)
+            self._addr_out = ru.Url(addr_out)
+
+            # use the local hostip for bridge addresses
+            self._addr_in.host  = rpu_hostip()
+            self._addr_out.host = rpu_hostip()
+
+        except pyq.Empty as e:
+            raise RuntimeError ("bridge did not come up! (%s)" % e)
+
+
     # --------------------------------------------------------------------------
     #
     @property
@@ -5,12 +5,225 @@ import glob
 import saga
 import tarfile
 
+import threading       as mt
+
+from multiprocessing.pool import ThreadPool
+
 import radical.utils as ru
 from   radical.pilot.states  import *
 
 from db_utils import *
 
 
+# ------------------------------------------------------------------------------
+#
+# number of pilot sandboxes which are handled concurrently, and number of
+# concurrent transfers per resource (ie. per ssh master connection)
+_FETCH_WORKERS      = 16
+_FETCH_PER_RESOURCE = 4
+
+# name of the manifest which records what files have been fetched from a pilot
+# sandbox, to skip unchanged files on the next fetch
+_FETCH_MANIFEST     = '.fetched.json'
+
+# tarball name and file pattern, per kind of files to fetch
+_FETCH_KINDS = {'profiles' : ['%s.prof.tgz', '*.prof'],
+                'logfiles' : ['%s.log.tgz',  '*.log' ]}
+
+
+# ------------------------------------------------------------------------------
+#
+def fetch_sandbox_files(pilots, tgt, kind, access=None, session=None,
+                        skip_existing=False, workers=None, log=None, rep=None):
+    '''
+    pilots: list of pilot documents (need 'uid' and 'pilot_sandbox')
+    tgt:    url of the dir to store the files in (in $tgt/$pilot_id/)
+    kind:   'profiles' or 'logfiles'
+
+    Fetch the profiles or logfiles of all given pilots.  Pilots are handled
+    concurrently, by a bounded pool of worker threads.  All pilots on the same
+    resource share one filesystem handle (and thus one connection), and the
+    number of concurrent transfers per resource is limited.  Files which did
+    not change (in size and, where available, in mtime) since the last fetch
+    are skipped.
+
+    returns list of file names
+    '''
+
+    if kind not in _FETCH_KINDS:
+        raise ValueError('cannot fetch %s' % kind)
+
+    if not log:
+        log = ru.Logger('radical.pilot.utils')
+    if not rep:
+        rep = ru.Reporter('radical.pilot.utils')
+
+    if not workers:
+        workers = _FETCH_WORKERS
+
+    tgt_url   = saga.Url(str(tgt))
+    resources = dict()         # filesystem handles and semaphores per resource
+    res_lock  = mt.Lock()
+
+    # --------------------------------------------------------------------------
+    def _get_resource(sandbox_url):
+
+        key = '%s://%s' % (sandbox_url.schema, sandbox_url.host)
+        with res_lock:
+            if key not in resources:
+                log.debug('open resource %s', key)
+                root = saga.filesystem.Directory('%s/' % key, session=session)
+                resources[key] = [root, mt.Semaphore(_FETCH_PER_RESOURCE)]
+            return resources[key]
+
+    # --------------------------------------------------------------------------
+    def _work(pilot):
+        try:
+            files = _fetch_pilot_files(pilot, tgt_url, kind, access,
+                                       skip_existing, _get_resource, log)
+            rep.ok("+ %s (%s)\n" % (pilot['uid'], kind))
+            return files
+
+        except Exception as e:
+            rep.error("- %s (%s)\n" % (pilot['uid'], kind))
+            log.exception('failed to fetch %s for %s', kind, pilot['uid'])
+            return list()
+    # --------------------------------------------------------------------------
+
+    ret  = list()
+    pool = ThreadPool(min(workers, max(1, len(pilots))))
+    try:
+        for files in pool.map(_work, pilots):
+            ret.extend(files)
+    finally:
+        pool.close()
+        pool.join()
+
+        for root, _ in resources.values():
+            try:
+                root.close()
+            except Exception:
+                pass
+
+    return ret
+
+
+# ------------------------------------------------------------------------------
+#
+def _fetch_pilot_files(pilot, tgt_url, kind, access, skip_existing,
+                       get_resource, log):
+
+    pid         = pilot['uid']
+    ret         = list()
+    tarball     = _FETCH_KINDS[kind][0] % pid
+    pattern     = _FETCH_KINDS[kind][1]
+    sandbox_url = saga.Url(pilot['pilot_sandbox'])
+    pilot_tgt   = '%s/%s' % (tgt_url.path, pid)
+
+    log.debug("processing pilot '%s'", pid)
+
+    if access:
+        # Allow to use a different access schema than used for the the run.
+        # Useful if you ran from the headnode, but would like to retrieve
+        # the files to your desktop (Hello Titan).
+        access_url = saga.Url(access)
+        sandbox_url.schema = access_url.schema
+        sandbox_url.host   = access_url.host
+
+    root, sem = get_resource(sandbox_url)
+    sandbox   = root.open_dir(sandbox_url.path)
+
+    try:
+        os.makedirs(pilot_tgt)
+    except OSError:
+        pass
+
+    try:
+        manifest = ru.read_json('%s/%s' % (pilot_tgt, _FETCH_MANIFEST))
+    except Exception:
+        manifest = dict()
+
+    # ------------------------------------------------------------------
+    def _stat(fname):
+        # size and (for local sandboxes) mtime of a sandbox file
+        size  = sandbox.get_size(fname)
+        mtime = None
+        if sandbox_url.schema in ['file', 'local']:
+            mtime = os.stat('%s/%s' % (sandbox_url.path, fname)).st_mtime
+        return [size, mtime]
+
+    def _fetch(fname, ftgt, check_local=True):
+        # fetch the file unless it is unchanged since the last fetch.
+        stat = _stat(fname)
+        if manifest.get(fname) == stat:
+            if not check_local or os.path.isfile(ftgt):
+                log.debug('skip unchanged %s/%s', pid, fname)
+                return False
+
+        if skip_existing and check_local and os.path.isfile(ftgt) \
+                and os.stat(ftgt).st_size > 0:
+            return False
+
+        with sem:
+            log.info("fetch '%s%s' to '%s'.", sandbox_url, fname, ftgt)
+            sandbox.copy(fname, 'file://localhost/%s' % ftgt,
+                         flags=saga.filesystem.CREATE_PARENTS)
+        manifest[fname] = stat
+        return True
+    # ------------------------------------------------------------------
+
+    try:
+        # Try to fetch a tarball of files, so that we can get them all in one
+        # (SAGA) go!
+        tarball_available = False
+        try:
+            if  sandbox.is_file(tarball) and \
+                sandbox.get_size(tarball):
+                log.info("%s tarball exists", kind)
+                tarball_available = True
+            else:
+                log.warn("%s tarball doesnt exists!", kind)
+
+        except saga.DoesNotExist:
+            log.warn("%s tarball doesnt exists!", kind)
+
+        if tarball_available:
+
+            # We now have a local tarball -- extract it.  The tarball is
+            # removed after extraction, so we don't check for a local copy
+            # when looking for changes.
+            ftgt = '%s/%s' % (tgt_url.path, tarball)
+            if _fetch(tarball, ftgt, check_local=False):
+                log.info("Extract tarball %s to '%s'.", ftgt, pilot_tgt)
+                try:
+                    tf = tarfile.open(ftgt)
+                    tf.extractall(pilot_tgt)
+                    tf.close()
+                    os.unlink(ftgt)
+
+                except Exception as e:
+                    # fetch the tarball again next time
+                    log.warn('could not extract tarball %s [%s]', ftgt, e)
+                    manifest.pop(tarball, None)
+
+            ret.extend(glob.glob("%s/%s" % (pilot_tgt, pattern)))
+
+        else:
+            # If we dont have a tarball (for whichever reason), fetch individual
+            # files
+            for fname in sandbox.list(pattern):
+                fname = str(fname)
+                ftgt  = '%s/%s' % (pilot_tgt, fname)
+                ret.append(ftgt)
+                _fetch(fname, ftgt)
+
+    finally:
+        sandbox.close()
+        ru.write_json(manifest, '%s/%s' % (pilot_tgt, _FETCH_MANIFEST))
+
+    return ret
+
+
 # ------------------------------------------------------------------------------
 #
 def fetch_profiles (sid, dburl=None, src=None, tgt=None, access=None, 
@@ -90,100 +303,9 @@ def fetch_profiles (sid, dburl=None, src=None, tgt=None, access=None,
     log.debug("Session: %s", sid)
     log.debug("Number of pilots in session: %d", num_pilots)
 
-    for pilot in pilots:
-
-        try:
-            log.debug("processing pilot '%s'", pilot['uid'])
-
-            sandbox_url = saga.Url(pilot['pilot_sandbox'])
-
-            if access:
-                # Allow to use a different access schema than used for the the run.
-                # Useful if you ran from the headnode, but would like to retrieve
-                # the profiles to your desktop (Hello Titan).
-                access_url = saga.Url(access)
-                sandbox_url.schema = access_url.schema
-                sandbox_url.host   = access_url.host
-
-              # print "Overriding remote sandbox: %s" % sandbox_url
-
-            sandbox = saga.filesystem.Directory (sandbox_url, session=session)
-
-            # Try to fetch a tarball of profiles, so that we can get them all in one (SAGA) go!
-            PROFILES_TARBALL = '%s.prof.tgz' % pilot['uid']
-            tarball_available = False
-            try:
-                if  sandbox.is_file(PROFILES_TARBALL) and \
-                    sandbox.get_size(PROFILES_TARBALL):
-
-                    log.info("profiles tarball exists")
-                    ftgt = saga.Url('%s/%s' % (tgt_url, PROFILES_TARBALL))
-
-                    if skip_existing and os.path.isfile(ftgt.path) \
-                            and os.stat(ftgt.path).st_size > 0:
-
-                        log.info("skip fetching of '%s/%s' to '%s'.", 
-                                 sandbox_url, PROFILES_TARBALL, tgt_url)
-                        tarball_available = True
-                    else:
-
-                        log.info("fetch '%s%s' to '%s'.", sandbox_url, 
-                                 PROFILES_TARBALL, tgt_url)
-
-                        prof_file = saga.filesystem.File("%s%s" % (sandbox_url, PROFILES_TARBALL), session=session)
-                        prof_file.copy(ftgt, flags=saga.filesystem.CREATE_PARENTS)
-                        prof_file.close()
-
-                        tarball_available = True
-                else:
-                    log.warn("profiles tarball doesnt exists!")
-
-            except saga.DoesNotExist:
-                log.exception("exception(TODO): profiles tarball doesnt exists!")
-
-            try:
-                os.mkdir("%s/%s" % (tgt_url.path, pilot['uid']))
-            except OSError:
-                pass
-
-            # We now have a local tarball
-            if tarball_available:
-                log.info("Extract tarball %s to '%s'.", ftgt.path, tgt_url.path)
-                try:
-                    tarball = tarfile.open(ftgt.path, mode='r:gz')
-                    tarball.extractall("%s/%s" % (tgt_url.path, pilot['uid']))
-
-                    profiles = glob.glob("%s/%s/*.prof" % (tgt_url.path, pilot['uid']))
-                    ret.extend(profiles)
-                    os.unlink(ftgt.path)
-
-                except Exception as e:
-                    log.warn('could not extract tarball %s [%s]', ftgt.path, e)
-
-                # If extract succeeded, no need to fetch individual profiles
-                rep.ok("+ %s (profiles)\n" % pilot['uid'])
-                continue
-
-            # If we dont have a tarball (for whichever reason), fetch individual profiles
-            profiles = sandbox.list('*.prof')
-            for prof in profiles:
-
-                ftgt = saga.Url('%s/%s/%s' % (tgt_url, pilot['uid'], prof))
-                ret.append("%s" % ftgt.path)
-
-                if skip_existing and os.path.isfile(ftgt.path) \
-                                 and os.stat(ftgt.path).st_size > 0:
-                    pass
-                else:
-                    prof_file = saga.filesystem.File("%s%s" % (sandbox_url, prof), session=session)
-                    prof_file.copy(ftgt, flags=saga.filesystem.CREATE_PARENTS)
-                    prof_file.close()
-
-            rep.ok("+ %s (profiles)\n" % pilot['uid'])
-
-        except Exception as e:
-            rep.error("- %s (profiles)\n" % pilot['uid'])
-            log.exception('failed to fet profile for %s', pilot['uid'])
+    ret.extend(fetch_sandbox_files(pilots, tgt_url, 'profiles', access=access,
+                                   session=session, skip_existing=skip_existing,
+                                   log=log, rep=rep))
 
     return ret
 
@@ -258,105 +380,13 @@ def fetch_logfiles (sid, dburl=None, src=None, tgt=None, access=None,
     log.info("Session: %s", sid)
     log.info("Number of pilots in session: %d", num_pilots)
 
-
-    for pilot in pilots:
-
-        try:
-            sandbox_url = saga.Url(pilot['pilot_sandbox'])
-
-            if access:
-                # Allow to use a different access schema than used for the the run.
-                # Useful if you ran from the headnode, but would like to retrieve
-                # the logfiles to your desktop (Hello Titan).
-                access_url = saga.Url(access)
-                sandbox_url.schema = access_url.schema
-                sandbox_url.host   = access_url.host
-
-            sandbox  = saga.filesystem.Directory (sandbox_url, session=session)
-
-            # Try to fetch a tarball of logfiles, so that we can get them all in one (SAGA) go!
-            LOGFILES_TARBALL  = '%s.log.tgz' % pilot['uid']
-            tarball_available = False
-            try:
-                if  sandbox.is_file(LOGFILES_TARBALL) and \
-                    sandbox.get_size(LOGFILES_TARBALL):
-
-                    log.info("logfiles tarball exists")
-                    ftgt = saga.Url('%s/%s' % (tgt_url, LOGFILES_TARBALL))
-
-                    if skip_existing and os.path.isfile(ftgt.path) \
-                            and os.stat(ftgt.path).st_size > 0:
-
-                        log.info("Skip fetching of '%s/%s' to '%s'.", 
-                                 sandbox_url, LOGFILES_TARBALL, tgt_url)
-                        tarball_available = True
-                    else:
-
-                        log.info("Fetching '%s%s' to '%s'.", 
-                                sandbox_url, LOGFILES_TARBALL, tgt_url)
-                        log_file = saga.filesystem.File("%s%s" % (sandbox_url, LOGFILES_TARBALL), session=session)
-                        log_file.copy(ftgt, flags=saga.filesystem.CREATE_PARENTS)
-                        log_file.close()
-
-                        tarball_available = True
-                else:
-                    log.warn("logiles tarball doesnt exists")
-
-            except saga.DoesNotExist:
-                log.warn("logfiles tarball doesnt exists")
-
-            try:
-                os.mkdir("%s/%s" % (tgt_url.path, pilot['uid']))
-            except OSError:
-                pass
-
-            # We now have a local tarball
-            if tarball_available:
-                log.debug("Extract tarball %s to %s", ftgt.path, tgt_url.path)
-
-                try:
-                    tarball = tarfile.open(ftgt.path)
-                    tarball.extractall("%s/%s" % (tgt_url.path, pilot['uid']))
-
-                    logfiles = glob.glob("%s/%s/*.log" % (tgt_url.path, pilot['uid']))
-                    log.info("tarball %s extracted to '%s/%s/'.", 
-                            ftgt.path, tgt_url.path, pilot['uid'])
-                    ret.extend(logfiles)
-                    os.unlink(ftgt.path)
-
-                except Exception as e:
-                    log.warn('could not extract tarball %s [%s]', ftgt.path, e)
-
-                # If extract succeeded, no need to fetch individual logfiles
-                rep.ok("+ %s (logfiles)\n" % pilot['uid'])
-                continue
-
-            # If we dont have a tarball (for whichever reason), fetch individual logfiles
-            logfiles = sandbox.list('*.log')
-
-            for logfile in logfiles:
-
-                ftgt = saga.Url('%s/%s/%s' % (tgt_url, pilot['uid'], logfile))
-                ret.append("%s" % ftgt.path)
-
-                if skip_existing and os.path.isfile(ftgt.path) \
-                                 and os.stat(ftgt.path).st_size > 0:
-
-                    continue
-
-                log_file = saga.filesystem.File("%s%s" % (sandbox_url, logfile), session=session)
-                log_file.copy(ftgt, flags=saga.filesystem.CREATE_PARENTS)
-                log_file.close()
-
-            rep.ok("+ %s (logfiles)\n" % pilot['uid'])
-
-        except Exception as e:
-            rep.error("- %s (logfiles)\n" % pilot['uid'])
+    ret.extend(fetch_sandbox_files(pilots, tgt_url, 'logfiles', access=access,
+                                   session=session, skip_existing=skip_existing,
+                                   log=log, rep=rep))
 
     return ret
 
 
-
 # ------------------------------------------------------------------------------
 #
 def fetch_json(sid, dburl=None, tgt=None, skip_existing=False, session=None,
@@ -0,0 +1,160 @@
+
+__copyright__ = "Copyright 2017, http://radical.rutgers.edu"
+__license__   = "MIT"
+
+
+import os
+import Queue
+import itertools
+import threading as mt
+
+from radical.pilot.constants import LINK, COPY, MOVE, DEFAULT_PRIORITY
+
+
+# ------------------------------------------------------------------------------
+#
+# staging lanes: metadata operations (links, small files) are served by their
+# own workers, so that they don't wait behind bulk data copies.
+STAGING_META = 'meta'
+STAGING_DATA = 'data'
+
+# default pool settings, can be overwritten in the component config
+STAGING_META_WORKERS =  4
+STAGING_DATA_WORKERS =  2
+STAGING_SMALL_FILE   =  1024 * 1024  # bytes
+
+
+# ------------------------------------------------------------------------------
+#
+class StagingPool(object):
+    '''
+    A bounded pool of staging worker threads.  Units are submitted with their
+    actionable staging directives and a lane, and the given `stage` callable is
+    invoked as `stage(unit, actionables)` in one of the workers of that lane.
+    The directives of a unit are enacted in order of their `priority` (highest
+    first), and the units of a lane are served by their highest directive
+    priority, then in order of submission.
+
+    The workers do not advance units: finished units are collected, and are
+    picked up by the owning component via `get_done()`, so that all state
+    transitions happen in the component's callback context.
+    '''
+
+    # --------------------------------------------------------------------------
+    #
+    def __init__(self, name, log, stage, n_meta=None, n_data=None):
+
+        if not n_meta: n_meta = STAGING_META_WORKERS
+        if not n_data: n_data = STAGING_DATA_WORKERS
+
+        self._name      = name
+        self._log       = log
+        self._stage     = stage
+        self._seq       = itertools.count()
+        self._term      = mt.Event()
+        self._done      = list()
+        self._done_lock = mt.Lock()
+        self._queues    = {STAGING_META : Queue.PriorityQueue(),
+                           STAGING_DATA : Queue.PriorityQueue()}
+        self._workers   = list()
+
+        for lane, n in [[STAGING_META, n_meta], [STAGING_DATA, n_data]]:
+            for idx in range(n):
+                t = mt.Thread(target=self._work, args=[lane],
+                              name='%s.%s.%d' % (name, lane, idx))
+                t.daemon = True
+                t.start()
+                self._workers.append(t)
+
+
+    # --------------------------------------------------------------------------
+    #
+    @staticmethod
+    def get_lane(actionables, resolve, small=STAGING_SMALL_FILE):
+        '''
+        Units which only link files, or copy or move files of at most `small`
+        bytes, are staged in the `STAGING_META` lane, all others in the
+        `STAGING_DATA` lane.  `resolve(src)` maps a directive's source to
+        a local path, or to `None` for directives this component will skip.
+        '''
+
+        for sd in actionables:
+
+            if sd['action'] == LINK:
+                continue
+
+            if sd['action'] in [COPY, MOVE]:
+                path = resolve(sd['source'])
+                if not path:
+                    continue
+                if os.path.isfile(path) and os.path.getsize(path) <= small:
+                    continue
+
+            return STAGING_DATA
+
+        return STAGING_META
+
+
+    # --------------------------------------------------------------------------
+    #
+    def submit(self, unit, actionables, lane):
+
+        # stable sort, so that directives of equal priority keep their order
+        actionables = sorted(actionables, reverse=True,
+                             key=lambda sd: sd.get('priority', DEFAULT_PRIORITY))
+        priority    = actionables[0].get('priority', DEFAULT_PRIORITY)
+
+        self._queues[lane].put((-priority, next(self._seq), unit, actionables))
+
+
+    # --------------------------------------------------------------------------
+    #
+    def _work(self, lane):
+
+        queue = self._queues[lane]
+
+        while not self._term.is_set():
+
+            try:
+                _, _, unit, actionables = queue.get(timeout=0.1)
+            except Queue.Empty:
+                continue
+
+            try:
+                self._stage(unit, actionables)
+                error = None
+
+            except Exception as e:
+                self._log.exception('staging failed for %s', unit['uid'])
+                error = e
+
+            with self._done_lock:
+                self._done.append([unit, error])
+
+
+    # --------------------------------------------------------------------------
+    #
+    def get_done(self):
+        '''
+        Return a list of `[unit, error]` tuples for all units which finished
+        staging since the last call -- `error` is `None` on success.
+        '''
+
+        with self._done_lock:
+            ret        = self._done
+            self._done = list()
+
+        return ret
+
+
+    # --------------------------------------------------------------------------
+    #
+    def stop(self):
+
+        self._term.set()
+        for t in self._workers:
+            t.join()
+
+
+# ------------------------------------------------------------------------------
+
@@ -0,0 +1,114 @@
+#!/usr/bin/env python
+
+# ------------------------------------------------------------------------------
+#
+# Benchmark the logging overhead in agent hot paths: place a number of MPI
+# units with the Continuous scheduler, construct their APRun launch commands,
+# and release the slots again -- all with the logger at INFO level.  The run is
+# profiled, and we report the time spent in pprint and repr formatting, which
+# should be (close to) zero.
+#
+#   usage: bench_log_overhead.py [<n_units> [<n_nodes> [<procs_per_unit>]]]
+#
+# ------------------------------------------------------------------------------
+
+import sys
+import time
+import pstats
+import logging
+import cProfile
+
+import radical.pilot.constants as rpc
+
+from radical.pilot.agent.lm.aprun            import APRun
+from radical.pilot.agent.scheduler.continuous import Continuous
+
+
+# ------------------------------------------------------------------------------
+#
+def create_scheduler(log, n_nodes, cores_per_node):
+
+    # we bypass the component setup and only initialize what the slot
+    # allocation needs
+    sched = Continuous.__new__(Continuous)
+    sched._log                 = log
+    sched._scattered           = False
+    sched._lrms_lm_info        = dict()
+    sched._lrms_cores_per_node = cores_per_node
+    sched._lrms_gpus_per_node  = 0
+    sched.nodes                = [{'name'  : 'node_%05d' % n,
+                                   'uid'   : 'node_%05d' % n,
+                                   'cores' : [rpc.FREE] * cores_per_node,
+                                   'gpus'  : list()}
+                                  for n in range(n_nodes)]
+    return sched
+
+
+# ------------------------------------------------------------------------------
+#
+def create_lm(log):
+
+    lm = APRun.__new__(APRun)
+    lm._log           = log
+    lm.launch_command = 'aprun'
+    return lm
+
+
+# ------------------------------------------------------------------------------
+#
+def bench(sched, lm, n_units, procs):
+
+    cud = {'executable'       : '/bin/date',
+           'arguments'        : list(),
+           'cpu_processes'    : procs,
+           'cpu_process_type' : 'MPI',
+           'cpu_threads'      : 1,
+           'gpu_processes'    : 0,
+           'gpu_process_type' : None}
+
+    for i in range(n_units):
+        slots = sched._allocate_slot(cud)
+        assert(slots), 'allocation failed'
+        lm.construct_command({'uid'         : 'unit.%06d' % i,
+                              'description' : cud,
+                              'slots'       : slots}, None)
+        sched._release_slot(slots)
+
+
+# ------------------------------------------------------------------------------
+#
+if __name__ == '__main__':
+
+    n_units = 10000
+    n_nodes = 128
+    procs   = 64
+
+    if len(sys.argv) > 1: n_units = int(sys.argv[1])
+    if len(sys.argv) > 2: n_nodes = int(sys.argv[2])
+    if len(sys.argv) > 3: procs   = int(sys.argv[3])
+
+    logging.basicConfig()
+    log = logging.getLogger('bench_log_overhead')
+    log.setLevel(logging.INFO)
+
+    sched = create_scheduler(log, n_nodes, cores_per_node=16)
+    lm    = create_lm(log)
+
+    prof  = cProfile.Profile()
+    start = time.time()
+    prof.runcall(bench, sched, lm, n_units, procs)
+    stop  = time.time()
+
+    stats = pstats.Stats(prof)
+    fmt   = 0.0
+    for (fname, _, func), stat in stats.stats.iteritems():
+        if 'pprint' in fname or func == '<repr>':
+            fmt += stat[2]  # internal time (pprint recurses)
+
+    print 'units     : %d (%d procs each, %d nodes)' % (n_units, procs, n_nodes)
+    print 'total     : %8.3fs' % (stop - start)
+    print 'formatting: %8.3fs' % fmt
+
+
+# ------------------------------------------------------------------------------
+
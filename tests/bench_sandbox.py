@@ -0,0 +1,127 @@
+#!/usr/bin/env python
+
+# ------------------------------------------------------------------------------
+#
+# Benchmark the cost of unit sandbox creation on the executor's launch path,
+# on an artificially slowed file system: every `os.makedirs()` call is delayed
+# by a fixed amount, to mimic a loaded Lustre / GPFS metadata server.  We
+# compare
+#
+#   - inline:    the executor creates each sandbox before writing the launch
+#                script (the old behavior of `Popen.spawn()`)
+#   - precreate: the agent staging input component creates the sandboxes in
+#                bulk, ahead of time, and the executor only checks for them
+#
+# and report the time the executor spends per unit.
+#
+#   usage: bench_sandbox.py [<n_units> [<mkdir_delay_ms> [<bulk_size>]]]
+#
+# ------------------------------------------------------------------------------
+
+import os
+import sys
+import time
+import Queue
+import shutil
+import tempfile
+import threading
+
+import radical.pilot.utils as rpu
+
+
+# ------------------------------------------------------------------------------
+#
+def slow_makedirs(delay):
+
+    makedirs = os.makedirs
+
+    def _makedirs(*args, **kwargs):
+        time.sleep(delay)
+        return makedirs(*args, **kwargs)
+
+    os.makedirs = _makedirs
+
+
+# ------------------------------------------------------------------------------
+#
+def spawn(pwd, uid):
+
+    # the part of `Popen.spawn()` which touches the sandbox
+    sandbox = '%s/%s' % (pwd, uid)
+
+    if not os.path.isdir(sandbox):
+        rpu.rec_makedir(sandbox)
+
+    with open('%s/%s.sh' % (sandbox, uid), 'w') as fout:
+        fout.write('#!/bin/sh\n\n/bin/true\n')
+
+
+# ------------------------------------------------------------------------------
+#
+def bench(pwd, n_units, bulk_size, precreate):
+
+    uids  = ['unit.%06d' % i for i in range(n_units)]
+    queue = Queue.Queue()
+
+    def _stage_in():
+        # hand units to the executor in bulks, as the staging input component
+        # does, and create their sandboxes first if requested
+        for i in range(0, n_units, bulk_size):
+            bulk = uids[i:i + bulk_size]
+            if precreate:
+                for uid in bulk:
+                    rpu.rec_makedir('%s/%s' % (pwd, uid))
+            for uid in bulk:
+                queue.put(uid)
+        queue.put(None)
+
+    stager = threading.Thread(target=_stage_in)
+    start  = time.time()
+    stager.start()
+
+    busy = 0.0
+    while True:
+        uid = queue.get()
+        if uid is None:
+            break
+        t0 = time.time()
+        spawn(pwd, uid)
+        busy += time.time() - t0
+
+    stop = time.time()
+    stager.join()
+
+    return busy, stop - start
+
+
+# ------------------------------------------------------------------------------
+#
+if __name__ == '__main__':
+
+    n_units   = 1000
+    delay     = 10
+    bulk_size = 100
+
+    if len(sys.argv) > 1: n_units   = int(sys.argv[1])
+    if len(sys.argv) > 2: delay     = int(sys.argv[2])
+    if len(sys.argv) > 3: bulk_size = int(sys.argv[3])
+
+    slow_makedirs(delay / 1000.0)
+
+    print 'units: %d, mkdir delay: %d ms, bulk size: %d' \
+        % (n_units, delay, bulk_size)
+
+    for mode in ['inline', 'precreate']:
+
+        pwd = tempfile.mkdtemp(prefix='bench_sandbox.')
+        try:
+            busy, total = bench(pwd, n_units, bulk_size, mode == 'precreate')
+        finally:
+            shutil.rmtree(pwd)
+
+        print '%-10s: executor %8.2f ms/unit, total %8.2f s' \
+            % (mode, busy * 1000 / n_units, total)
+
+
+# ------------------------------------------------------------------------------
+
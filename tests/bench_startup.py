@@ -0,0 +1,121 @@
+#!/usr/bin/env python
+
+# ------------------------------------------------------------------------------
+#
+# Benchmark bridge and component startup:
+#
+#   - start a set of bridges, waiting for the address of each bridge before
+#     starting the next one, or only once all bridges are forked (see
+#     `rpu.Component.start_bridges()`), and report the time it took until all
+#     bridge addresses were known;
+#   - start a set of (umgr scheduler) component instances on top of the
+#     session's bridges (see `rpu.Component.start_components()`), and report
+#     the time it took until all instances were up.
+#
+#   usage: bench_startup.py [<n_queues> [<n_pubsubs> [<n_comps> [<repeat>]]]]
+#
+# ------------------------------------------------------------------------------
+
+import sys
+import time
+
+import radical.pilot           as rp
+import radical.pilot.utils     as rpu
+import radical.pilot.constants as rpc
+
+
+# ------------------------------------------------------------------------------
+#
+def bench_bridges(session, n_queues, n_pubsubs, parallel):
+
+    bridges = dict()
+    for i in range(n_queues):
+        bridges['bench_%03d_queue'  % i] = {'log_level' : 'error'}
+    for i in range(n_pubsubs):
+        bridges['bench_%03d_pubsub' % i] = {'log_level' : 'error'}
+
+    cfg = {'bridges'          : bridges,
+           'parallel_startup' : parallel}
+
+    start   = time.time()
+    handles = rpu.Component.start_bridges(cfg, session, session._log)
+    stop    = time.time()
+
+    for bname, bcfg in bridges.iteritems():
+        assert(bcfg['addr_in']), 'missing address for %s' % bname
+
+    for handle in handles:
+        handle.stop()
+
+    return stop - start
+
+
+# ------------------------------------------------------------------------------
+#
+def bench_components(session, n_comps):
+
+    # the scheduler instances connect to the session's pubsubs, and to the umgr
+    # queues, which we start first
+    bridges = {rpc.UMGR_SCHEDULING_QUEUE    : {'log_level' : 'error'},
+               rpc.UMGR_STAGING_INPUT_QUEUE : {'log_level' : 'error'}}
+    bridges.update(session._cfg['bridges'])
+
+    cfg = {'uid'        : 'umgr.bench_startup',
+           'scheduler'  : rp.SCHEDULER_ROUND_ROBIN,
+           'bridges'    : bridges,
+           'components' : {rpc.UMGR_SCHEDULING_COMPONENT : {'count' : n_comps}}}
+
+    handles = rpu.Component.start_bridges(cfg, session, session._log)
+
+    try:
+        start = time.time()
+        comps = rpu.Component.start_components(cfg, session, session._log)
+        stop  = time.time()
+
+        for comp in comps:
+            comp.stop()
+
+    finally:
+        for handle in handles:
+            handle.stop()
+
+    return stop - start
+
+
+# ------------------------------------------------------------------------------
+#
+if __name__ == '__main__':
+
+    n_queues  = 4
+    n_pubsubs = 4
+    n_comps   = 4
+    repeat    = 3
+
+    if len(sys.argv) > 1: n_queues  = int(sys.argv[1])
+    if len(sys.argv) > 2: n_pubsubs = int(sys.argv[2])
+    if len(sys.argv) > 3: n_comps   = int(sys.argv[3])
+    if len(sys.argv) > 4: repeat    = int(sys.argv[4])
+
+    session = rp.Session(uid='rp.session.bench_startup',
+                         cfg={'owner' : 'bench_startup'}, _connect=False)
+
+    try:
+        print 'bridges: %d queues, %d pubsubs' % (n_queues, n_pubsubs)
+        for parallel in [False, True]:
+            times = [bench_bridges(session, n_queues, n_pubsubs, parallel)
+                     for _ in range(repeat)]
+            print '%-10s: %8.3fs (min %8.3fs)' \
+                % ('parallel' if parallel else 'sequential',
+                   sum(times) / len(times), min(times))
+
+        print 'components: %d umgr schedulers' % n_comps
+        times = [bench_components(session, n_comps) for _ in range(repeat)]
+        print '%-10s: %8.3fs (min %8.3fs)' \
+            % ('startup', sum(times) / len(times), min(times))
+
+    finally:
+        session.close(cleanup=False)
+
+
+# ------------------------------------------------------------------------------
+
@@ -0,0 +1,90 @@
+#!/usr/bin/env python
+
+# ------------------------------------------------------------------------------
+#
+# Benchmark the stdout/stderr tail used by the agent's output staging: create
+# synthetic unit output files of the given sizes (sparse files with some UTF-8
+# text at the end), and time `rpu.tail_file()` against reading and decoding the
+# complete file.  The full read is skipped for files larger than `full_max` MB,
+# as it needs several times the file size in memory.
+#
+#   usage: bench_tail.py [<size_mb>[,<size_mb>,...] [<full_max>]]
+#
+# ------------------------------------------------------------------------------
+
+import os
+import sys
+import time
+import shutil
+import tempfile
+
+import radical.pilot.utils as rpu
+
+
+# ------------------------------------------------------------------------------
+#
+def create_file(fname, size):
+
+    tail = (u'unit output \xe4\u20ac\U0001d11e\n' * 1000).encode('utf-8')
+
+    with open(fname, 'wb') as fout:
+        if size > len(tail):
+            fout.seek(size - len(tail))
+        fout.write(tail)
+
+
+# ------------------------------------------------------------------------------
+#
+def full_tail(fname):
+
+    with open(fname, 'r') as fin:
+        return rpu.tail(unicode(fin.read(), 'utf-8'))
+
+
+# ------------------------------------------------------------------------------
+#
+def timed(func, fname, repeat):
+
+    start = time.time()
+    for _ in range(repeat):
+        ret = func(fname)
+    return ret, (time.time() - start) / repeat
+
+
+# ------------------------------------------------------------------------------
+#
+if __name__ == '__main__':
+
+    sizes    = [1, 100, 1024, 4096]  # MB
+    full_max = 1024                  # MB
+
+    if len(sys.argv) > 1: sizes    = [int(s) for s in sys.argv[1].split(',')]
+    if len(sys.argv) > 2: full_max = int(sys.argv[2])
+
+    tmp = tempfile.mkdtemp(prefix='rp_bench_tail.')
+    try:
+        print '%10s  %12s  %12s' % ('size [MB]', 'tail_file', 'full read')
+
+        for size in sizes:
+
+            fname = '%s/unit.%d.out' % (tmp, size)
+            create_file(fname, size * 1024 * 1024)
+
+            txt, t_seek = timed(rpu.tail_file, fname, repeat=100)
+
+            if size <= full_max:
+                check, t_full = timed(full_tail, fname, repeat=1)
+                assert(txt == check), 'tail mismatch'
+                full = '%11.3fs' % t_full
+            else:
+                full = 'skipped'
+
+            print '%10d  %11.6fs  %12s' % (size, t_seek, full)
+            os.unlink(fname)
+
+    finally:
+        shutil.rmtree(tmp)
+
+
+# ------------------------------------------------------------------------------
+
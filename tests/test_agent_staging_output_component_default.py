@@ -7,6 +7,7 @@ import radical.utils as ru
 import radical.pilot as rp
 
 from radical.pilot.agent.staging_output.default import Default
+from radical.pilot.staging_directives import StagingResolver
 
 
 try: 
@@ -118,6 +119,7 @@ class TestStagingOutputComponent(unittest.TestCase):
         component = Default(cfg=self.cfg, session=None)
         component._prof = mocked_profiler
         component._log = ru.get_logger('dummy')
+        component._resolver = StagingResolver(component._log)
         actionables = list()
         actionables.append({
             'uid'   : ru.generate_id('sd'),
@@ -144,6 +146,7 @@ class TestStagingOutputComponent(unittest.TestCase):
         component = Default(cfg=self.cfg, session=None)
         component._prof = mocked_profiler
         component._log = ru.get_logger('dummy')
+        component._resolver = StagingResolver(component._log)
         actionables = list()
         actionables.append({
             'uid'   : ru.generate_id('sd'),
@@ -171,6 +174,7 @@ class TestStagingOutputComponent(unittest.TestCase):
         component = Default(cfg=self.cfg, session=None)
         component._prof = mocked_profiler
         component._log = ru.get_logger('dummy')
+        component._resolver = StagingResolver(component._log)
         actionables = list()
         actionables.append({
             'uid'   : ru.generate_id('sd'),
@@ -198,6 +202,7 @@ class TestStagingOutputComponent(unittest.TestCase):
         component = Default(cfg=self.cfg, session=None)
         component._prof = mocked_profiler
         component._log = ru.get_logger('dummy')
+        component._resolver = StagingResolver(component._log)
         actionables = list()
         actionables.append({
             'uid'   : ru.generate_id('sd'),
@@ -224,6 +229,7 @@ class TestStagingOutputComponent(unittest.TestCase):
         component = Default(cfg=self.cfg, session=None)
         component._prof = mocked_profiler
         component._log = ru.get_logger('dummy')
+        component._resolver = StagingResolver(component._log)
         actionables = list()
         actionables.append({
             'uid'   : ru.generate_id('sd'),
@@ -251,6 +257,7 @@ class TestStagingOutputComponent(unittest.TestCase):
         component = Default(cfg=self.cfg, session=None)
         component._prof = mocked_profiler
         component._log = ru.get_logger('dummy')
+        component._resolver = StagingResolver(component._log)
         actionables = list()
         actionables.append({
             'uid'   : ru.generate_id('sd'),
@@ -278,6 +285,7 @@ class TestStagingOutputComponent(unittest.TestCase):
         component = Default(cfg=self.cfg, session=None)
         component._prof = mocked_profiler
         component._log = ru.get_logger('dummy')
+        component._resolver = StagingResolver(component._log)
         actionables = list()
         actionables.append({
             'uid'   : ru.generate_id('sd'),
@@ -304,6 +312,7 @@ class TestStagingOutputComponent(unittest.TestCase):
         component = Default(cfg=self.cfg, session=None)
         component._prof = mocked_profiler
         component._log = ru.get_logger('dummy')
+        component._resolver = StagingResolver(component._log)
         actionables = list()
         actionables.append({
             'uid'   : ru.generate_id('sd'),
@@ -331,6 +340,7 @@ class TestStagingOutputComponent(unittest.TestCase):
         component = Default(cfg=self.cfg, session=None)
         component._prof = mocked_profiler
         component._log = ru.get_logger('dummy')
+        component._resolver = StagingResolver(component._log)
         actionables = list()
         actionables.append({
             'uid'   : ru.generate_id('sd'),
@@ -358,6 +368,7 @@ class TestStagingOutputComponent(unittest.TestCase):
         component = Default(cfg=self.cfg, session=None)
         component._prof = mocked_profiler
         component._log = ru.get_logger('dummy')
+        component._resolver = StagingResolver(component._log)
         actionables = list()
         actionables.append({
             'uid'   : ru.generate_id('sd'),
@@ -386,6 +397,7 @@ class TestStagingOutputComponent(unittest.TestCase):
         component = Default(cfg=self.cfg, session=None)
         component._prof = mocked_profiler
         component._log = ru.get_logger('dummy')
+        component._resolver = StagingResolver(component._log)
         actionables = list()
         actionables.append({
             'uid'   : ru.generate_id('sd'),
@@ -417,6 +429,7 @@ class TestStagingOutputComponent(unittest.TestCase):
         component = Default(cfg=self.cfg, session=None)
         component._prof = mocked_profiler
         component._log = ru.get_logger('dummy')
+        component._resolver = StagingResolver(component._log)
         actionables = list()
         actionables.append({
             'uid'   : ru.generate_id('sd'),
@@ -448,6 +461,7 @@ class TestStagingOutputComponent(unittest.TestCase):
         component = Default(cfg=self.cfg, session=None)
         component._prof = mocked_profiler
         component._log = ru.get_logger('dummy')
+        component._resolver = StagingResolver(component._log)
         actionables = list()
         actionables.append({
             'uid'   : ru.generate_id('sd'),
@@ -476,6 +490,7 @@ class TestStagingOutputComponent(unittest.TestCase):
         component = Default(cfg=self.cfg, session=None)
         component._prof = mocked_profiler
         component._log = ru.get_logger('dummy')
+        component._resolver = StagingResolver(component._log)
         actionables = list()
         actionables.append({
             'uid'   : ru.generate_id('sd'),
@@ -507,6 +522,7 @@ class TestStagingOutputComponent(unittest.TestCase):
         component = Default(cfg=self.cfg, session=None)
         component._prof = mocked_profiler
         component._log = ru.get_logger('dummy')
+        component._resolver = StagingResolver(component._log)
         actionables = list()
         actionables.append({
             'uid'   : ru.generate_id('sd'),
@@ -537,6 +553,7 @@ class TestStagingOutputComponent(unittest.TestCase):
         component = Default(cfg=self.cfg, session=None)
         component._prof = mocked_profiler
         component._log = ru.get_logger('dummy')
+        component._resolver = StagingResolver(component._log)
         actionables = list()
         actionables.append({
             'uid'   : ru.generate_id('sd'),
@@ -565,6 +582,7 @@ class TestStagingOutputComponent(unittest.TestCase):
         component = Default(cfg=self.cfg, session=None)
         component._prof = mocked_profiler
         component._log = ru.get_logger('dummy')
+        component._resolver = StagingResolver(component._log)
         actionables = list()
         actionables.append({
             'uid'   : ru.generate_id('sd'),
@@ -597,6 +615,7 @@ class TestStagingOutputComponent(unittest.TestCase):
         component = Default(cfg=self.cfg, session=None)
         component._prof = mocked_profiler
         component._log = ru.get_logger('dummy')
+        component._resolver = StagingResolver(component._log)
         actionables = list()
         actionables.append({
             'uid'   : ru.generate_id('sd'),
@@ -628,6 +647,7 @@ class TestStagingOutputComponent(unittest.TestCase):
         component = Default(cfg=self.cfg, session=None)
         component._prof = mocked_profiler
         component._log = ru.get_logger('dummy')
+        component._resolver = StagingResolver(component._log)
         actionables = list()
         actionables.append({
             'uid'   : ru.generate_id('sd'),
@@ -656,6 +676,7 @@ class TestStagingOutputComponent(unittest.TestCase):
         component = Default(cfg=self.cfg, session=None)
         component._prof = mocked_profiler
         component._log = ru.get_logger('dummy')
+        component._resolver = StagingResolver(component._log)
         actionables = list()
         actionables.append({
             'uid'   : ru.generate_id('sd'),
@@ -684,6 +705,7 @@ class TestStagingOutputComponent(unittest.TestCase):
         component = Default(cfg=self.cfg, session=None)
         component._prof = mocked_profiler
         component._log = ru.get_logger('dummy')
+        component._resolver = StagingResolver(component._log)
         actionables = list()
         actionables.append({
             'uid'   : ru.generate_id('sd'),
@@ -712,6 +734,7 @@ class TestStagingOutputComponent(unittest.TestCase):
         component = Default(cfg=self.cfg, session=None)
         component._prof = mocked_profiler
         component._log = ru.get_logger('dummy')
+        component._resolver = StagingResolver(component._log)
         actionables = list()
         actionables.append({
             'uid'   : ru.generate_id('sd'),
@@ -740,6 +763,7 @@ class TestStagingOutputComponent(unittest.TestCase):
         component = Default(cfg=self.cfg, session=None)
         component._prof = mocked_profiler
         component._log = ru.get_logger('dummy')
+        component._resolver = StagingResolver(component._log)
         actionables = list()
         actionables.append({
             'uid'   : ru.generate_id('sd'),
@@ -768,6 +792,7 @@ class TestStagingOutputComponent(unittest.TestCase):
         component = Default(cfg=self.cfg, session=None)
         component._prof = mocked_profiler
         component._log = ru.get_logger('dummy')
+        component._resolver = StagingResolver(component._log)
         actionables = list()
         actionables.append({
             'uid'   : ru.generate_id('sd'),
@@ -796,6 +821,7 @@ class TestStagingOutputComponent(unittest.TestCase):
         component = Default(cfg=self.cfg, session=None)
         component._prof = mocked_profiler
         component._log = ru.get_logger('dummy')
+        component._resolver = StagingResolver(component._log)
         actionables = list()
         actionables.append({
             'uid'   : ru.generate_id('sd'),
@@ -824,6 +850,7 @@ class TestStagingOutputComponent(unittest.TestCase):
         component = Default(cfg=self.cfg, session=None)
         component._prof = mocked_profiler
         component._log = ru.get_logger('dummy')
+        component._resolver = StagingResolver(component._log)
         actionables = list()
         actionables.append({
             'uid'   : ru.generate_id('sd'),
@@ -852,6 +879,7 @@ class TestStagingOutputComponent(unittest.TestCase):
         component = Default(cfg=self.cfg, session=None)
         component._prof = mocked_profiler
         component._log = ru.get_logger('dummy')
+        component._resolver = StagingResolver(component._log)
         actionables = list()
         actionables.append({
             'uid'   : ru.generate_id('sd'),
@@ -880,6 +908,7 @@ class TestStagingOutputComponent(unittest.TestCase):
         component = Default(cfg=self.cfg, session=None)
         component._prof = mocked_profiler
         component._log = ru.get_logger('dummy')
+        component._resolver = StagingResolver(component._log)
         actionables = list()
         actionables.append({
             'uid'   : ru.generate_id('sd'),
@@ -913,6 +942,7 @@ class TestStagingOutputComponent(unittest.TestCase):
         component = Default(cfg=self.cfg, session=None)
         component._prof = mocked_profiler
         component._log = ru.get_logger('dummy')
+        component._resolver = StagingResolver(component._log)
         actionables = list()
         actionables.append({
             'uid'   : ru.generate_id('sd'),
@@ -946,6 +976,7 @@ class TestStagingOutputComponent(unittest.TestCase):
         component = Default(cfg=self.cfg, session=None)
         component._prof = mocked_profiler
         component._log = ru.get_logger('dummy')
+        component._resolver = StagingResolver(component._log)
         actionables = list()
         actionables.append({
             'uid'   : ru.generate_id('sd'),
@@ -979,6 +1010,7 @@ class TestStagingOutputComponent(unittest.TestCase):
         component = Default(cfg=self.cfg, session=None)
         component._prof = mocked_profiler
         component._log = ru.get_logger('dummy')
+        component._resolver = StagingResolver(component._log)
         actionables = list()
         actionables.append({
             'uid'   : ru.generate_id('sd'),
@@ -1012,6 +1044,7 @@ class TestStagingOutputComponent(unittest.TestCase):
         component = Default(cfg=self.cfg, session=None)
         component._prof = mocked_profiler
         component._log = ru.get_logger('dummy')
+        component._resolver = StagingResolver(component._log)
         actionables = list()
         actionables.append({
             'uid'   : ru.generate_id('sd'),
@@ -1045,6 +1078,7 @@ class TestStagingOutputComponent(unittest.TestCase):
         component = Default(cfg=self.cfg, session=None)
         component._prof = mocked_profiler
         component._log = ru.get_logger('dummy')
+        component._resolver = StagingResolver(component._log)
         actionables = list()
         actionables.append({
             'uid'   : ru.generate_id('sd'),
@@ -1077,6 +1111,7 @@ class TestStagingOutputComponent(unittest.TestCase):
         component = Default(cfg=self.cfg, session=None)
         component._prof = mocked_profiler
         component._log = ru.get_logger('dummy')
+        component._resolver = StagingResolver(component._log)
         actionables = list()
         actionables.append({
             'uid'   : ru.generate_id('sd'),
@@ -1110,6 +1145,7 @@ class TestStagingOutputComponent(unittest.TestCase):
         component = Default(cfg=self.cfg, session=None)
         component._prof = mocked_profiler
         component._log = ru.get_logger('dummy')
+        component._resolver = StagingResolver(component._log)
         actionables = list()
         actionables.append({
             'uid'   : ru.generate_id('sd'),
@@ -1143,6 +1179,7 @@ class TestStagingOutputComponent(unittest.TestCase):
         component = Default(cfg=self.cfg, session=None)
         component._prof = mocked_profiler
         component._log = ru.get_logger('dummy')
+        component._resolver = StagingResolver(component._log)
         actionables = list()
         actionables.append({
             'uid'   : ru.generate_id('sd'),
@@ -0,0 +1,204 @@
+
+import logging
+import unittest
+import threading
+
+import radical.pilot.utils as rpu
+
+try:
+    import mock
+except ImportError:
+    from unittest import mock
+
+
+# ------------------------------------------------------------------------------
+#
+class TestConnectionPool(unittest.TestCase):
+
+    def setUp(self):
+
+        self._opened = list()
+
+        def _open(pool, kind, url):
+            handle = mock.Mock()
+            handle.url = url
+            handle.copy.return_value = None
+            self._opened.append(handle)
+            return handle
+
+        self._patch = mock.patch.object(rpu.ConnectionPool, '_open', _open)
+        self._patch.start()
+
+        self._pool = rpu.ConnectionPool(session=None,
+                                        log=logging.getLogger('test'),
+                                        cfg={'max_channels' : 2,
+                                             'idle_timeout' : 100,
+                                             'wait_timeout' : 0})
+
+    def tearDown(self):
+
+        self._patch.stop()
+
+    def test_share(self):
+
+        # same host and user, different paths: one handle
+        h1 = self._pool.get(rpu.CONN_FS, 'sftp://host/tmp/a/')
+        self._pool.put(h1)
+        h2 = self._pool.get(rpu.CONN_FS, 'sftp://host/home/b/')
+        self.assertIs(h1, h2)
+
+        # but handles are not used concurrently
+        h3 = self._pool.get(rpu.CONN_FS, 'sftp://host/home/b/')
+        self.assertIsNot(h3, h2)
+        self._pool.put(h2)
+        self._pool.put(h3)
+
+        # other kind, user or host: new handles
+        h4 = self._pool.get(rpu.CONN_JS, 'ssh://host/')
+        h5 = self._pool.get(rpu.CONN_FS, 'sftp://other@host/')
+        h6 = self._pool.get(rpu.CONN_FS, 'sftp://other/')
+        self.assertEqual(len(set([h1, h3, h4, h5, h6])), 5)
+
+        for h in [h4, h5, h6]:
+            self._pool.put(h)
+
+        # returned handles are kept for reuse
+        with self._pool.borrow(rpu.CONN_FS, 'sftp://other/') as h7:
+            self.assertIs(h7, h6)
+
+        self.assertEqual(len(self._opened), 5)
+        self.assertFalse(h6.close.called)
+
+        self._pool.close()
+        self.assertTrue(h6.close.called)
+
+    def test_evict(self):
+
+        h1 = self._pool.get(rpu.CONN_FS, 'sftp://host/')
+        h2 = self._pool.get(rpu.CONN_JS, 'ssh://host/')
+        self._pool.put(h1)
+
+        # idle handles are closed after the timeout, borrowed ones are kept
+        with mock.patch('time.time', return_value=1e12):
+            h3 = self._pool.get(rpu.CONN_SHELL, 'ssh://other/')
+
+        self.assertTrue (h1.close.called)
+        self.assertFalse(h2.close.called)
+        self.assertFalse(h3.close.called)
+
+    def test_cap(self):
+
+        h1 = self._pool.get(rpu.CONN_FS, 'sftp://host/')
+        h2 = self._pool.get(rpu.CONN_JS, 'ssh://host/')
+        self._pool.put(h1)
+
+        # the cap on channels per host evicts unused handles
+        h3 = self._pool.get(rpu.CONN_SHELL, 'ssh://host/')
+        self.assertTrue(h1.close.called)
+
+        # if all are in use, we fail after `wait_timeout`
+        with self.assertRaises(RuntimeError):
+            self._pool.get(rpu.CONN_FS, 'sftp://host/')
+        self.assertFalse(h2.close.called)
+        self.assertFalse(h3.close.called)
+        self.assertEqual(len(self._opened), 3)
+
+    def test_wait(self):
+
+        self._pool._wait_timeout = 10
+
+        h1 = self._pool.get(rpu.CONN_FS, 'sftp://host/')
+        h2 = self._pool.get(rpu.CONN_FS, 'sftp://host/')
+        handles = list()
+
+        def _get():
+            handles.append(self._pool.get(rpu.CONN_FS, 'sftp://host/'))
+
+        # a borrower waits for a channel to become free
+        thread = threading.Thread(target=_get)
+        thread.start()
+        thread.join(0.1)
+        self.assertEqual(handles, list())
+
+        self._pool.put(h2)
+        thread.join()
+
+        self.assertEqual(handles, [h2])
+        self.assertEqual(len(self._opened), 2)
+
+    def test_failed(self):
+
+        h1 = self._pool.get(rpu.CONN_JS, 'ssh://host/')
+
+        # broken handles are closed, and not handed out again
+        self._pool.put(h1, failed=True)
+        self.assertTrue(h1.close.called)
+
+        h2 = self._pool.get(rpu.CONN_JS, 'ssh://host/')
+        self.assertIsNot(h2, h1)
+
+    def test_slow_open(self):
+
+        # a slow connect to one host does not block borrowers of other handles
+        block   = threading.Event()
+        handles = list()
+
+        def _open(pool, kind, url):
+            if 'slow' in str(url):
+                block.wait(10)
+            handle = mock.Mock()
+            self._opened.append(handle)
+            return handle
+
+        def _get():
+            handles.append(self._pool.get(rpu.CONN_FS, 'sftp://slow/'))
+
+        with mock.patch.object(rpu.ConnectionPool, '_open', _open):
+
+            threads = [threading.Thread(target=_get) for _ in range(2)]
+            for t in threads:
+                t.start()
+
+            h1 = self._pool.get(rpu.CONN_FS, 'sftp://host/')
+            self._pool.put(h1)
+            self.assertEqual(len(self._opened), 1)
+            self.assertEqual(handles, list())
+
+            # both borrowers of the slow host get their own handle
+            block.set()
+            for t in threads:
+                t.join()
+
+        self.assertEqual(len(self._opened), 3)
+        self.assertIsNot(handles[0], handles[1])
+
+    def test_shared(self):
+
+        pool = rpu.ConnectionPool(session=None,
+                                  log=logging.getLogger('test'),
+                                  cfg={'shared' : True})
+        try:
+            # pretend to be a forked child of the pool owner
+            with mock.patch('os.getpid', return_value=-1):
+                with pool.borrow(rpu.CONN_FS, 'sftp://host/') as proxy:
+                    proxy.copy('file://localhost/tmp/a', 'sftp://host/tmp/b',
+                               flags=0)
+
+                    with self.assertRaises(AttributeError):
+                        proxy.open('sftp://host/tmp/b')
+
+            # the operation ran on a handle of the owner's pool, which is kept
+            self.assertEqual(len(self._opened), 1)
+            handle = self._opened[0]
+            handle.copy.assert_called_with('file://localhost/tmp/a',
+                                           'sftp://host/tmp/b', flags=0)
+
+            with pool.borrow(rpu.CONN_FS, 'sftp://host/') as local:
+                self.assertIs(local, handle)
+
+        finally:
+            pool.close()
+
+
+# ------------------------------------------------------------------------------
+
@@ -0,0 +1,52 @@
+
+import unittest
+
+import pymongo
+
+from radical.pilot.db.database import DBSession, _INDEXES
+
+try:
+    import mock
+except ImportError:
+    from unittest import mock
+
+
+# ------------------------------------------------------------------------------
+#
+class TestDBIndexes(unittest.TestCase):
+
+    def _get_dbs(self, index_info):
+
+        dbs = DBSession(sid='rp.session.test', dburl=None, cfg=None,
+                        logger=mock.Mock(), connect=False)
+        dbs._c = mock.Mock()
+        dbs._c.index_information.return_value = index_info
+        return dbs
+
+    def test_create_all(self):
+
+        dbs = self._get_dbs({'_id_' : {'key' : [('_id', 1)]}})
+        dbs._ensure_indexes()
+
+        self.assertEqual(dbs._c.create_index.call_count, len(_INDEXES))
+
+    def test_verify_on_reconnect(self):
+
+        # an old session with single-field indexes, and the unique uid index
+        # in float notation
+        dbs = self._get_dbs({'_id_'    : {'key' : [('_id',   1  )]},
+                             'uid_1'   : {'key' : [('uid',   1.0)]},
+                             'type_1'  : {'key' : [('type',  1  )]},
+                             'state_1' : {'key' : [('state', 1  )]}})
+        dbs._ensure_indexes(background=True)
+
+        created = [c[0][0] for c in dbs._c.create_index.call_args_list]
+        self.assertEqual(len(created), len(_INDEXES) - 1)
+        self.assertNotIn([('uid', pymongo.ASCENDING)], created)
+
+        for c in dbs._c.create_index.call_args_list:
+            self.assertTrue(c[1]['background'])
+
+
+# ------------------------------------------------------------------------------
+
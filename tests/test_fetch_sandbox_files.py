@@ -0,0 +1,92 @@
+
+import os
+import time
+import shutil
+import tarfile
+import tempfile
+import unittest
+
+import radical.pilot.utils as rpu
+
+try:
+    import mock
+except ImportError:
+    from unittest import mock
+
+
+# ------------------------------------------------------------------------------
+#
+class TestFetchSandboxFiles(unittest.TestCase):
+
+    def setUp(self):
+
+        self.tmp    = tempfile.mkdtemp()
+        self.tgt    = '%s/tgt' % self.tmp
+        self.pilots = list()
+
+        for i in range(4):
+
+            pid     = 'pilot.%04d' % i
+            sandbox = '%s/sandbox/%s' % (self.tmp, pid)
+            os.makedirs(sandbox)
+
+            for name in ['agent_0', 'agent_staging_input.0000']:
+                with open('%s/%s.prof' % (sandbox, name), 'w') as fout:
+                    fout.write('0.0,sync_abs,%s,MainThread,%s,,\n' % (name, pid))
+
+            if i % 2:
+                # odd pilots have a profile tarball
+                with tarfile.open('%s/%s.prof.tgz' % (sandbox, pid), 'w:gz') as tf:
+                    for name in os.listdir(sandbox):
+                        if name.endswith('.prof'):
+                            tf.add('%s/%s' % (sandbox, name), arcname=name)
+
+            self.pilots.append({'uid'           : pid,
+                                'pilot_sandbox' : 'file://localhost%s/' % sandbox})
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp)
+
+    def test_fetch(self):
+
+        files = rpu.fetch_sandbox_files(self.pilots, self.tgt, 'profiles',
+                                        workers=3)
+        self.assertEqual(len(files), 8)
+        for f in files:
+            self.assertTrue(os.path.isfile(f))
+
+        # a second fetch skips all unchanged files
+        mtimes = {f: os.stat(f).st_mtime for f in files}
+        time.sleep(1)
+        files  = rpu.fetch_sandbox_files(self.pilots, self.tgt, 'profiles')
+        self.assertEqual(len(files), 8)
+        for f in files:
+            self.assertEqual(os.stat(f).st_mtime, mtimes[f])
+
+        # changed files are fetched again
+        sandbox = self.pilots[0]['pilot_sandbox'][len('file://localhost'):]
+        with open('%s/agent_0.prof' % sandbox, 'a') as fout:
+            fout.write('1.0,sync_rel,agent_0,MainThread,pilot.0000,,\n')
+
+        rpu.fetch_sandbox_files(self.pilots, self.tgt, 'profiles')
+        with open('%s/pilot.0000/agent_0.prof' % self.tgt) as fin:
+            self.assertEqual(len(fin.readlines()), 2)
+
+    def test_extract_failure(self):
+
+        # a tarball which fails to extract is fetched again next time
+        pilots   = self.pilots[1:2]
+        tgt_prof = '%s/pilot.0001/agent_0.prof' % self.tgt
+        tf_open  = tarfile.open
+
+        with mock.patch('tarfile.open', side_effect=IOError('oops')):
+            rpu.fetch_sandbox_files(pilots, self.tgt, 'profiles')
+        self.assertFalse(os.path.isfile(tgt_prof))
+
+        with mock.patch('tarfile.open', side_effect=tf_open):
+            rpu.fetch_sandbox_files(pilots, self.tgt, 'profiles')
+        self.assertTrue(os.path.isfile(tgt_prof))
+
+
+# ------------------------------------------------------------------------------
+
@@ -0,0 +1,115 @@
+
+import os
+import shutil
+import tempfile
+import unittest
+
+from radical.pilot.agent.lm.base   import LaunchMethod
+from radical.pilot.agent.lm.mpirun import MPIRun
+
+try:
+    import mock
+except ImportError:
+    from unittest import mock
+
+
+# ------------------------------------------------------------------------------
+#
+def _slots(n_nodes, cpn, gpn=0):
+    '''
+    create a synthetic slots structure for `n_nodes` nodes with `cpn` cpu and
+    `gpn` gpu processes each.
+    '''
+
+    nodes = list()
+    for n in range(n_nodes):
+        nodes.append(['node_%05d' % n, 'uid_%d' % n,
+                      [[c] for c in range(cpn)], [[g] for g in range(gpn)]])
+
+    return {'nodes'         : nodes,
+            'cores_per_node': cpn,
+            'gpus_per_node' : gpn,
+            'lm_info'       : dict()}
+
+
+# ------------------------------------------------------------------------------
+#
+class TestHostSpec(unittest.TestCase):
+
+    def setUp(self):
+
+        self._cwd = os.getcwd()
+        self._tmp = tempfile.mkdtemp()
+        os.chdir(self._tmp)
+
+        def _configure(lm):
+            lm.launch_command = 'mpirun'
+            lm.mpi_flavor     = LaunchMethod.MPI_FLAVOR_OMPI
+
+        with mock.patch.object(MPIRun, '_configure', _configure):
+            self._lm = MPIRun(cfg=dict(), session=mock.Mock())
+
+    def tearDown(self):
+
+        os.chdir(self._cwd)
+        shutil.rmtree(self._tmp)
+
+    def test_host_counts(self):
+
+        slots = _slots(3, 4, 2)
+        slots['nodes'].append(['node_00000', 'uid_0', [[4]], []])
+
+        self.assertEqual(LaunchMethod._get_host_counts(slots),
+                         [('node_00000', 7), ('node_00001', 6),
+                          ('node_00002', 6)])
+        self.assertEqual(LaunchMethod._get_host_counts(slots,
+                                               name=lambda node: node[1])[1],
+                         ('uid_1', 6))
+
+    def test_small(self):
+
+        cu = {'slots'       : _slots(2, 4),
+              'description' : {'executable' : '/bin/date'}}
+
+        cmd, hop = self._lm.construct_command(cu, None)
+        self.assertIn(' -np 8 -host node_00000:4,node_00001:4 ', cmd)
+        self.assertIsNone(hop)
+
+        counts = [('a', 2), ('b', 1)]
+        spec   = LaunchMethod._create_host_spec(counts,
+                                        LaunchMethod.MPI_FLAVOR_UNKNOWN)
+        self.assertEqual(spec, '-host a,a,b')
+
+    def test_large(self):
+
+        # 16k ranks on 512 nodes
+        cu = {'slots'       : _slots(512, 32),
+              'description' : {'executable' : '/bin/date'}}
+
+        cmd, _ = self._lm.construct_command(cu, None)
+        self.assertIn(' -np 16384 -hostfile ', cmd)
+        self.assertLess(len(cmd), LaunchMethod.HOST_SPEC_ARG_MAX)
+
+        fname = cmd.split('-hostfile ')[1].split()[0]
+        with open(fname, 'r') as fin:
+            lines = fin.readlines()
+        self.assertEqual(len(lines), 512)
+        self.assertEqual(lines[0], 'node_00000 slots=32\n')
+
+        # the same node set reuses the cached spec and hostfile
+        os.unlink(fname)
+        cmd2, _ = self._lm.construct_command(cu, None)
+        self.assertEqual(cmd, cmd2)
+        self.assertFalse(os.path.exists(fname))
+
+        # hydra uses the `host:count` hostfile format
+        spec  = LaunchMethod._create_host_spec(
+                            LaunchMethod._get_host_counts(cu['slots']),
+                            LaunchMethod.MPI_FLAVOR_HYDRA)
+        fname = spec.split()[1]
+        with open(fname, 'r') as fin:
+            self.assertEqual(fin.readline(), 'node_00000:32\n')
+
+
+# ------------------------------------------------------------------------------
+
@@ -0,0 +1,108 @@
+
+import os
+import shutil
+import tempfile
+import unittest
+
+import radical.utils       as ru
+import radical.pilot.utils as rpu
+
+try:
+    import mock
+except ImportError:
+    from unittest import mock
+
+
+# ------------------------------------------------------------------------------
+#
+def _row(t, event, uid, state=None, msg=None):
+
+    row = [None] * (max(ru.TIME, ru.EVENT, ru.UID, ru.STATE, ru.MSG) + 1)
+    row[ru.TIME ] = t
+    row[ru.EVENT] = event
+    row[ru.UID  ] = uid
+    row[ru.STATE] = state
+    row[ru.MSG  ] = msg
+    return row
+
+
+# ------------------------------------------------------------------------------
+#
+class TestProfileStore(unittest.TestCase):
+
+    def setUp(self):
+
+        self.tgt     = tempfile.mkdtemp()
+        self.profile = [_row(0.0, 'hostname', 'pilot.0000', msg='node1')]
+        for i in range(100):
+            uid = 'unit.%06d' % i
+            self.profile.append(_row(1.0 + i, 'advance',   uid, 'EXECUTING'))
+            self.profile.append(_row(2.0 + i, 'exec_stop', uid))
+
+        rpu.write_profile_store(self.profile, 0.1, {'pilot.0000': 'node1'},
+                                self.tgt)
+        self.store = rpu.ProfileStore(self.tgt)
+
+    def tearDown(self):
+        shutil.rmtree(self.tgt)
+
+    def test_rows(self):
+
+        self.assertEqual(len(self.store), len(self.profile))
+        self.assertEqual(list(self.store.rows()), self.profile)
+        self.assertEqual(self.store.accuracy, 0.1)
+        self.assertEqual(self.store.hostmap, {'pilot.0000': 'node1'})
+
+    def test_select(self):
+
+        idx = self.store.select(event='exec_stop')
+        self.assertEqual(len(idx), 100)
+
+        idx = self.store.select(event=['advance', 'exec_stop'],
+                                uid='unit.000042')
+        self.assertEqual(len(idx), 2)
+
+        idx  = self.store.select(event='advance', tmin=10.0, tmax=19.0)
+        rows = list(self.store.rows(idx))
+        self.assertEqual(len(rows), 10)
+        self.assertEqual(rows[0][ru.UID], 'unit.000009')
+
+        self.assertEqual(len(self.store.select(event='unknown')), 0)
+
+    def test_session_profile(self):
+
+        sid  = 'rp.session.test.0000'
+        src  = tempfile.mkdtemp()
+        prof = '%s/agent_0.prof' % src
+        read = 'radical.pilot.utils.prof_utils._read_session_profile'
+
+        try:
+            open(prof, 'w').close()
+
+            with mock.patch(read) as mocked_read:
+
+                mocked_read.return_value = (self.profile, 0.1, dict())
+                store = rpu.convert_session_profile(sid, src=src)
+                self.assertEqual(mocked_read.call_count, 1)
+
+                # a current store is used as is
+                profile, _, _ = rpu.get_session_profile(sid, src=src)
+                self.assertEqual(mocked_read.call_count, 1)
+                self.assertEqual(profile, self.profile)
+
+                # a re-fetched profile is newer than the store, which is thus
+                # rebuilt
+                mtime = os.path.getmtime(prof) - 10
+                os.utime('%s/meta.json' % store, (mtime, mtime))
+
+                mocked_read.return_value = (self.profile[:11], 0.1, dict())
+                profile, _, _ = rpu.get_session_profile(sid, src=src)
+                self.assertEqual(mocked_read.call_count, 2)
+                self.assertEqual(profile, self.profile[:11])
+
+        finally:
+            shutil.rmtree(src)
+
+
+# ------------------------------------------------------------------------------
+
@@ -0,0 +1,76 @@
+
+import sys
+import time
+import unittest
+import subprocess
+
+import radical.pilot.utils as rpu
+
+
+# ------------------------------------------------------------------------------
+#
+class TestRusage(unittest.TestCase):
+
+    def test_reap(self):
+
+        proc = subprocess.Popen(['/bin/sh', '-c', 'exit 3'])
+        exit_code, rusage = rpu.reap(proc, block=True)
+
+        self.assertEqual(exit_code, 3)
+        self.assertEqual(proc.returncode, 3)
+        for key in ['utime', 'stime', 'maxrss']:
+            self.assertIn(key, rusage)
+
+        # the child is collected, and won't be reported again
+        self.assertEqual(rpu.reap(proc), (3, None))
+
+    def test_reap_running(self):
+
+        cmd  = 'import time; t = time.time()\nwhile time.time() - t < 0.5: pass'
+        proc = subprocess.Popen([sys.executable, '-c', cmd])
+
+        self.assertEqual(rpu.reap(proc), (None, None))
+
+        while True:
+            exit_code, rusage = rpu.reap(proc)
+            if exit_code is not None:
+                break
+            time.sleep(0.1)
+
+        self.assertEqual(exit_code, 0)
+        self.assertGreater(rusage['utime'] + rusage['stime'], 0.1)
+
+    def test_summary(self):
+
+        def _unit(pid, procs, utime, wtime, maxrss):
+            return {'pilot'       : pid,
+                    'description' : {'cpu_processes' : procs,
+                                     'cpu_threads'   : 1},
+                    'rusage'      : {'utime'  : utime,
+                                     'stime'  : 0.0,
+                                     'wtime'  : wtime,
+                                     'maxrss' : maxrss}}
+
+        units = [_unit('pilot.0000', 1, 5.0, 10.0, 100),
+                 _unit('pilot.0000', 2, 5.0, 10.0, 300),
+                 _unit('pilot.0001', 1, 1.0,  1.0, 100),
+                 {'pilot' : 'pilot.0001', 'rusage' : None}]
+
+        summary = rpu.get_rusage_summary(units)
+
+        self.assertEqual(sorted(summary), ['pilot.0000', 'pilot.0001'])
+
+        info = summary['pilot.0000']
+        self.assertEqual(info['n_units'],     2)
+        self.assertEqual(info['cpu_time'],   10.0)
+        self.assertEqual(info['alloc_time'], 30.0)
+        self.assertEqual(info['max_rss'],    300)
+        self.assertAlmostEqual(info['utilization'], 1 / 3.0)
+        self.assertEqual(info['units']['wall_time']['mean'], 10.0)
+
+        self.assertEqual(summary['pilot.0001']['n_units'],     1)
+        self.assertEqual(summary['pilot.0001']['utilization'], 1.0)
+
+
+# ------------------------------------------------------------------------------
+
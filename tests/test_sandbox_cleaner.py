@@ -0,0 +1,93 @@
+
+import os
+import time
+import shutil
+import logging
+import tempfile
+import unittest
+
+import radical.pilot.utils as rpu
+
+try:
+    import mock
+except ImportError:
+    from unittest import mock
+
+
+# ------------------------------------------------------------------------------
+#
+class TestSandboxCleaner(unittest.TestCase):
+
+    def setUp(self):
+
+        self._tmp = tempfile.mkdtemp()
+
+    def tearDown(self):
+
+        shutil.rmtree(self._tmp)
+
+    def _sandbox(self, uid, n_files, size):
+
+        sandbox = '%s/%s' % (self._tmp, uid)
+        os.makedirs('%s/sub' % sandbox)
+        for i in range(n_files):
+            with open('%s/sub/%d.dat' % (sandbox, i), 'w') as fout:
+                fout.write('x' * size)
+        os.symlink('/etc/passwd', '%s/link' % sandbox)
+
+        return sandbox
+
+    def _wait(self, paths):
+
+        start = time.time()
+        while time.time() - start < 10:
+            if not [p for p in paths if os.path.exists(p)]:
+                return time.time() - start
+            time.sleep(0.01)
+
+    def test_cleanup(self):
+
+        prof    = mock.Mock()
+        cleaner = rpu.SandboxCleaner('test', logging.getLogger('test'), prof,
+                                     bulk_size=2, delay=0.1)
+        try:
+            sandboxes = [self._sandbox('unit.%04d' % i, 3, 100)
+                         for i in range(3)]
+            for sandbox in sandboxes:
+                cleaner.submit(os.path.basename(sandbox), sandbox)
+
+            self.assertIsNotNone(self._wait(sandboxes))
+
+        finally:
+            cleaner.stop()
+
+        # link targets are left alone
+        self.assertTrue(os.path.exists('/etc/passwd'))
+
+        # two batches, and the totals (links count with the length of their
+        # target path)
+        self.assertEqual(prof.prof.call_args_list,
+                [mock.call('cleanup_bulk',  msg='2 sandboxes, 622 bytes'),
+                 mock.call('cleanup_bulk',  msg='1 sandboxes, 311 bytes'),
+                 mock.call('cleanup_total', msg='3 sandboxes, 933 bytes')])
+
+    def test_rate(self):
+
+        # 3 sandboxes with 10 files, a link and two directories each, at 100
+        # entries per second
+        cleaner = rpu.SandboxCleaner('test', logging.getLogger('test'),
+                                     mock.Mock(), delay=0, rate=100)
+        try:
+            sandboxes = [self._sandbox('unit.%04d' % i, 10, 1)
+                         for i in range(3)]
+            for sandbox in sandboxes:
+                cleaner.submit(os.path.basename(sandbox), sandbox)
+
+            self.assertGreater(self._wait(sandboxes), 0.2)
+
+        finally:
+            cleaner.stop()
+
+
+# ------------------------------------------------------------------------------
+
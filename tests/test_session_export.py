@@ -0,0 +1,96 @@
+
+import os
+import shutil
+import tempfile
+import unittest
+
+import radical.pilot.utils as rpu
+
+
+# ------------------------------------------------------------------------------
+#
+class _Cursor(list):
+
+    def batch_size(self, n):
+        return self
+
+
+class _Collection(object):
+
+    def __init__(self, docs):
+        self._docs = docs
+
+    def find(self, query, fields=None):
+        ret = _Cursor()
+        for doc in self._docs:
+            if doc['type'] != query['type']:
+                continue
+            if fields:
+                doc = {k: v for k, v in doc.items() if k in fields}
+            ret.append(dict(doc))
+        return ret
+
+    def find_one(self, query):
+        docs = self.find(query)
+        if docs:
+            return docs[0]
+
+
+# ------------------------------------------------------------------------------
+#
+class TestSessionExport(unittest.TestCase):
+
+    def setUp(self):
+
+        self.sid  = 'rp.session.test'
+        self.tgt  = tempfile.mkdtemp()
+        self.docs = [{'type': 'session', 'uid': self.sid, 'closed': 1.0},
+                     {'type': 'pmgr',    'uid': 'pmgr.0000'},
+                     {'type': 'umgr',    'uid': 'umgr.0000'},
+                     {'type': 'pilot',   'uid': 'pilot.0000'},
+                     {'type': 'pilot',   'uid': 'pilot.0001'}]
+        for i in range(10):
+            self.docs.append({'type'  : 'unit',
+                              'uid'   : 'unit.%06d' % i,
+                              'pilot' : 'pilot.%04d' % (i % 2),
+                              'large' : 'x' * 100})
+        self.db = {self.sid: _Collection(self.docs)}
+
+    def tearDown(self):
+        shutil.rmtree(self.tgt)
+
+    def test_export(self):
+
+        fname = rpu.export_session(self.db, self.sid, tgt=self.tgt,
+                                   fields=['state'])
+        self.assertEqual(fname, '%s/%s.jsonl' % (self.tgt, self.sid))
+
+        docs = list(rpu.read_session_export(fname))
+        self.assertEqual(len(docs), len(self.docs))
+        self.assertEqual(docs[0]['type'], 'session')
+
+        units = list(rpu.read_session_export(fname, 'unit'))
+        self.assertEqual(len(units), 10)
+        self.assertNotIn('large', units[0])
+
+        for pilot in rpu.read_session_export(fname, 'pilot'):
+            self.assertEqual(len(pilot['unit_ids']), 5)
+
+    def test_export_cache(self):
+
+        fname = rpu.export_session(self.db, self.sid, tgt=self.tgt)
+
+        # the session is closed, so the export is reused w/o db access
+        self.assertEqual(rpu.export_session(None, self.sid, tgt=self.tgt),
+                         fname)
+
+    def test_session_docs(self):
+
+        docs = rpu.get_session_docs(self.db, self.sid, cachedir=self.tgt)
+        self.assertEqual(len(docs['unit']), 10)
+        for pilot in docs['pilot']:
+            self.assertEqual(len(pilot['unit_ids']), 5)
+
+
+# ------------------------------------------------------------------------------
+
@@ -0,0 +1,105 @@
+
+import time
+import shutil
+import logging
+import tempfile
+import unittest
+import threading
+
+import radical.pilot.utils     as rpu
+import radical.pilot.constants as rpc
+
+
+# ------------------------------------------------------------------------------
+#
+def _sd(action, source, priority=0):
+
+    return {'action'   : action,
+            'source'   : source,
+            'target'   : 'unit:///',
+            'priority' : priority}
+
+
+# ------------------------------------------------------------------------------
+#
+class TestStagingPool(unittest.TestCase):
+
+    def _wait(self, pool, n):
+
+        done  = list()
+        start = time.time()
+        while len(done) < n and time.time() - start < 10:
+            done += pool.get_done()
+            time.sleep(0.01)
+        return done
+
+    def test_lanes(self):
+
+        tmp = tempfile.mkdtemp()
+        try:
+            small = '%s/small' % tmp
+            large = '%s/large' % tmp
+            with open(small, 'w') as fout: fout.write('x' * 10)
+            with open(large, 'w') as fout: fout.write('x' * 1000)
+
+            lane = lambda sds: rpu.StagingPool.get_lane(sds, lambda s: s, 100)
+
+            self.assertEqual(lane([_sd(rpc.LINK, large),
+                                   _sd(rpc.COPY, small),
+                                   _sd(rpc.MOVE, None)]), rpu.STAGING_META)
+            self.assertEqual(lane([_sd(rpc.LINK, large),
+                                   _sd(rpc.COPY, large)]), rpu.STAGING_DATA)
+            self.assertEqual(lane([_sd(rpc.COPY, tmp)]),    rpu.STAGING_DATA)
+            self.assertEqual(lane([_sd(rpc.TARBALL, small)]), rpu.STAGING_DATA)
+        finally:
+            shutil.rmtree(tmp)
+
+    def test_concurrency(self):
+
+        # a unit blocking the data lane does not block the metadata lane
+        block = threading.Event()
+        order = list()
+
+        def _stage(unit, actionables):
+            if unit['uid'] == 'blocked':
+                block.wait(10)
+            if unit['uid'] == 'failed':
+                raise RuntimeError('oops')
+            order.append([unit['uid'], [sd['source'] for sd in actionables]])
+
+        pool = rpu.StagingPool('test', logging.getLogger('test'), _stage,
+                               n_meta=1, n_data=1)
+        try:
+            pool.submit({'uid' : 'blocked'}, [_sd(rpc.COPY, 'a')],
+                        rpu.STAGING_DATA)
+            pool.submit({'uid' : 'linked'},  [_sd(rpc.LINK, 'b'),
+                                              _sd(rpc.LINK, 'c', priority=1)],
+                        rpu.STAGING_META)
+            pool.submit({'uid' : 'failed'},  [_sd(rpc.LINK, 'd')],
+                        rpu.STAGING_META)
+
+            done = self._wait(pool, 2)
+            self.assertEqual(sorted([u['uid'] for u, _ in done]),
+                             ['failed', 'linked'])
+            self.assertEqual(order, [['linked', ['c', 'b']]])
+            for unit, error in done:
+                self.assertEqual(error is None, unit['uid'] == 'linked')
+
+            # units queued behind the blocked one are served by priority
+            pool.submit({'uid' : 'low'},  [_sd(rpc.COPY, 'e')],
+                        rpu.STAGING_DATA)
+            pool.submit({'uid' : 'high'}, [_sd(rpc.COPY, 'f', priority=2)],
+                        rpu.STAGING_DATA)
+            block.set()
+
+            self.assertEqual(len(self._wait(pool, 3)), 3)
+            self.assertEqual([o[0] for o in order[1:]],
+                             ['blocked', 'high', 'low'])
+
+        finally:
+            block.set()
+            pool.stop()
+
+
+# ------------------------------------------------------------------------------
+
@@ -0,0 +1,53 @@
+
+import os
+import logging
+import unittest
+
+from radical.pilot.staging_directives import StagingResolver
+
+
+# ------------------------------------------------------------------------------
+#
+class TestStagingResolver(unittest.TestCase):
+
+    def setUp(self):
+
+        self._resolver = StagingResolver(log=logging.getLogger('test'), size=4)
+        self._context  = {'pwd'      : 'sftp://host/tmp/session/pilot/unit/',
+                          'unit'     : 'sftp://host/tmp/session/pilot/unit/',
+                          'pilot'    : 'sftp://host/tmp/session/pilot/',
+                          'resource' : 'sftp://host/tmp/'}
+
+    def _check(self, path, expected):
+
+        # like `complete_url()`, the resolver does not normalize paths
+        path = self._resolver.path(path, self._context)
+        self.assertEqual(os.path.normpath(path), expected)
+
+    def test_expand(self):
+
+        self._check('unit:///input.dat', '/tmp/session/pilot/unit/input.dat')
+        self._check('input.dat',         '/tmp/session/pilot/unit/input.dat')
+        self._check('client:///in.dat',  '/tmp/session/pilot/unit/in.dat')
+        self._check('pilot:///in.dat',   '/tmp/session/pilot/staging_area/in.dat')
+        self._check('resource://',       '/tmp/staging_area')
+        self._check('/data/input.dat',   '/data/input.dat')
+
+    def test_cache(self):
+
+        for idx in range(10):
+            self._check('unit:///%d' % idx, '/tmp/session/pilot/unit/%d' % idx)
+
+        # the cache is bounded
+        self.assertLessEqual(len(self._resolver._cache), 4)
+
+    def test_localize(self):
+
+        self.assertEqual(self._resolver.localize('sftp://host/tmp/pilot/'),
+                         'file://localhost/tmp/pilot/')
+        self.assertEqual(self._resolver.localize('/tmp/pilot/'),
+                         'file://localhost/tmp/pilot/')
+
+
+# ------------------------------------------------------------------------------
+
@@ -0,0 +1,86 @@
+
+import os
+import csv
+import unittest
+
+import radical.utils       as ru
+import radical.pilot.utils as rpu
+
+
+# ------------------------------------------------------------------------------
+#
+def _read_fixture(fname):
+
+    fname   = '%s/startup_profiles/%s' % (os.path.dirname(__file__), fname)
+    profile = list()
+
+    with open(fname, 'r') as fin:
+        for cols in csv.reader(fin):
+            if not cols or cols[0].startswith('#'):
+                continue
+            row = [None] * (max(ru.TIME, ru.EVENT, ru.COMP, ru.TID,
+                                ru.UID, ru.STATE, ru.MSG) + 1)
+            row[ru.TIME ] = float(cols[0])
+            row[ru.EVENT] = cols[1]
+            row[ru.COMP ] = cols[2]
+            row[ru.TID  ] = cols[3]
+            row[ru.UID  ] = cols[4]
+            row[ru.STATE] = cols[5] or None
+            row[ru.MSG  ] = cols[6] or None
+            profile.append(row)
+
+    return profile
+
+
+# ------------------------------------------------------------------------------
+#
+class TestStartupProfile(unittest.TestCase):
+
+    def setUp(self):
+
+        profile      = _read_fixture('rp.session.startup.prof')
+        self.startup = rpu.get_startup_phases(profile)
+
+    def test_phases(self):
+
+        self.assertEqual(sorted(self.startup), ['pilot.0000', 'pilot.0001'])
+
+        phases = self.startup['pilot.0000']
+        self.assertEqual(phases['launch'],     [ 0.0,  1.5])
+        self.assertEqual(phases['queue_wait'], [ 1.5, 11.5])
+        self.assertEqual(phases['ve'],         [13.0, 83.0])
+        self.assertEqual(phases['components'], [91.0, 94.0])
+        self.assertEqual(phases['first_unit'], [94.0, 95.0])
+
+        # the second pilot unpacks a packed ve
+        phases = self.startup['pilot.0001']
+        self.assertEqual(phases['sandbox'],    [31.5, 32.0])
+        self.assertEqual(phases['ve'],         [32.0, 36.0])
+
+    def test_critical_path(self):
+
+        path  = rpu.get_startup_critical_path(self.startup['pilot.0000'])
+        names = [p[0] for p in path]
+
+        self.assertEqual(names, ['launch', 'queue_wait', 'sandbox', 've',
+                                 'agent_start', 'bridges', 'idle', 'lrms',
+                                 'idle', 'sub_agents', 'idle', 'components',
+                                 'first_unit'])
+        self.assertNotIn('lm_hooks', names)   # nested in lrms
+        self.assertEqual(path[ 0][1],  0.0)
+        self.assertEqual(path[-1][2], 95.0)
+
+    def test_summary(self):
+
+        summary = rpu.get_startup_summary(self.startup)
+
+        self.assertEqual(summary['total']['n'],    2)
+        self.assertEqual(summary['total']['max'], 95.0)
+        self.assertEqual(summary['total']['min'], 47.0)
+
+        self.assertEqual(summary['phases']['queue_wait']['mean'], 20.0)
+        self.assertEqual(summary['critical']['ve']['n'], 2)
+
+
+# ------------------------------------------------------------------------------
+
@@ -0,0 +1,59 @@
+
+# -*- coding: utf-8 -*-
+
+import os
+import shutil
+import tempfile
+import unittest
+
+import radical.pilot.utils as rpu
+
+
+# ------------------------------------------------------------------------------
+#
+class TestTailFile(unittest.TestCase):
+
+    def setUp(self):
+
+        self._tmp = tempfile.mkdtemp()
+
+    def tearDown(self):
+
+        shutil.rmtree(self._tmp)
+
+    def _check(self, data, maxlen=16):
+
+        fname = '%s/out' % self._tmp
+        with open(fname, 'wb') as fout:
+            fout.write(data)
+
+        # compare against reading and decoding the complete file
+        self.assertEqual(rpu.tail_file(fname, maxlen),
+                         rpu.tail(unicode(data, 'utf-8'), maxlen))
+
+    def test_ascii(self):
+
+        self._check('')
+        self._check('short\n')
+        self._check('x' * 16)
+        self._check('x' * 17)
+        self._check('0123456789\n' * 10000)
+
+    def test_utf8(self):
+
+        # cut the read window in all possible positions of multibyte chars
+        for pad in range(4):
+            self._check('x' * pad + u'ä€𝄞'.encode('utf-8') * 100)
+            self._check('x' * pad + u'€'.encode('utf-8') * 16)
+
+    def test_binary(self):
+
+        fname = '%s/out' % self._tmp
+        with open(fname, 'wb') as fout:
+            fout.write('x' * 1000 + '\xff\xfe' * 10)
+
+        self.assertRaises(UnicodeDecodeError, rpu.tail_file, fname, 16)
+
+
+# ------------------------------------------------------------------------------
+
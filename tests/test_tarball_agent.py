@@ -4,11 +4,13 @@ import glob
 import json
 import shutil
 import unittest
+import threading as mt
 
 import radical.utils as ru
 import radical.pilot as rp
 
 from radical.pilot.agent.staging_input.default import Default
+from radical.pilot.staging_directives import StagingResolver
 
 
 try: 
@@ -84,6 +86,10 @@ class TestStagingInputComponent(unittest.TestCase):
         component       = Default(cfg=self.cfg, session=None)
         component._prof = mocked_profiler
         component._log  = ru.get_logger('dummy')
+        component._resolver = StagingResolver(component._log)
+
+        component._tar_lock = mt.Lock()
+        component._tar_done = dict()
 
         actionables = list()
         actionables.append({'uid'     : ru.generate_id('sd'),
@@ -91,7 +97,8 @@ class TestStagingInputComponent(unittest.TestCase):
                             'flags'   : rp.DEFAULT_FLAGS,
                             'source'  : 'client:///wrongthing',
                             'target'  : 'unit:///unit.000000.tar',
-                            'priority': 0
+                            'priority': 0,
+                            'extract' : True
                            })
 
         # Call the component's '_handle_unit' function
@@ -100,6 +107,77 @@ class TestStagingInputComponent(unittest.TestCase):
 
         # Verify the actionables were done...
         self.assertTrue(os.path.isfile(os.path.join(self.unit_sandbox, 'file')))
+
+
+    @mock.patch.object(Default, '__init__', return_value=None)
+    @mock.patch.object(Default, 'advance')
+    @mock.patch.object(ru.Profiler, 'prof')
+    @mock.patch('radical.utils.raise_on')
+    def test_tarball_skip(self, mocked_init, mocked_method, mocked_profiler, mocked_raise_on):
+
+        component       = Default(cfg=self.cfg, session=None)
+        component._prof = mocked_profiler
+        component._log  = ru.get_logger('dummy')
+        component._resolver = StagingResolver(component._log)
+
+        component._tar_lock = mt.Lock()
+        component._tar_done = dict()
+
+        # original tarball directives are left to the umgr, whatever their
+        # source is
+        actionables = list()
+        actionables.append({'uid'     : ru.generate_id('sd'),
+                            'action'  : rp.TARBALL,
+                            'flags'   : rp.DEFAULT_FLAGS,
+                            'source'  : 'input.dat',
+                            'target'  : 'unit:///unit.000000.tar',
+                            'priority': 0
+                           })
+
+        component._handle_unit(self.unit, actionables)
+
+        self.assertFalse(os.path.isfile(os.path.join(self.unit_sandbox, 'file')))
+
+
+    @mock.patch.object(Default, '__init__', return_value=None)
+    @mock.patch.object(Default, 'advance')
+    @mock.patch.object(ru.Profiler, 'prof')
+    @mock.patch('radical.utils.raise_on')
+    def test_tarball_members(self, mocked_init, mocked_method, mocked_profiler, mocked_raise_on):
+
+        component       = Default(cfg=self.cfg, session=None)
+        component._prof = mocked_profiler
+        component._log  = ru.get_logger('dummy')
+        component._resolver = StagingResolver(component._log)
+
+        component._tar_lock = mt.Lock()
+        component._tar_done = dict()
+
+        # the tarball is shared by two units
+        actionables = [{'uid'     : ru.generate_id('sd'),
+                        'action'  : rp.TARBALL,
+                        'flags'   : rp.DEFAULT_FLAGS,
+                        'source'  : 'pilot:///unit.000000.tar',
+                        'target'  : 'unit:///unit.000000.tar',
+                        'priority': 0,
+                        'extract' : True,
+                        'members' : 2}]
+
+        # a failed extraction fails the first unit, and is tried again for the
+        # second one
+        with mock.patch('tarfile.open', side_effect=IOError('no tarball')):
+            with self.assertRaises(IOError):
+                component._handle_unit(self.unit, actionables)
+
+        self.assertFalse(os.path.isfile(os.path.join(self.unit_sandbox, 'file')))
+        self.assertEqual(len(component._tar_done), 1)
+
+        component._handle_unit(self.unit, actionables)
+
+        self.assertTrue(os.path.isfile(os.path.join(self.unit_sandbox, 'file')))
+
+        # all units sharing the tarball are handled
+        self.assertEqual(component._tar_done, dict())
                                                                                                      
 # ------------------------------------------------------------------------------
 #
@@ -7,9 +7,11 @@ import unittest
 
 import radical.utils as ru
 import radical.pilot as rp
+import radical.pilot.utils as rpu
 import saga          as rs
 
 from   radical.pilot.umgr.staging_input.default import Default
+from   radical.pilot.staging_directives import StagingResolver
 
 
 try:
@@ -82,23 +84,74 @@ class TestStagingInputComponent(unittest.TestCase):
         component           = Default(cfg=self.cfg, session=None)
         component._prof     = mocked_profiler
         component._log      = ru.get_logger('dummy')
+        component._resolver = StagingResolver(component._log)
         component._session  = None
-        component._fs_cache = dict()
-        component._js_cache = dict()
+        component._pool     = rpu.ConnectionPool(None, component._log)
         component._pilots   = dict()
+        component._cache_enabled = False
         actionables         = list()
-        tar_file            = None
         
         actionables.append(self.unit['description']['input_staging'][0])
 
         # print "unit_context", glob.glob(unit_sandbox+'/*')
         # Call the component's '_handle_unit' function
         # Should perform all of the actionables
-        component._handle_unit(self.unit, actionables)
+        tar_members = component._handle_unit(self.unit, actionables)
+        self.assertEqual(len(tar_members), 1)
+
+        # the tarball inputs of all units of a pilot are packed into one
+        # tarball in the pilot sandbox
+        component._handle_tarball('pilot.0000', [[self.unit, tar_members]])
 
         # Verify the actionables were done...
-        self.assertTrue(os.path.isfile('%s/%s.tar' % (self.unit['unit_sandbox'],
-                                                      self.unit['uid'])))
+        tar_sd = self.unit['description']['input_staging'][-1]
+        self.assertEqual(tar_sd['action'], rp.TARBALL)
+        self.assertTrue(os.path.isfile('%s/staging_area/%s.tar'
+                                       % (self.unit['pilot_sandbox'],
+                                          tar_sd['uid'])))
+
+
+    @mock.patch.object(Default, '__init__', return_value=None)
+    @mock.patch.object(Default, 'advance')
+    @mock.patch.object(Default, '_handle_tarball')
+    @mock.patch.object(Default, '_handle_unit')
+    def test_work_failure(self, mocked_handle_unit, mocked_handle_tarball,
+                          mocked_advance, mocked_init):
+
+        component       = Default(cfg=self.cfg, session=None)
+        component._log  = ru.get_logger('dummy')
+
+        units = list()
+        for i in range(3):
+            unit = dict(self.unit)
+            unit['uid']         = 'unit.%06d' % i
+            unit['pilot']       = 'pilot.0000'
+            unit['description'] = {'input_staging' :
+                                    list(self.unit['description']['input_staging'])}
+            units.append(unit)
+
+        # the second unit fails, and the other units are still staged via the
+        # tarball
+        tar_members = [['sd.0000', '/src', '/tgt']]
+        mocked_handle_unit.side_effect = [tar_members, RuntimeError('oops'),
+                                          tar_members]
+
+        component.work(units)
+
+        mocked_advance.assert_any_call(units[1], rp.FAILED, publish=True,
+                                       push=False)
+        mocked_handle_tarball.assert_called_once_with('pilot.0000',
+                                                [[units[0], tar_members],
+                                                 [units[2], tar_members]])
+
+        # a failing tarball fails all its units
+        mocked_handle_unit.side_effect   = [tar_members, tar_members]
+        mocked_handle_tarball.side_effect = RuntimeError('oops')
+
+        component.work([units[0], units[2]])
+
+        mocked_advance.assert_called_with([units[0], units[2]], rp.FAILED,
+                                          publish=True, push=False)
 
 
 # ------------------------------------------------------------------------------
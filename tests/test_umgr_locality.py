@@ -0,0 +1,173 @@
+
+import shutil
+import logging
+import tempfile
+import unittest
+
+import radical.pilot        as rp
+import radical.pilot.states as rps
+
+from radical.pilot.umgr.scheduler.round_robin import RoundRobin
+from radical.pilot.umgr.scheduler.backfilling import Backfilling
+from radical.pilot.umgr.scheduler.base        import ADDED
+
+try:
+    import mock
+except ImportError:
+    from unittest import mock
+
+
+# ------------------------------------------------------------------------------
+#
+# Simulate a umgr scheduler with two pilots on local `file://` sandboxes, and
+# check that units are placed on the pilot which holds their input data.
+#
+class TestLocality(unittest.TestCase):
+
+    def setUp(self):
+
+        self._tmp     = tempfile.mkdtemp()
+        self._session = mock.Mock()
+        self._session._get_client_sandbox.return_value   = self._tmp
+        self._session._get_resource_sandbox.side_effect  = \
+                lambda pilot: 'file://localhost%s/' % self._tmp
+        self._session._get_pilot_sandbox.side_effect     = \
+                lambda pilot: 'file://localhost%s/%s/' % (self._tmp, pilot['uid'])
+        self._session._get_unit_sandbox.side_effect      = \
+                lambda unit, pilot: 'file://localhost%s/%s/%s/' \
+                                  % (self._tmp, pilot['uid'], unit['uid'])
+
+        with open('%s/input.dat' % self._tmp, 'w') as fout:
+            fout.write('x' * 1024 * 1024)
+
+    def tearDown(self):
+
+        shutil.rmtree(self._tmp)
+
+    def _scheduler(self, cls):
+
+        sched = cls(cfg=None, session=None)
+        sched._log     = logging.getLogger('test')
+        sched._cfg     = dict()
+        sched._session = self._session
+
+        with mock.patch.object(cls, 'register_input'),      \
+             mock.patch.object(cls, 'register_output'),     \
+             mock.patch.object(cls, 'register_subscriber'):
+            sched.initialize_child()
+
+        sched._client_sandbox = self._tmp
+
+        for pid in ['pilot.0000', 'pilot.0001']:
+            sched._pilots[pid] = {'role'  : ADDED,
+                                  'state' : rps.PMGR_ACTIVE,
+                                  'info'  : dict(),
+                                  'pilot' : {'uid'         : pid,
+                                             'description' : {'cores' : 4}}}
+        sched.add_pilots(['pilot.0000', 'pilot.0001'])
+
+        return sched
+
+    def _unit(self, uid, inputs=None, outputs=None):
+
+        return {'uid'         : uid,
+                'description' : {'cpu_processes'  : 1,
+                                 'cpu_threads'    : 1,
+                                 'input_staging'  : inputs  or list(),
+                                 'output_staging' : outputs or list()}}
+
+    def _check(self, cls):
+
+        sched = self._scheduler(cls)
+        sd_in = {'uid'    : 'sd.0000',
+                 'source' : 'client:///input.dat',
+                 'target' : 'unit:///input.dat',
+                 'action' : rp.TRANSFER}
+        sd_pi = {'uid'    : 'sd.0001',
+                 'source' : 'pilot:///shared.dat',
+                 'target' : 'unit:///shared.dat',
+                 'action' : rp.LINK}
+        sd_po = {'uid'    : 'sd.0002',
+                 'source' : 'unit:///shared.dat',
+                 'target' : 'pilot:///shared.dat',
+                 'action' : rp.COPY}
+
+        # the umgr input staging serves the input from the pilot's staging
+        # cache, and rewrites the directive into a link
+        sd_ca = dict(sd_in)
+        sd_ca['source'] = 'pilot:///staging_cache/0123456789abcdef'
+        sd_ca['action'] = rp.LINK
+
+        # place the first units on the second pilot, which is not the one the
+        # scheduler's own policy would pick next
+        pilot = sched._pilots['pilot.0001']['pilot']
+        u0 = self._unit('unit.0000', inputs=[sd_in])
+        u1 = self._unit('unit.0001', inputs=[sd_in])
+        u2 = self._unit('unit.0002', outputs=[sd_po])
+        sched._assign_pilot(u0, pilot)
+        sched._assign_pilot(u1, pilot)
+        sched._assign_pilot(u2, pilot)
+
+        # nothing is resident before the staging is completed
+        u3 = self._unit('unit.0003', inputs=[sd_in])
+        self.assertEqual(sched._select_pilot(u3, ['pilot.0000', 'pilot.0001']),
+                         ('pilot.0000', 0, 0))
+
+        # inputs which are only copied into the unit sandbox are not resident
+        u0['state'] = rps.AGENT_STAGING_INPUT_PENDING
+        sched._update_residency([u0])
+        self.assertEqual(sched._select_pilot(u3, ['pilot.0000', 'pilot.0001']),
+                         ('pilot.0000', 0, 0))
+
+        # once u1 is staged via the staging cache, its input is resident on its
+        # pilot, and once u2 is done, its output is
+        u1['state'] = rps.AGENT_STAGING_INPUT_PENDING
+        u1['description']['input_staging'] = [sd_ca]
+        u2['state'] = rps.DONE
+        sched._update_residency([u1, u2])
+
+        u4 = self._unit('unit.0004', inputs=[sd_pi])
+        u5 = self._unit('unit.0005')
+        sched._work([u3, u4, u5])
+
+        self.assertEqual(u3['pilot'], 'pilot.0001')
+        self.assertEqual(u4['pilot'], 'pilot.0001')
+        self.assertEqual(u5['pilot'], 'pilot.0000')
+
+        # data on final pilots are forgotten
+        sched._update_pilot_states([{'uid'   : 'pilot.0001',
+                                     'state' : rps.CANCELED}])
+        self.assertNotIn('pilot.0001', sched._resident)
+
+    @mock.patch.object(RoundRobin, '__init__', return_value=None)
+    @mock.patch.object(RoundRobin, 'advance')
+    def test_round_robin(self, mocked_advance, mocked_init):
+
+        # round robin has no notion of pilot capacity, and ignores locality, so
+        # that units with shared inputs are not all placed on one pilot
+        sched = self._scheduler(RoundRobin)
+        sd_in = {'source' : 'client:///input.dat',
+                 'target' : 'unit:///input.dat',
+                 'action' : rp.TRANSFER}
+
+        self.assertFalse(sched._locality)
+
+        units = [self._unit('unit.%04d' % i, inputs=[sd_in]) for i in range(4)]
+        sched._work(units[:2])
+        sched._update_unit_states([{'uid'   : 'unit.0001',
+                                    'state' : rps.AGENT_STAGING_INPUT_PENDING}])
+        sched._work(units[2:])
+
+        self.assertEqual([u['pilot'] for u in units],
+                         ['pilot.0000', 'pilot.0001', 'pilot.0000', 'pilot.0001'])
+        self.assertEqual(sched._resident, dict())
+
+    @mock.patch.object(Backfilling, '__init__', return_value=None)
+    @mock.patch.object(Backfilling, 'advance')
+    def test_backfilling(self, mocked_advance, mocked_init):
+
+        self._check(Backfilling)
+
+
+# ------------------------------------------------------------------------------
+